@@ -1,161 +1,90 @@
-import math
+import argparse
+import os
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas
-from pandas import DataFrame
 import pystore as pystore
 
-from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION_SANITIZED, BITSTAMP_TRADING_PAIRS
+from backtests.dual_momentum_engine import run_backtest
+from backtests.execution_simulator import ExecutionSimulator, weekly_schedule
+from backtests.panel import build_panel, load_bars
+from data.bar_cache import BarCache
+from data.manifest import ManifestStore
+from data.partitioned_store import PartitionedStore
+from data.sanitize import read_since
+from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, BITSTAMP_TRADING_PAIRS, PYSTORE_COLLECTION_SANITIZED, \
+    PARTITIONED_STORE_PATH, MANIFEST_DIRECTORY
 from util.base_command import BaseCommand
 
 
 class DualMomentumBitstamp1(BaseCommand):
 
     def run(self, *args, **options):
+        days = options.get('days', 365)
+        execution = options.get('execution', False)
+        usd = options.get('usd', 1000.0)
+
         self.logger.info(f'Preparing historic data')
-        pystore.set_path(BITSTAMP_PYSTORE_PATH)
-        store = pystore.store(PYSTORE_STORE)
-        collection = store.collection(PYSTORE_COLLECTION_SANITIZED)
+        if options.get('partitioned', False):
+            root = PARTITIONED_STORE_PATH
+            store = PartitionedStore(root)
+        else:
+            root = BITSTAMP_PYSTORE_PATH
+            pystore.set_path(BITSTAMP_PYSTORE_PATH)
+            store = pystore.store(PYSTORE_STORE)
+        store = ManifestStore(store, os.path.join(root, MANIFEST_DIRECTORY))
+        bar_cache = BarCache(store)
 
         tf = 'W-SUN'
-        data = {}
-        position = {}
-        for pair in BITSTAMP_TRADING_PAIRS:
-            df = collection.item(pair).to_pandas()
-            ohlc = df['close'].resample(tf).ohlc()
-            volume = df['volume'].resample(tf).sum()
-            full = pandas.merge(ohlc, volume, left_index=True, right_index=True)
-            full['volume_avg'] = full.volume.rolling(4).mean()
-            full['volume_roc'] = full.volume_avg.pct_change(periods=1)
-            full['roc'] = full.close.pct_change(periods=4)
-            full['std'] = full.close.rolling(26).std()
-            full['std_avg'] = full.close.rolling(26).mean()
-            full['std_pct'] = full['std'] / full['std_avg']
-            data[pair] = full
-            position[pair] = 0
-
-        current_date = None
-        lead = None
-        for pair in data:
-            begin = data[pair].index[0]
-            if current_date is None or current_date > begin:
-                current_date = begin
-                lead = pair
-
-        self.logger.info(f'First date found in all series is: {current_date} lead is {lead}')
+        bars = load_bars(bar_cache, BITSTAMP_TRADING_PAIRS, tf)
+        collection = store.collection(PYSTORE_COLLECTION_SANITIZED)
+        # From the manifest, without reading the 1 minute data
+        (first, last) = collection.common_range(BITSTAMP_TRADING_PAIRS)
 
-        ####################################################################################################################################
-        # Statistics
-
-        # Plot std dev
-        # std_df = DataFrame()
-        # columns = []
-        # for pair in data:
-        #     std_df = pandas.merge(std_df, data[pair][['roc1']], left_index=True, right_index=True, how='outer',
-        #                           suffixes=(f'', f'_{pair}'), copy=False)
-        #     columns.append(pair)
-        #
-        # std_df.fillna(method='ffill', inplace=True)
-        # plt.plot(std_df.index, std_df.values)
-        # plt.legend(columns)
-        # plt.show()
-        # exit(0)
+        self.logger.info(f'All series have data from {first} to {last}')
 
         ####################################################################################################################################
         # Backtest
-        results = []
-        equity = 1
-        ath = 1
-        ath_btc = 1
-        max_drawdown = []
-        hodl_btc = None
-        hodl_eth = None
-        long = None
-        last_long = None
-        statistics = {'transactions': 0, 'holdings': {}}
-
-        data[lead] = data[lead][data[lead].index >= np.datetime64('today') - np.timedelta64(365, 'D')]
-
-        for index in data[lead].index:
-            if hodl_btc is not None:
-                next_hodl_btc = data['btcusd'].loc[index]['close'] / data['btcusd'].loc[index]['open'] * hodl_btc
-                hodl_btc = next_hodl_btc if not math.isnan(next_hodl_btc) else hodl_btc
-            else:
-                hodl_btc = 1
-
-            if hodl_eth is not None:
-                if index in data['ethusd'].index:
-                    hodl_eth = data['ethusd'].loc[index]['close'] / data['ethusd'].loc[index]['open'] * hodl_eth or hodl_eth
-            else:
-                hodl_eth = 1
-
-            if long is not None:
-                equity = data[long].loc[index]['close'] / data[long].loc[index]['open'] * equity
-                if statistics['holdings'].get(long) is None:
-                    statistics['holdings'][long] = 0
-                statistics['holdings'][long] = statistics['holdings'][long] + 1
-
-            if long != last_long:
-                equity = equity * .995
-                statistics['transactions'] = statistics['transactions'] + 1
-
-            last_long = long
-
-            ath = equity if equity > ath else ath
-            drawdown = 1 - equity / ath
-            if len(max_drawdown) < 1 or drawdown > max_drawdown[-1][1]:
-                max_drawdown.append([index, drawdown, 0])
-            else:
-                max_drawdown.append([index, max_drawdown[-1][1], 0])
-            if ath == equity:
-                max_drawdown[-1][1] = 0
-
-            ath_btc = hodl_btc if hodl_btc > ath_btc else ath_btc
-            drawdown_btc = 1 - hodl_btc / ath_btc
-            if (len(max_drawdown) < 2) or drawdown_btc > max_drawdown[-2][2]:
-                max_drawdown[-1][2] = drawdown_btc
-            else:
-                max_drawdown[-1][2] = max_drawdown[-2][2]
-            if ath_btc == hodl_btc:
-                max_drawdown[-1][2] = 0
-
-            max_volume_pair = None
-            max_volume = 0
-            for pair in data:
-                if index in data[pair].index:
-                    vol = data[pair].loc[index]['volume_avg'] * data[pair].loc[index]['close']
-                    if math.isnan(vol):
-                        vol = 0
-                    if vol >= max_volume:
-                        max_volume_pair = pair
-                        max_volume = vol
-
-            long = None
-            long_roc = -1
-
-            for pair in data:
-                std_max_vol = data[max_volume_pair].loc[index]['std_pct']
-                if index in data[pair].index:
-                    roc = data[pair].loc[index]['roc']
-                    volume_roc = data[pair].loc[index]['volume_roc']
-                    std = data[pair].loc[index]['std_pct']
-                    if std <= std_max_vol * 1.05 and roc > 0.01 and roc > long_roc and volume_roc > 0:
-                        long_roc = roc
-                        long = pair
-
-            results.append([index, equity, hodl_btc, hodl_eth])
-            self.logger.info(f'{index} - {max_volume_pair} - {long} - {equity}')
-
-        DataFrame(results, columns=['timestamp', 'equity', 'hodl_btc', 'hodl_eth']).set_index('timestamp').plot()
-        DataFrame(max_drawdown, columns=['timestamp', 'max drawdown', 'max drawdown btc']).set_index('timestamp').plot()
-
-        self.logger.info(f'Equity is {equity}')
-        self.logger.info(f'Statistics: \n{statistics}')
+        panel = build_panel(bars)
+        start = None if days is None else np.datetime64('today') - np.timedelta64(days, 'D')
+        result = run_backtest(panel, start)
+
+        for (index, max_volume, long, equity) in zip(result.index, result.max_volume, result.long, result.equity):
+            self.logger.info(f'{index} - {result.pair_name(max_volume)} - {result.pair_name(long)} - {equity}')
+
+        results = result.results()
+        if execution:
+            # The weekly switches replayed with the orders of the bot on the 1 minute data
+            schedule = weekly_schedule(result)
+            since = schedule[0][0] - pandas.Timedelta(hours=1)
+            pairs = {pair for (_, _, pair) in schedule if pair is not None}
+            # The last week is still running, the simulation stops where the 1 minute data of all pairs ends
+            last = collection.common_range(pairs)[1] + pandas.Timedelta(minutes=1)
+            schedule = [(start, min(end, last), pair) for (start, end, pair) in schedule if start < last]
+            minute_bars = {pair: read_since(collection, pair, since) for pair in pairs}
+            execution_result = ExecutionSimulator(minute_bars).run(schedule, usd)
+            results['execution'] = execution_result.equity / execution_result.initial
+            self.logger.info(f'Equity with executed orders is {execution_result.final_equity}')
+            self.logger.info(f'Execution statistics: {execution_result.statistics}')
+
+        results.plot()
+        result.max_drawdowns().plot()
+
+        self.logger.info(f'Equity is {result.final_equity}')
+        self.logger.info(f'Statistics: \n{result.statistics}')
 
         plt.show()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365, help='Days of history to backtest, 0 for the full history')
+    parser.add_argument('--execution', action='store_true', help='Simulate the orders of the bot on 1 minute data')
+    parser.add_argument('--usd', type=float, default=1000.0, help='Starting balance of the execution simulation')
+    parser.add_argument('--partitioned', action='store_true', help='Read the partitioned store instead of pystore')
+    arguments = parser.parse_args()
+
     download_bitstamp_data = DualMomentumBitstamp1()
-    download_bitstamp_data.run()
+    download_bitstamp_data.run(days=arguments.days or None, execution=arguments.execution, usd=arguments.usd,
+                               partitioned=arguments.partitioned)
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas
+
+from strategy.indicators import compute_indicators
+
+
+def select_max_volume(volume_avg, close, present):
+    vol = volume_avg * close
+    vol = np.where(np.isnan(vol), 0, vol)
+    vol = np.where(present, vol, -np.inf)
+    # Ties go to the last pair, like the ">=" comparison of the original loop
+    last = vol.shape[1] - 1 - np.argmax(vol[:, ::-1], axis=1)
+    return np.where(present.any(axis=1), last, -1)
+
+
+def select_long(roc, volume_roc, std_pct, present, max_volume, std_tolerance=1.05, roc_floor=0.01):
+    rows = np.arange(len(max_volume))
+    std_max_vol = np.where(max_volume >= 0, std_pct[rows, max_volume], np.nan)
+    candidates = present & (std_pct <= std_max_vol[:, None] * std_tolerance) & (roc > roc_floor) & (roc > -1) & (
+            volume_roc > 0)
+    # Ties go to the first pair, like the strict ">" comparison of the original loop
+    long = np.argmax(np.where(candidates, roc, -np.inf), axis=1)
+    return np.where(candidates.any(axis=1), long, -1)
+
+
+def pick(values, rows, columns, present, default):
+    picked = values[rows, np.maximum(columns, 0)]
+    return np.where((columns >= 0) & present[rows, np.maximum(columns, 0)], picked, default)
+
+
+def compound(*factors):
+    # Interleaves the factors so the cumulative product multiplies them in the same order as the original loop
+    interleaved = np.stack(factors, axis=1).ravel()
+    return np.cumprod(interleaved)[len(factors) - 1::len(factors)]
+
+
+def drawdowns(curve):
+    ath = np.fmax.accumulate(np.concatenate(([1.0], curve)))[1:]
+    drawdown = 1 - curve / ath
+    # The maximum drawdown is tracked per underwater period and resets on every new all time high
+    periods = np.cumsum(curve == ath)
+    return pandas.Series(drawdown).groupby(periods).cummax().to_numpy()
+
+
+def hodl(panel, pair, skip_zero=False):
+    column = panel.pair_index(pair)
+    if column < 0:
+        return np.ones(len(panel.index))
+    ratio = panel.field('close')[:, column] / panel.field('open')[:, column]
+    if skip_zero:
+        factor = np.where(panel.present[:, column] & (ratio != 0), ratio, 1.0)
+    else:
+        factor = np.where(np.isnan(ratio), 1.0, ratio)
+    factor[0] = 1.0
+    return compound(factor)
+
+
+class BacktestResult:
+
+    def __init__(self, panel, equity, hodl_btc, hodl_eth, drawdown, drawdown_btc, max_volume, long, held, switches):
+        self.panel = panel
+        self.index = panel.index
+        self.equity = equity
+        self.hodl_btc = hodl_btc
+        self.hodl_eth = hodl_eth
+        self.drawdown = drawdown
+        self.drawdown_btc = drawdown_btc
+        self.max_volume = max_volume
+        self.long = long
+        self.held = held
+        self.switches = switches
+
+    def pair_name(self, column):
+        return self.panel.pairs[column] if column >= 0 else None
+
+    @property
+    def final_equity(self):
+        return self.equity[-1] if len(self.equity) > 0 else 1
+
+    @property
+    def max_drawdown(self):
+        return np.nanmax(self.drawdown) if len(self.drawdown) > 0 else 0
+
+    @property
+    def statistics(self):
+        holdings = {}
+        for column in self.held[self.held >= 0]:
+            pair = self.panel.pairs[column]
+            holdings[pair] = holdings.get(pair, 0) + 1
+        return {'transactions': int(self.switches.sum()), 'holdings': holdings}
+
+    def results(self):
+        return pandas.DataFrame({'equity': self.equity, 'hodl_btc': self.hodl_btc, 'hodl_eth': self.hodl_eth},
+                                index=pandas.Index(self.index, name='timestamp'))
+
+    def max_drawdowns(self):
+        return pandas.DataFrame({'max drawdown': self.drawdown, 'max drawdown btc': self.drawdown_btc},
+                                index=pandas.Index(self.index, name='timestamp'))
+
+
+def run_backtest(panel, start=None, roc_period=4, volume_period=4, std_period=26, std_tolerance=1.05,
+                 roc_floor=0.01, switching_cost=0.995, end=None):
+    indicators = compute_indicators(panel.field('close'), panel.field('volume'), roc_period, volume_period,
+                                    std_period, version=panel.version)
+
+    # Indicators are computed over the full history, the evaluated window is cut afterwards
+    mask = np.ones(len(panel.index), dtype=bool)
+    if start is not None:
+        mask &= np.asarray(panel.index >= start)
+    if end is not None:
+        mask &= np.asarray(panel.index < end)
+    window = panel.slice(start, end)
+    indicators = {name: values[mask] for (name, values) in indicators.items()}
+    present = window.present
+    rows = np.arange(len(window.index))
+
+    max_volume = select_max_volume(indicators['volume_avg'], window.field('close'), present)
+    long = select_long(indicators['roc'], indicators['volume_roc'], indicators['std_pct'], present, max_volume,
+                       std_tolerance, roc_floor)
+
+    # The pair chosen on one bar is held during the next one
+    held = np.concatenate(([-1], long[:-1])) if len(long) > 0 else long
+    last_held = np.concatenate(([-1], held[:-1])) if len(held) > 0 else held
+    ratio = window.field('close') / window.field('open')
+    growth = pick(ratio, rows, held, present, 1.0)
+    switches = held != last_held
+    cost = np.where(switches, switching_cost, 1.0)
+    equity = compound(growth, cost)
+
+    hodl_btc = hodl(window, 'btcusd')
+    hodl_eth = hodl(window, 'ethusd', skip_zero=True)
+
+    return BacktestResult(window, equity, hodl_btc, hodl_eth, drawdowns(equity), drawdowns(hodl_btc), max_volume,
+                          long, held, switches)
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas
+
+# The order rules of reset_orders in bots/dual_momentum_bot.py
+STEP = pandas.Timedelta(minutes=5)
+CHUNK = 500
+CHUNK_THRESHOLD = 550
+MIN_BUY_VALUE = 20
+MIN_SELL_VALUE = 15
+BUY_RESERVE = 0.99
+FEE = 0.005
+
+
+def five_minute_bars(df, grid):
+    """
+    Per step of the grid: the hourly VWAP known when the orders are placed, the lowest and highest price until the
+    next step and the last close of the step.
+    """
+    close = df['close']
+    volume = df['volume']
+    traded = volume.rolling('60min').sum()
+    vwap = ((close * volume).rolling('60min').sum() / traded).where(traded > 0, close).ffill()
+    # Minute bars are labelled with their start, the hour before a step ends with the bar one minute earlier
+    vwap = vwap.reindex(grid - pandas.Timedelta(minutes=1), method='ffill').to_numpy()
+    low = df['low'].resample(STEP).min().reindex(grid).to_numpy()
+    high = df['high'].resample(STEP).max().reindex(grid).to_numpy()
+    last = close.resample(STEP).last().reindex(grid).ffill().to_numpy()
+    return vwap, low, high, last
+
+
+def weekly_schedule(result):
+    """The pair held during every W-SUN bar of a BacktestResult as (start, end, pair)"""
+    schedule = []
+    for (label, held) in zip(pandas.DatetimeIndex(result.index), result.held):
+        schedule.append((label - pandas.Timedelta(days=6), label + pandas.Timedelta(days=1), result.pair_name(held)))
+    return schedule
+
+
+def first(mask):
+    return np.argmax(mask) if mask.any() else len(mask)
+
+
+class ExecutionResult:
+
+    def __init__(self, index, equity, fills, initial):
+        self.index = index
+        self.equity = np.asarray(equity)
+        self.fills = pandas.DataFrame(fills, columns=['timestamp', 'pair', 'side', 'price', 'amount', 'fee'])
+        self.initial = initial
+
+    @property
+    def final_equity(self):
+        return self.equity[-1] / self.initial if len(self.equity) > 0 else 1
+
+    @property
+    def statistics(self):
+        return {
+            'fills': len(self.fills),
+            'fees': self.fills['fee'].sum(),
+            'volume': (self.fills['price'] * self.fills['amount']).sum(),
+        }
+
+    def results(self):
+        return pandas.DataFrame({'execution': self.equity / self.initial}, index=pandas.Index(self.index,
+                                                                                              name='timestamp'))
+
+
+class ExecutionSimulator:
+    """
+    Replays the order handling of the bot on 1 minute bars: every 5 minutes the orders are replaced by a buy of the
+    coin of the week and sells of every other coin worth more than MIN_SELL_VALUE, limit priced at the hourly VWAP and
+    at most CHUNK dollars each. A buy fills when the low reaches its price, a sell when the high does.
+
+    Between fills the balances do not change, so instead of stepping through every 5 minutes the next step with a
+    fill, or a coin becoming worth selling, is searched in the precomputed arrays of the pairs involved.
+    """
+
+    def __init__(self, minute_bars, fee=FEE, decimals=None):
+        self._minuteBars = minute_bars
+        self._fee = fee
+        self._decimals = decimals or {}
+        self._bars = {}
+        self.grid = None
+
+    def bars(self, pair):
+        if pair not in self._bars:
+            self._bars[pair] = five_minute_bars(self._minuteBars[pair], self.grid)
+        return self._bars[pair]
+
+    def _round(self, pair, amount):
+        decimals = self._decimals.get(pair)
+        return amount if decimals is None else round(amount, decimals)
+
+    def _next_event(self, i, stop, usd, coins, target):
+        event = stop
+        if target is not None and usd > MIN_BUY_VALUE:
+            (vwap, low, _, _) = self.bars(target)
+            event = min(event, i + first(low[i:stop] <= vwap[i:stop]))
+        for (pair, amount) in coins.items():
+            if pair != target:
+                (vwap, _, high, _) = self.bars(pair)
+                event = min(event, i + first((amount * vwap[i:stop] > MIN_SELL_VALUE) & (high[i:stop] >= vwap[i:stop])))
+        return event
+
+    def _execute(self, i, usd, coins, target, fills):
+        # All orders are placed with the balances at the step, the proceeds of sells are only used at the next one
+        available = usd
+        if target is not None and available > MIN_BUY_VALUE:
+            (vwap, low, _, _) = self.bars(target)
+            price = vwap[i]
+            if price > 0 and low[i] <= price:
+                amount = CHUNK / price if available > CHUNK_THRESHOLD else available * BUY_RESERVE / price
+                amount = self._round(target, amount)
+                fee = amount * price * self._fee
+                usd -= amount * price + fee
+                coins[target] = coins.get(target, 0.0) + amount
+                fills.append((self.grid[i], target, 'buy', price, amount, fee))
+
+        for pair in [pair for pair in coins if pair != target]:
+            (vwap, _, high, _) = self.bars(pair)
+            price = vwap[i]
+            balance = coins[pair]
+            if balance * price > MIN_SELL_VALUE and high[i] >= price:
+                amount = CHUNK / price if balance * price > CHUNK_THRESHOLD else balance
+                amount = min(self._round(pair, amount), balance)
+                fee = amount * price * self._fee
+                usd += amount * price - fee
+                coins[pair] = balance - amount
+                if coins[pair] <= 0:
+                    del coins[pair]
+                fills.append((self.grid[i], pair, 'sell', price, amount, fee))
+        return usd
+
+    def _value(self, i, usd, coins):
+        value = usd
+        for (pair, amount) in coins.items():
+            last = self.bars(pair)[3][i]
+            if not np.isnan(last):
+                value += amount * last
+        return value
+
+    def run(self, schedule, usd=1000.0):
+        """schedule holds (start, end, pair) periods, pair None sells everything"""
+        self.grid = pandas.date_range(schedule[0][0], schedule[-1][1], freq=STEP, inclusive='left')
+        self._bars = {}
+        initial = usd
+        coins = {}
+        fills = []
+        equity = []
+        for (start, end, target) in schedule:
+            i = self.grid.searchsorted(start)
+            stop = self.grid.searchsorted(end)
+            while i < stop:
+                i = self._next_event(i, stop, usd, coins, target)
+                if i < stop:
+                    usd = self._execute(i, usd, coins, target, fills)
+                    i += 1
+            equity.append(self._value(stop - 1, usd, coins))
+        return ExecutionResult([end for (_, end, _) in schedule], equity, fills, initial)
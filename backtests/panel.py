@@ -0,0 +1,135 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from data.bar_cache import resample_bars
+from data.sanitize import read_since
+from strategy.indicators import data_version
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def load_bars(bar_cache, pairs, tf):
+    bars = {}
+    for pair in pairs:
+        bars[pair] = bar_cache.read_bars(pair, tf)
+    return bars
+
+
+def load_resampled_bars(collection, pairs, tf):
+    bars = {}
+    for pair in pairs:
+        bars[pair] = resample_bars(read_since(collection, pair, None), tf)
+    return bars
+
+
+class Panel:
+    """
+    All pairs aligned on one time axis: values is a (time x pair x field) float64 array and present marks the
+    (time, pair) cells that exist in the pair's own series.
+    """
+
+    def __init__(self, index, pairs, values, present):
+        self.index = index
+        self.pairs = tuple(pairs)
+        self.values = values
+        self.present = present
+        self._version = None
+
+    @property
+    def version(self):
+        # Identifies the data for the memoized indicators, computed once per panel
+        if self._version is None:
+            self._version = data_version(self.values, self.present)
+        return self._version
+
+    def field(self, name):
+        return self.values[:, :, FIELDS.index(name)]
+
+    def pair_index(self, pair):
+        return self.pairs.index(pair) if pair in self.pairs else -1
+
+    def slice(self, start=None, end=None):
+        mask = np.ones(len(self.index), dtype=bool)
+        if start is not None:
+            mask &= self.index >= start
+        if end is not None:
+            mask &= self.index < end
+        return Panel(self.index[mask], self.pairs, self.values[mask], self.present[mask])
+
+
+def find_lead(bars):
+    lead = None
+    current_date = None
+    for pair in bars:
+        begin = bars[pair].index[0]
+        if current_date is None or current_date > begin:
+            current_date = begin
+            lead = pair
+    return lead
+
+
+def build_panel(bars):
+    # The pair with the longest history defines the time axis, as in the original per-pair loop
+    lead = find_lead(bars)
+    index = bars[lead].index
+    pairs = list(bars.keys())
+
+    values = np.full((len(index), len(pairs), len(FIELDS)), np.nan)
+    present = np.zeros((len(index), len(pairs)), dtype=bool)
+    for i, pair in enumerate(pairs):
+        df = bars[pair]
+        rows = index.get_indexer(df.index)
+        found = rows >= 0
+        rows = rows[found]
+        values[rows, i, :] = df[list(FIELDS)].to_numpy(dtype='float64')[found]
+        present[rows, i] = True
+
+    return Panel(index, pairs, values, present)
+
+
+class SharedPanel:
+    """
+    Copies the arrays of a panel to shared memory once, worker processes attach to them with attach_panel instead
+    of receiving a copy each.
+    """
+
+    def __init__(self, panel):
+        self._blocks = []
+        self.spec = {
+            'index': panel.index,
+            'pairs': panel.pairs,
+            'values': self._share(panel.values),
+            'present': self._share(panel.present),
+        }
+
+    def _share(self, array):
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self._blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_panel(spec):
+    """The panel of a SharedPanel spec and the shared memory blocks, which have to be kept open while it is used"""
+    blocks = []
+    arrays = []
+    for name in ('values', 'present'):
+        (block_name, shape, dtype) = spec[name]
+        # Workers share the resource tracker of the creating process, which removes the block once it is closed
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    return Panel(spec['index'], spec['pairs'], arrays[0], arrays[1]), blocks
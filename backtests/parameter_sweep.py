@@ -0,0 +1,125 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+import pandas
+import pystore as pystore
+
+from backtests.dual_momentum_engine import run_backtest
+from backtests.panel import build_panel, load_bars, load_resampled_bars, SharedPanel, attach_panel
+from data.bar_cache import BarCache
+from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION_SANITIZED, BITSTAMP_TRADING_PAIRS
+from util.base_command import BaseCommand
+
+DEFAULT_GRID = {
+    'timeframe': ['W-SUN'],
+    'roc_period': [4],
+    'std_period': [26],
+    'std_tolerance': [1.05],
+    'roc_floor': [0.01],
+    'switching_cost': [0.995],
+}
+
+# Panels per timeframe attached to shared memory once per worker process, so the tasks only carry their parameters
+_panels = None
+_blocks = None
+_start = None
+
+
+def parameter_grid(grid):
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _init_worker(specs, start):
+    global _panels, _blocks, _start
+    _panels = {}
+    _blocks = []
+    for (tf, spec) in specs.items():
+        (_panels[tf], blocks) = attach_panel(spec)
+        _blocks.extend(blocks)
+    _start = start
+
+
+def _evaluate(parameters):
+    parameters = dict(parameters)
+    panel = _panels[parameters.pop('timeframe')]
+    result = run_backtest(panel, _start, **parameters)
+    return {
+        'equity': result.final_equity,
+        'max_drawdown': result.max_drawdown,
+        'transactions': result.statistics['transactions'],
+    }
+
+
+def sweep(bars, grid, start=None, processes=None):
+    """bars holds the bars of every pair for each timeframe of the grid"""
+    combinations = parameter_grid(grid)
+    with ExitStack() as stack:
+        # The panels are copied to shared memory once, the workers only receive their names
+        specs = {tf: stack.enter_context(SharedPanel(build_panel(bars[tf]))).spec for tf in grid['timeframe']}
+        if processes == 1:
+            _init_worker(specs, start)
+            metrics = list(map(_evaluate, combinations))
+        else:
+            chunksize = max(1, len(combinations) // (4 * (processes or os.cpu_count())))
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                     initargs=(specs, start)) as pool:
+                metrics = list(pool.map(_evaluate, combinations, chunksize=chunksize))
+
+    table = pandas.DataFrame([{**parameters, **metric} for (parameters, metric) in zip(combinations, metrics)])
+    return table.sort_values('equity', ascending=False, ignore_index=True)
+
+
+class ParameterSweep(BaseCommand):
+
+    def run(self, *args, **options):
+        grid = options.get('grid', DEFAULT_GRID)
+        days = options.get('days', 365)
+        output = options.get('output', 'parameter_sweep.csv')
+
+        self.logger.info(f'Preparing historic data')
+        pystore.set_path(BITSTAMP_PYSTORE_PATH)
+        store = pystore.store(PYSTORE_STORE)
+        bar_cache = BarCache(store)
+        bars = {}
+        for tf in grid['timeframe']:
+            if tf in bar_cache.timeframes():
+                bars[tf] = load_bars(bar_cache, BITSTAMP_TRADING_PAIRS, tf)
+            else:
+                collection = store.collection(PYSTORE_COLLECTION_SANITIZED)
+                bars[tf] = load_resampled_bars(collection, BITSTAMP_TRADING_PAIRS, tf)
+
+        start = None if days is None else np.datetime64('today') - np.timedelta64(days, 'D')
+        self.logger.info(f'Evaluating {len(parameter_grid(grid))} parameter combinations')
+        table = sweep(bars, grid, start, options.get('processes'))
+
+        table.to_csv(output, index=False)
+        self.logger.info(f'Results written to {output}:\n{table.head(20)}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--timeframe', nargs='+', default=DEFAULT_GRID['timeframe'])
+    parser.add_argument('--roc-period', nargs='+', type=int, default=DEFAULT_GRID['roc_period'])
+    parser.add_argument('--std-period', nargs='+', type=int, default=DEFAULT_GRID['std_period'])
+    parser.add_argument('--std-tolerance', nargs='+', type=float, default=DEFAULT_GRID['std_tolerance'])
+    parser.add_argument('--roc-floor', nargs='+', type=float, default=DEFAULT_GRID['roc_floor'])
+    parser.add_argument('--switching-cost', nargs='+', type=float, default=DEFAULT_GRID['switching_cost'])
+    parser.add_argument('--days', type=int, default=365, help='Days of history to backtest, 0 for the full history')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='parameter_sweep.csv')
+    arguments = parser.parse_args()
+
+    parameter_sweep = ParameterSweep()
+    parameter_sweep.run(grid={
+        'timeframe': arguments.timeframe,
+        'roc_period': arguments.roc_period,
+        'std_period': arguments.std_period,
+        'std_tolerance': arguments.std_tolerance,
+        'roc_floor': arguments.roc_floor,
+        'switching_cost': arguments.switching_cost,
+    }, days=arguments.days or None, processes=arguments.processes, output=arguments.output)
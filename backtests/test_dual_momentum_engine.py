@@ -0,0 +1,160 @@
+import math
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from backtests.dual_momentum_engine import run_backtest
+from backtests.panel import build_panel
+
+
+def weekly_bars(seed, start, periods):
+    random = np.random.default_rng(seed)
+    index = pandas.date_range(start, periods=periods, freq='W-SUN', name='timestamp')
+    close = 100 * np.cumprod(1 + random.normal(0.01, 0.1, periods))
+    bars = pandas.DataFrame({
+        'open': close * (1 + random.normal(0, 0.05, periods)),
+        'high': close * 1.1,
+        'low': close * 0.9,
+        'close': close,
+        'volume': random.uniform(100, 1000, periods),
+    }, index=index)
+    return add_indicators(bars)
+
+
+def add_indicators(full):
+    full['volume_avg'] = full.volume.rolling(4).mean()
+    full['volume_roc'] = full.volume_avg.ffill().pct_change(periods=1)
+    full['roc'] = full.close.ffill().pct_change(periods=4)
+    full['std'] = full.close.rolling(26).std()
+    full['std_avg'] = full.close.rolling(26).mean()
+    full['std_pct'] = full['std'] / full['std_avg']
+    return full
+
+
+def reference_backtest(data, lead):
+    """The original week by week loop of DualMomentumBitstamp1"""
+    equity = 1
+    ath = 1
+    ath_btc = 1
+    results = []
+    max_drawdown = []
+    hodl_btc = None
+    hodl_eth = None
+    long = None
+    last_long = None
+    statistics = {'transactions': 0, 'holdings': {}}
+
+    for index in data[lead].index:
+        if hodl_btc is not None:
+            next_hodl_btc = data['btcusd'].loc[index]['close'] / data['btcusd'].loc[index]['open'] * hodl_btc
+            hodl_btc = next_hodl_btc if not math.isnan(next_hodl_btc) else hodl_btc
+        else:
+            hodl_btc = 1
+
+        if hodl_eth is not None:
+            if index in data['ethusd'].index:
+                hodl_eth = data['ethusd'].loc[index]['close'] / data['ethusd'].loc[index]['open'] * hodl_eth or hodl_eth
+        else:
+            hodl_eth = 1
+
+        if long is not None:
+            equity = data[long].loc[index]['close'] / data[long].loc[index]['open'] * equity
+            if statistics['holdings'].get(long) is None:
+                statistics['holdings'][long] = 0
+            statistics['holdings'][long] = statistics['holdings'][long] + 1
+
+        if long != last_long:
+            equity = equity * .995
+            statistics['transactions'] = statistics['transactions'] + 1
+
+        last_long = long
+
+        ath = equity if equity > ath else ath
+        drawdown = 1 - equity / ath
+        if len(max_drawdown) < 1 or drawdown > max_drawdown[-1][1]:
+            max_drawdown.append([index, drawdown, 0])
+        else:
+            max_drawdown.append([index, max_drawdown[-1][1], 0])
+        if ath == equity:
+            max_drawdown[-1][1] = 0
+
+        ath_btc = hodl_btc if hodl_btc > ath_btc else ath_btc
+        drawdown_btc = 1 - hodl_btc / ath_btc
+        if (len(max_drawdown) < 2) or drawdown_btc > max_drawdown[-2][2]:
+            max_drawdown[-1][2] = drawdown_btc
+        else:
+            max_drawdown[-1][2] = max_drawdown[-2][2]
+        if ath_btc == hodl_btc:
+            max_drawdown[-1][2] = 0
+
+        max_volume_pair = None
+        max_volume = 0
+        for pair in data:
+            if index in data[pair].index:
+                vol = data[pair].loc[index]['volume_avg'] * data[pair].loc[index]['close']
+                if math.isnan(vol):
+                    vol = 0
+                if vol >= max_volume:
+                    max_volume_pair = pair
+                    max_volume = vol
+
+        long = None
+        long_roc = -1
+
+        for pair in data:
+            std_max_vol = data[max_volume_pair].loc[index]['std_pct']
+            if index in data[pair].index:
+                roc = data[pair].loc[index]['roc']
+                volume_roc = data[pair].loc[index]['volume_roc']
+                std = data[pair].loc[index]['std_pct']
+                if std <= std_max_vol * 1.05 and roc > 0.01 and roc > long_roc and volume_roc > 0:
+                    long_roc = roc
+                    long = pair
+
+        results.append([index, equity, hodl_btc, hodl_eth])
+
+    return results, max_drawdown, statistics
+
+
+class DualMomentumEngineTest(TestCase):
+
+    def setUp(self):
+        self.data = {
+            'btcusd': weekly_bars(1, '2015-01-04', 300),
+            'ethusd': weekly_bars(2, '2016-06-05', 220),
+            'ltcusd': weekly_bars(3, '2015-01-04', 300),
+            'xrpusd': weekly_bars(4, '2017-03-05', 180),
+            'adausd': weekly_bars(5, '2019-01-06', 80),
+        }
+        self.data['ltcusd'].iloc[100:102, :4] = np.nan
+        add_indicators(self.data['ltcusd'])
+
+    def testIdenticalToOriginalLoop(self):
+        results, max_drawdown, statistics = reference_backtest(self.data, 'btcusd')
+
+        result = run_backtest(build_panel(self.data))
+
+        expected = pandas.DataFrame(results, columns=['timestamp', 'equity', 'hodl_btc', 'hodl_eth'])
+        np.testing.assert_array_equal(expected['equity'].to_numpy(), result.equity)
+        np.testing.assert_array_equal(expected['hodl_btc'].to_numpy(), result.hodl_btc)
+        np.testing.assert_array_equal(expected['hodl_eth'].to_numpy(), result.hodl_eth)
+
+        drawdowns = pandas.DataFrame(max_drawdown, columns=['timestamp', 'max drawdown', 'max drawdown btc'])
+        np.testing.assert_array_equal(drawdowns['max drawdown'].to_numpy(), result.drawdown)
+        np.testing.assert_array_equal(drawdowns['max drawdown btc'].to_numpy(), result.drawdown_btc)
+
+        self.assertEqual(statistics, result.statistics)
+        self.assertGreater(statistics['transactions'], 0)
+
+    def testWindow(self):
+        start = self.data['btcusd'].index[200]
+        data = dict(self.data)
+        data['btcusd'] = data['btcusd'][data['btcusd'].index >= start]
+        results, _, statistics = reference_backtest(data, 'btcusd')
+
+        result = run_backtest(build_panel(self.data), start)
+
+        self.assertEqual(100, len(result.index))
+        np.testing.assert_array_equal([row[1] for row in results], result.equity)
+        self.assertEqual(statistics, result.statistics)
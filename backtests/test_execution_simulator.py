@@ -0,0 +1,114 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from backtests.execution_simulator import ExecutionSimulator, five_minute_bars, weekly_schedule, CHUNK, \
+    CHUNK_THRESHOLD, MIN_BUY_VALUE, MIN_SELL_VALUE, BUY_RESERVE
+
+
+def minute_bars(seed, start='2022-01-03', days=21, price=100.0):
+    rng = np.random.default_rng(seed)
+    index = pandas.date_range(start, periods=days * 24 * 60, freq='1min')
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.001, len(index))))
+    volume = rng.exponential(1.0, len(index))
+    volume[rng.random(len(index)) < 0.3] = 0
+    df = pandas.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': volume}, index=index)
+    # Sanitized data has empty minutes
+    df.iloc[rng.random(len(index)) < 0.05, :4] = np.nan
+    return df
+
+
+def reference(simulator, schedule, usd, fee):
+    """Steps through every 5 minutes like the bot"""
+    grid = simulator.grid
+    coins = {}
+    fills = []
+    equity = []
+    for (start, end, target) in schedule:
+        stop = grid.searchsorted(end)
+        for i in range(grid.searchsorted(start), stop):
+            available = usd
+            if target is not None and available > MIN_BUY_VALUE:
+                (vwap, low, _, _) = simulator.bars(target)
+                if vwap[i] > 0 and low[i] <= vwap[i]:
+                    amount = CHUNK / vwap[i] if available > CHUNK_THRESHOLD else available * BUY_RESERVE / vwap[i]
+                    usd -= amount * vwap[i] * (1 + fee)
+                    coins[target] = coins.get(target, 0) + amount
+                    fills.append((target, 'buy', i))
+            for pair in [pair for pair in coins if pair != target]:
+                (vwap, _, high, _) = simulator.bars(pair)
+                value = coins[pair] * vwap[i]
+                if value > MIN_SELL_VALUE and high[i] >= vwap[i]:
+                    amount = CHUNK / vwap[i] if value > CHUNK_THRESHOLD else coins[pair]
+                    usd += amount * vwap[i] * (1 - fee)
+                    coins[pair] -= amount
+                    if coins[pair] <= 0:
+                        del coins[pair]
+                    fills.append((pair, 'sell', i))
+        equity.append(usd + sum(amount * simulator.bars(pair)[3][stop - 1] for (pair, amount) in coins.items()))
+    return equity, fills
+
+
+class ExecutionSimulatorTest(TestCase):
+
+    def setUp(self):
+        self.bars = {'btcusd': minute_bars(1), 'ethusd': minute_bars(2, price=10.0), 'xrpusd': minute_bars(3)}
+        self.schedule = [
+            (pandas.Timestamp('2022-01-03'), pandas.Timestamp('2022-01-10'), 'btcusd'),
+            (pandas.Timestamp('2022-01-10'), pandas.Timestamp('2022-01-17'), 'ethusd'),
+            (pandas.Timestamp('2022-01-17'), pandas.Timestamp('2022-01-24'), None),
+        ]
+
+    def testSameAsStepping(self):
+        simulator = ExecutionSimulator(self.bars, fee=0.005)
+        result = simulator.run(self.schedule, usd=5000.0)
+        (equity, fills) = reference(simulator, self.schedule, 5000.0, 0.005)
+
+        np.testing.assert_allclose(equity, result.equity)
+        self.assertEqual(fills, [(pair, side, simulator.grid.get_loc(timestamp)) for (timestamp, pair, side) in
+                                 zip(result.fills['timestamp'], result.fills['pair'], result.fills['side'])])
+        # Every order but the last of a switch is a chunk
+        buys = result.fills[(result.fills['side'] == 'buy') & (result.fills['pair'] == 'btcusd')]
+        self.assertGreater(len(buys), 9)
+        np.testing.assert_allclose(CHUNK, (buys['price'] * buys['amount'])[:-1])
+        self.assertEqual(3, len(result.equity))
+        self.assertAlmostEqual(result.equity[-1] / 5000, result.final_equity)
+        self.assertGreater(result.statistics['fees'], 0)
+
+    def testMinimumNotional(self):
+        result = ExecutionSimulator(self.bars).run(self.schedule[:1], usd=MIN_BUY_VALUE)
+        self.assertEqual(0, len(result.fills))
+        self.assertEqual([MIN_BUY_VALUE], list(result.equity))
+
+    def testDecimals(self):
+        result = ExecutionSimulator(self.bars, decimals={'btcusd': 2, 'ethusd': 0}).run(self.schedule, usd=2000.0)
+        amounts = result.fills['amount']
+        np.testing.assert_allclose(amounts, amounts.round(2))
+        np.testing.assert_allclose(amounts[result.fills['pair'] == 'ethusd'],
+                                   amounts[result.fills['pair'] == 'ethusd'].round(0))
+
+    def testFiveMinuteBars(self):
+        index = pandas.date_range('2022-01-03 10:00', periods=70, freq='1min')
+        df = pandas.DataFrame({'close': np.arange(70.0), 'volume': 1.0}, index=index)
+        df['low'] = df['high'] = df['close']
+        grid = pandas.date_range('2022-01-03 11:00', periods=2, freq='5min')
+
+        (vwap, low, high, last) = five_minute_bars(df, grid)
+        # Minutes 10:00 to 10:59 before the first step
+        self.assertEqual(29.5, vwap[0])
+        self.assertEqual([60, 65], list(low))
+        self.assertEqual([64, 69], list(high))
+        self.assertEqual([64, 69], list(last))
+
+    def testWeeklySchedule(self):
+        class Result:
+            index = pandas.DatetimeIndex(['2022-01-09', '2022-01-16']).to_numpy()
+            held = np.array([-1, 0])
+
+            def pair_name(self, column):
+                return 'btcusd' if column == 0 else None
+
+        self.assertEqual([(pandas.Timestamp('2022-01-03'), pandas.Timestamp('2022-01-10'), None),
+                          (pandas.Timestamp('2022-01-10'), pandas.Timestamp('2022-01-17'), 'btcusd')],
+                         weekly_schedule(Result()))
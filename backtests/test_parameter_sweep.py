@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from backtests.dual_momentum_engine import run_backtest
+from backtests.panel import build_panel
+from backtests.parameter_sweep import parameter_grid, sweep
+from data.bar_cache import resample_bars
+
+
+def minute_data(seed, start, days):
+    random = np.random.default_rng(seed)
+    index = pandas.date_range(start, periods=days * 24, freq='1h', name='timestamp')
+    return pandas.DataFrame({
+        'close': 100 * np.cumprod(1 + random.normal(0, 0.01, len(index))),
+        'volume': random.uniform(0, 10, len(index)),
+    }, index=index)
+
+
+class ParameterSweepTest(TestCase):
+
+    def setUp(self):
+        self.data = {
+            'btcusd': minute_data(1, '2020-01-01', 600),
+            'ethusd': minute_data(2, '2020-03-01', 500),
+            'ltcusd': minute_data(3, '2020-01-01', 600),
+        }
+
+    def testParameterGrid(self):
+        grid = parameter_grid({'roc_period': [2, 4], 'roc_floor': [0.0, 0.01, 0.02]})
+        self.assertEqual(6, len(grid))
+        self.assertEqual({'roc_period': 2, 'roc_floor': 0.0}, grid[0])
+        self.assertEqual({'roc_period': 4, 'roc_floor': 0.02}, grid[-1])
+
+    def testSweep(self):
+        grid = {'timeframe': ['W-SUN', 'D'], 'roc_period': [2, 4], 'switching_cost': [0.995]}
+
+        bars = {tf: {pair: resample_bars(df, tf) for (pair, df) in self.data.items()} for tf in grid['timeframe']}
+
+        table = sweep(bars, grid, processes=2)
+
+        self.assertEqual(4, len(table))
+        self.assertTrue((table['equity'].diff()[1:] <= 0).all())
+        row = table[(table['timeframe'] == 'W-SUN') & (table['roc_period'] == 4)].iloc[0]
+        panel = build_panel(bars['W-SUN'])
+        result = run_backtest(panel)
+        self.assertEqual(result.final_equity, row['equity'])
+        self.assertEqual(result.max_drawdown, row['max_drawdown'])
+        self.assertEqual(result.statistics['transactions'], row['transactions'])
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from backtests.dual_momentum_engine import run_backtest
+from backtests.panel import build_panel, SharedPanel, attach_panel
+from backtests.test_parameter_sweep import minute_data
+from backtests.walk_forward import walk_forward, walk_forward_windows
+from data.bar_cache import resample_bars
+
+
+class WalkForwardTest(TestCase):
+
+    def setUp(self):
+        self.bars = {pair: resample_bars(minute_data(seed, '2019-01-01', 1200), 'W-SUN') for (seed, pair) in
+                     enumerate(['btcusd', 'ethusd', 'ltcusd', 'xrpusd'])}
+
+    def testWindows(self):
+        index = pandas.date_range('2020-01-05', periods=10, freq='W-SUN')
+        windows = walk_forward_windows(index, 4, 2)
+        self.assertEqual([(index[0], index[4], index[6]), (index[2], index[6], index[8]), (index[4], index[8], None)],
+                         windows)
+        self.assertEqual(2, len(walk_forward_windows(index, 4, 2, step=3)))
+
+    def testSharedPanel(self):
+        panel = build_panel(self.bars)
+        with SharedPanel(panel) as shared:
+            (attached, blocks) = attach_panel(shared.spec)
+            np.testing.assert_array_equal(panel.values, attached.values)
+            np.testing.assert_array_equal(panel.present, attached.present)
+            self.assertEqual(panel.pairs, attached.pairs)
+            for block in blocks:
+                block.close()
+
+    def testWalkForward(self):
+        grid = {'roc_period': [2, 4], 'roc_floor': [0.0, 0.01]}
+        table = walk_forward(self.bars, grid, 52, 26, processes=2)
+
+        windows = table[table['window'] != 'all']
+        self.assertEqual(len(walk_forward_windows(build_panel(self.bars).index, 52, 26)), len(windows))
+        self.assertEqual('all', table['window'].iloc[-1])
+        self.assertAlmostEqual(windows['equity'].prod(), table['equity'].iloc[-1])
+
+        # The selected parameters are the best in sample and evaluated right after
+        panel = build_panel(self.bars)
+        row = windows.iloc[1]
+        in_sample = [run_backtest(panel, row['in_sample_start'], roc_period=roc_period, roc_floor=roc_floor,
+                                  end=row['out_of_sample_start']).final_equity for roc_period in [2, 4] for
+                     roc_floor in [0.0, 0.01]]
+        self.assertEqual(max(in_sample), row['in_sample_equity'])
+        out_of_sample = run_backtest(panel, row['out_of_sample_start'], roc_period=int(row['roc_period']),
+                                     roc_floor=row['roc_floor'], end=row['out_of_sample_end'])
+        self.assertEqual(out_of_sample.final_equity, row['equity'])
+        self.assertEqual(26, len(out_of_sample.index))
+
+        self.assertTrue(table.equals(walk_forward(self.bars, grid, 52, 26, processes=1)))
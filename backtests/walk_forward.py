@@ -0,0 +1,145 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas
+import pystore as pystore
+
+from backtests.dual_momentum_engine import run_backtest
+from backtests.panel import build_panel, load_bars, load_resampled_bars, SharedPanel, attach_panel
+from backtests.parameter_sweep import DEFAULT_GRID, parameter_grid
+from data.bar_cache import BarCache
+from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION_SANITIZED, BITSTAMP_TRADING_PAIRS
+from util.base_command import BaseCommand
+
+# Panel and parameter combinations of a worker process, the panel arrays live in shared memory
+_panel = None
+_blocks = None
+_combinations = None
+
+
+def walk_forward_windows(index, in_sample, out_of_sample, step=None):
+    """(in sample start, out of sample start, out of sample end) of rolling windows, sizes are numbers of bars"""
+    step = step or out_of_sample
+    windows = []
+    begin = 0
+    while begin + in_sample + out_of_sample <= len(index):
+        split = begin + in_sample
+        end = split + out_of_sample
+        # The end is exclusive, the last window ends after the last bar
+        windows.append((index[begin], index[split], index[end] if end < len(index) else None))
+        begin += step
+    return windows
+
+
+def _init_worker(spec, combinations):
+    global _panel, _blocks, _combinations
+    (_panel, _blocks) = attach_panel(spec)
+    _combinations = combinations
+
+
+def _evaluate_window(window):
+    (start, split, end) = window
+    # The parameters with the best in sample equity are evaluated out of sample
+    best = None
+    for parameters in _combinations:
+        result = run_backtest(_panel, start, end=split, **parameters)
+        if best is None or result.final_equity > best[1].final_equity:
+            best = (parameters, result)
+    (parameters, in_sample) = best
+    out_of_sample = run_backtest(_panel, split, end=end, **parameters)
+    return {
+        **parameters,
+        'in_sample_equity': in_sample.final_equity,
+        'in_sample_max_drawdown': in_sample.max_drawdown,
+        'equity': out_of_sample.final_equity,
+        'max_drawdown': out_of_sample.max_drawdown,
+        'transactions': out_of_sample.statistics['transactions'],
+    }
+
+
+def aggregate(table):
+    return {
+        'equity': table['equity'].prod(),
+        'max_drawdown': table['max_drawdown'].max(),
+        'transactions': table['transactions'].sum(),
+        'in_sample_equity': table['in_sample_equity'].mean(),
+        'in_sample_max_drawdown': table['in_sample_max_drawdown'].max(),
+        'positive_windows': (table['equity'] > 1).mean(),
+    }
+
+
+def walk_forward(bars, grid, in_sample, out_of_sample, step=None, processes=None):
+    """
+    Selects the best parameters of the grid on every in sample window and evaluates them on the following out of
+    sample window. Returns a row per window and a last row aggregating the out of sample results.
+    """
+    panel = build_panel(bars)
+    windows = walk_forward_windows(panel.index, in_sample, out_of_sample, step)
+    combinations = parameter_grid(grid)
+
+    with SharedPanel(panel) as shared:
+        if processes == 1:
+            _init_worker(shared.spec, combinations)
+            metrics = list(map(_evaluate_window, windows))
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                     initargs=(shared.spec, combinations)) as pool:
+                metrics = list(pool.map(_evaluate_window, windows))
+
+    table = pandas.DataFrame([{'window': i, 'in_sample_start': start, 'out_of_sample_start': split,
+                               'out_of_sample_end': end, **metric} for (i, ((start, split, end), metric)) in
+                              enumerate(zip(windows, metrics))])
+    if len(table) > 0:
+        table = pandas.concat([table, pandas.DataFrame([{'window': 'all', **aggregate(table)}])], ignore_index=True)
+    return table
+
+
+class WalkForward(BaseCommand):
+
+    def run(self, *args, **options):
+        grid = options.get('grid', {key: values for (key, values) in DEFAULT_GRID.items() if key != 'timeframe'})
+        tf = options.get('timeframe', 'W-SUN')
+        in_sample = options.get('in_sample', 104)
+        out_of_sample = options.get('out_of_sample', 26)
+        output = options.get('output', 'walk_forward.csv')
+
+        self.logger.info(f'Preparing historic data')
+        pystore.set_path(BITSTAMP_PYSTORE_PATH)
+        store = pystore.store(PYSTORE_STORE)
+        bar_cache = BarCache(store)
+        if tf in bar_cache.timeframes():
+            bars = load_bars(bar_cache, BITSTAMP_TRADING_PAIRS, tf)
+        else:
+            bars = load_resampled_bars(store.collection(PYSTORE_COLLECTION_SANITIZED), BITSTAMP_TRADING_PAIRS, tf)
+
+        self.logger.info(f'Walking forward with {len(parameter_grid(grid))} parameter combinations per window')
+        table = walk_forward(bars, grid, in_sample, out_of_sample, options.get('step'), options.get('processes'))
+
+        table.to_csv(output, index=False)
+        self.logger.info(f'Results written to {output}:\n{table}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--timeframe', default='W-SUN')
+    parser.add_argument('--in-sample', type=int, default=104, help='Bars to select the parameters on')
+    parser.add_argument('--out-of-sample', type=int, default=26, help='Bars to evaluate the selected parameters on')
+    parser.add_argument('--step', type=int, default=None, help='Bars between windows, the out of sample size by default')
+    parser.add_argument('--roc-period', nargs='+', type=int, default=DEFAULT_GRID['roc_period'])
+    parser.add_argument('--std-period', nargs='+', type=int, default=DEFAULT_GRID['std_period'])
+    parser.add_argument('--std-tolerance', nargs='+', type=float, default=DEFAULT_GRID['std_tolerance'])
+    parser.add_argument('--roc-floor', nargs='+', type=float, default=DEFAULT_GRID['roc_floor'])
+    parser.add_argument('--switching-cost', nargs='+', type=float, default=DEFAULT_GRID['switching_cost'])
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='walk_forward.csv')
+    arguments = parser.parse_args()
+
+    walk_forward_command = WalkForward()
+    walk_forward_command.run(grid={
+        'roc_period': arguments.roc_period,
+        'std_period': arguments.std_period,
+        'std_tolerance': arguments.std_tolerance,
+        'roc_floor': arguments.roc_floor,
+        'switching_cost': arguments.switching_cost,
+    }, timeframe=arguments.timeframe, in_sample=arguments.in_sample, out_of_sample=arguments.out_of_sample,
+        step=arguments.step, processes=arguments.processes, output=arguments.output)
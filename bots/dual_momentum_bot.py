@@ -3,50 +3,56 @@ import math
 from datetime import datetime
 from decimal import Decimal
 from functools import reduce
+from pathlib import Path
 from time import sleep
 
 import numpy as np
 import pandas
 
+from data.daily_bar_store import DailyBarStore
+from data.settings import BOT_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION_BOT_DAILY
 from exchange.bitstamp.bitstamp_client import BitstampClient
+from strategy.indicators import compute_indicators
 
-logging.basicConfig(level=logging.INFO)
 log = logging.getLogger('dual_momentum_bot')
 running = True
+MIN_SELL_VALUE = 15
+WEEKS_NEEDED = 27
 
 
-def evaluate_coin_of_the_week(client: BitstampClient) -> str:
+def evaluate_coin_of_the_week(client: BitstampClient, bar_store: DailyBarStore) -> str:
     log.info(f'Evaluating coin of the week: {datetime.now()}')
 
-    # Get data
-    pairs = client.getTradingPairsInfo()
+    # Get data, with fresh pair metadata once a week. During a REST outage the metadata and bars loaded before are
+    # used.
+    pairs = client.getTradingPairsInfo(refresh=True)
+    symbols = [pair['url_symbol'] for pair in pairs if
+               pair['trading'] == 'Enabled' and pair['instant_and_market_orders'] == 'Enabled' and pair['url_symbol'].endswith('usd')]
+    daily_bars = bar_store.update(client, symbols)
+    closes = {}
+    volumes = {}
+    for symbol in daily_bars:
+        df = daily_bars[symbol]
+        closes[symbol] = df['close'].resample('W-SUN').last()
+        volumes[symbol] = df['volume'].resample('W-SUN').sum()
+    # All pairs on one weekly axis, only the last week is evaluated and the indicators need no more history than
+    # their longest window
+    close = pandas.DataFrame(closes)
+    volume = pandas.DataFrame(volumes).reindex(close.index)
+    last_week = close.index <= np.datetime64('today') - np.timedelta64(7, 'D')
+    close = close[last_week][-WEEKS_NEEDED:]
+    volume = volume[last_week][-WEEKS_NEEDED:]
+    indicators = compute_indicators(close.to_numpy(), volume.to_numpy())
     data = {}
-    for pair in pairs:
-        if pair['trading'] == 'Enabled' and pair['instant_and_market_orders'] == 'Enabled' and pair['url_symbol'].endswith('usd'):
-            bars = client.getBars(pair['url_symbol'], 60 * 60 * 24)['data']['ohlc']
-            df = pandas.DataFrame(bars)
-            df['timestamp'] = df['timestamp'].apply(lambda x: datetime.fromtimestamp(int(x)))
-            df = df.set_index('timestamp')
-            df = df.astype(
-                {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64',
-                 'volume': 'float64'})
-            ohlc = df['close'].resample('W-SUN').ohlc()
-            volume = df['volume'].resample('W-SUN').sum()
-            df = pandas.merge_ordered(ohlc, volume, on='timestamp').set_index('timestamp')
-            df = df[df.index <= np.datetime64('today') - np.timedelta64(7, 'D')]
-            df['volume_avg'] = df.volume.rolling(4).mean()
-            df['roc'] = df.close.pct_change(periods=4)
-            df['volume_roc'] = df.volume_avg.pct_change(periods=1)
-            df['std'] = df.close.rolling(26).std()
-            df['std_avg'] = df.close.rolling(26).mean()
-            df['std_pct'] = df['std'] / df['std_avg']
-            data[pair['url_symbol']] = df
+    for (column, symbol) in enumerate(close.columns):
+        data[symbol] = {name: values[-1, column] for (name, values) in indicators.items()}
+        data[symbol]['close'] = close[symbol].iloc[-1]
 
     # Find the highest volume pair
     max_volume_pair = None
     max_volume = 0
     for pair in data:
-        vol = data[pair].iloc[-1]['volume_avg'] * data[pair].iloc[-1]['close']
+        vol = data[pair]['volume_avg'] * data[pair]['close']
 
         if math.isnan(vol):
             vol = 0
@@ -55,16 +61,16 @@ def evaluate_coin_of_the_week(client: BitstampClient) -> str:
             max_volume = vol
             max_volume_pair = pair
 
-    std_max_vol = data[max_volume_pair].iloc[-1]['std_pct']
+    std_max_vol = data[max_volume_pair]['std_pct']
     log.info(f'{max_volume_pair} has the highest volume')
 
     # Determine the pair to go long
     long = None
     long_roc = -1
     for pair in data:
-        roc = data[pair].iloc[-1]['roc']
-        volume_roc = data[pair].iloc[-1]['volume_roc']
-        std = data[pair].iloc[-1]['std_pct']
+        roc = data[pair]['roc']
+        volume_roc = data[pair]['volume_roc']
+        std = data[pair]['std_pct']
         if std <= std_max_vol * 1.05 and roc > 0.01 and roc > long_roc and volume_roc > 0:
             long_roc = roc
             long = pair
@@ -80,33 +86,45 @@ def reset_orders(client: BitstampClient, coin_long: str):
     rounding_table = get_rounding_table(client)
     usd_balance = Decimal(balance['usd_balance'])
     client.cancelAllOrders()
+    tickers = client.getTickerSnapshot()
+    holdings = {}
     for asset in balance:
         if asset.endswith('_balance') and not asset.startswith('usd_'):
             coin = asset.split("_", 1)[0]
             pair = f'{coin}usd'
             coin_balance = Decimal(balance[asset])
             if pair == coin_long:
-                ticker = client.getHourlyTicker(pair)
-                price = Decimal(ticker['vwap'])
-                if price == 0:
-                    price = (Decimal(ticker['ask']) + Decimal(ticker['bid'])) / 2
                 if usd_balance > 20:
-                    # buy it
-                    amount = 500 / price if usd_balance > 550 else usd_balance * Decimal(0.99) / price
-                    amount = round(amount, rounding_table[pair])
-                    bitstamp_client.buyLimit(pair, price, amount)
+                    holdings[pair] = coin_balance
             elif coin_balance > 0:
-                ticker = client.getHourlyTicker(pair)
-                price = Decimal(ticker['vwap'])
-                if price == 0:
-                    price = (Decimal(ticker['ask']) + Decimal(ticker['bid'])) / 2
-                if coin_balance * price > 15:
-                    # sell it
-                    amount = 500 / price if coin_balance * price > 550 else coin_balance
-                    amount = round(amount, rounding_table[pair])
-                    bitstamp_client.sellLimit(pair, price, amount)
-
-    log.info('Orders reset done')
+                # The snapshot skips dust without asking for the hourly ticker of every asset held
+                if pair in tickers and coin_balance * Decimal(tickers[pair]['last']) < MIN_SELL_VALUE / 2:
+                    continue
+                holdings[pair] = coin_balance
+
+    # The hourly tickers of all pairs to trade in one concurrent batch
+    hourly_tickers = client.getHourlyTickers(list(holdings))
+    for (pair, coin_balance) in holdings.items():
+        price = get_order_price(hourly_tickers[pair])
+        if pair == coin_long:
+            # buy it
+            amount = 500 / price if usd_balance > 550 else usd_balance * Decimal(0.99) / price
+            amount = round(amount, rounding_table[pair])
+            client.buyLimit(pair, price, amount)
+        elif coin_balance * price > MIN_SELL_VALUE:
+            # sell it
+            amount = 500 / price if coin_balance * price > 550 else coin_balance
+            amount = round(amount, rounding_table[pair])
+            client.sellLimit(pair, price, amount)
+
+    log.info(f'Orders reset done, REST latency: {client.latency}, metadata cache: {client.metadataCache}')
+
+
+def get_order_price(ticker):
+    price = Decimal(ticker['vwap'])
+    if price == 0:
+        price = (Decimal(ticker['ask']) + Decimal(ticker['bid'])) / 2
+    return price
 
 
 def get_rounding_table(client):
@@ -117,25 +135,32 @@ def get_rounding_table(client):
     return reduce(r, client.getTradingPairsInfo(), {})
 
 
-bitstamp_client = BitstampClient()
+if __name__ == "__main__":
+    import pystore
+
+    logging.basicConfig(level=logging.INFO)
+    Path(BOT_PYSTORE_PATH).mkdir(parents=True, exist_ok=True)
+    pystore.set_path(BOT_PYSTORE_PATH)
+    bar_store = DailyBarStore(pystore.store(PYSTORE_STORE).collection(PYSTORE_COLLECTION_BOT_DAILY))
+    bitstamp_client = BitstampClient()
 
-last = datetime.now()
-coin_of_the_week = evaluate_coin_of_the_week(bitstamp_client)
-reset_orders(bitstamp_client, coin_of_the_week)
+    last = datetime.now()
+    coin_of_the_week = evaluate_coin_of_the_week(bitstamp_client, bar_store)
+    reset_orders(bitstamp_client, coin_of_the_week)
 
-while running:
-    now = datetime.now()
+    while running:
+        now = datetime.now()
 
-    try:
-        if now.weekday() == 6 and last.weekday() == 5:
-            coin_of_the_week = evaluate_coin_of_the_week(bitstamp_client)
+        try:
+            if now.weekday() == 6 and last.weekday() == 5:
+                coin_of_the_week = evaluate_coin_of_the_week(bitstamp_client, bar_store)
 
-        if now.minute % 5 == 0 and now.minute != last.minute:
-            reset_orders(bitstamp_client, coin_of_the_week)
+            if now.minute % 5 == 0 and now.minute != last.minute:
+                reset_orders(bitstamp_client, coin_of_the_week)
 
-        last = now
+            last = now
 
-    except Exception:
-        log.exception("Exception occurred")
+        except Exception:
+            log.exception("Exception occurred")
 
-    sleep(1)
+        sleep(1)
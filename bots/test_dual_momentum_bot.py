@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock
+
+import numpy as np
+
+from bots.dual_momentum_bot import evaluate_coin_of_the_week, reset_orders
+from data.daily_bar_store import DailyBarStore, DAY
+from data.test_daily_bar_store import FakeCollection
+from exchange.bitstamp.bitstamp_client import BitstampClient
+
+PAIRS = ['btcusd', 'ethusd', 'xrpusd']
+
+
+def pairs_info():
+    return [{'url_symbol': pair, 'trading': 'Enabled', 'instant_and_market_orders': 'Enabled', 'base_decimals': 8}
+            for pair in PAIRS]
+
+
+def daily_candles(days):
+    """Daily candles up to yesterday, ethusd rising with growing volume"""
+    random = np.random.default_rng(7)
+    first = int((datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0).timestamp())
+    growth = {'btcusd': 0.0, 'ethusd': 0.004, 'xrpusd': -0.002}
+    volume = {'btcusd': 1000.0, 'ethusd': 100.0, 'xrpusd': 500.0}
+    candles = {}
+    for pair in PAIRS:
+        closes = 100 * np.cumprod(1 + growth[pair] + random.normal(0, 0.01, days))
+        volumes = volume[pair] * (1 + np.arange(days) / days * (pair == 'ethusd'))
+        candles[pair] = [{'timestamp': str(first + i * DAY), 'open': str(close), 'high': str(close),
+                          'low': str(close), 'close': str(close), 'volume': str(amount)} for (i, (close, amount)) in
+                         enumerate(zip(closes, volumes))]
+    return candles
+
+
+class DualMomentumBotTest(TestCase):
+
+    def testEvaluationDuringRestOutage(self):
+        candles = daily_candles(300)
+
+        def get(url):
+            response = Mock()
+            if url == 'api/v2/trading-pairs-info/':
+                response.json.return_value = pairs_info()
+            else:
+                pair = url.split('/')[3].split('?')[0]
+                response.json.return_value = {'data': {'ohlc': candles[pair]}}
+            return response
+
+        rest_client = Mock()
+        rest_client.unauthenticated_get_request.side_effect = get
+        client = BitstampClient(rest_client)
+        bar_store = DailyBarStore(FakeCollection())
+
+        coin = evaluate_coin_of_the_week(client, bar_store)
+
+        # Neither the metadata nor the bars can be loaded, the ones loaded before are used
+        rest_client.unauthenticated_get_request.side_effect = ConnectionError('REST outage')
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(coin, evaluate_coin_of_the_week(client, bar_store))
+        client.close()
+
+        self.assertEqual('ethusd', coin)
+
+    def testResetOrdersPricesFromOneBatch(self):
+        client = Mock()
+        client.getBalance.return_value = {'usd_balance': '100.00', 'btc_balance': '0.01', 'eth_balance': '2.0',
+                                          'xrp_balance': '1.0', 'ltc_balance': '0.0'}
+        client.getTradingPairsInfo.return_value = pairs_info()
+        client.getTickerSnapshot.return_value = {'btcusd': {'last': '30000'}, 'ethusd': {'last': '2000'},
+                                                 'xrpusd': {'last': '0.5'}}
+        client.getHourlyTickers.side_effect = lambda pairs: {pair: {
+            'btcusd': {'vwap': '30000', 'ask': '30001', 'bid': '29999'},
+            'ethusd': {'vwap': '0', 'ask': '2001', 'bid': '1999'}}[pair] for pair in pairs}
+
+        reset_orders(client, 'btcusd')
+
+        # The xrp dust is not priced
+        client.getHourlyTickers.assert_called_once_with(['btcusd', 'ethusd'])
+        client.getHourlyTicker.assert_not_called()
+        (pair, price, _) = client.buyLimit.call_args.args
+        self.assertEqual(('btcusd', Decimal('30000')), (pair, price))
+        client.sellLimit.assert_called_once_with('ethusd', Decimal('2000'), Decimal('0.25000000'))
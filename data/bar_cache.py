@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import pandas
+
+from data.sanitize import last_timestamp, read_since
+from data.settings import PYSTORE_COLLECTION_SANITIZED, PYSTORE_COLLECTION_BARS
+
+# How far before a bar's label its first minute can be, weekly bars are labelled with the Sunday they end on
+SPANS = {
+    '1h': timedelta(hours=1),
+    '1D': timedelta(days=1),
+    'W-SUN': timedelta(days=7),
+}
+
+
+def resample_bars(df, tf):
+    ohlc = df['close'].resample(tf).ohlc()
+    volume = df['volume'].resample(tf).sum()
+    return pandas.merge(ohlc, volume, left_index=True, right_index=True)
+
+
+def bars_after(minutes, tf, after=None):
+    bars = resample_bars(minutes, tf)
+    return bars if after is None else bars[bars.index > after]
+
+
+def complete_bars(minutes, tf, after=None):
+    # The last minute always belongs to the last bar, so that one may still change
+    return bars_after(minutes, tf, after)[:-1]
+
+
+class BarCache:
+    """
+    Complete bars of every timeframe are materialized in their own collection and extended whenever new 1 minute
+    data lands. The bar still in progress is aggregated on read from the few minutes after the last stored bar.
+    """
+
+    def __init__(self, store, timeframes=None):
+        self._sanitized = store.collection(PYSTORE_COLLECTION_SANITIZED)
+        self._collections = {}
+        for tf in timeframes or PYSTORE_COLLECTION_BARS:
+            self._collections[tf] = store.collection(PYSTORE_COLLECTION_BARS[tf])
+
+    def timeframes(self):
+        return list(self._collections.keys())
+
+    def _since(self, tf, last_stored):
+        return None if last_stored is None else last_stored - SPANS[tf]
+
+    def update(self, pair):
+        for (tf, collection) in self._collections.items():
+            last_stored = last_timestamp(collection, pair)
+            bars = complete_bars(read_since(self._sanitized, pair, self._since(tf, last_stored)), tf, last_stored)
+            if len(bars) == 0:
+                continue
+            if last_stored is None:
+                collection.write(pair, bars)
+            else:
+                collection.append(pair, bars)
+
+    def read_bars(self, pair, tf):
+        collection = self._collections[tf]
+        last_stored = last_timestamp(collection, pair)
+        if last_stored is None:
+            return resample_bars(read_since(self._sanitized, pair, None), tf)
+
+        stored = collection.item(pair).to_pandas()
+        pending = bars_after(read_since(self._sanitized, pair, self._since(tf, last_stored)), tf, last_stored)
+        return pandas.concat([stored, pending])
@@ -0,0 +1,81 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pandas
+
+DAY = 60 * 60 * 24
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def candles_to_dataframe(candles):
+    """Bars labelled with the naive UTC time they start, like the weeks of online_indicators"""
+    df = pandas.DataFrame(candles)
+    df['timestamp'] = pandas.to_datetime(df['timestamp'].astype('int64'), unit='s')
+    df = df.set_index('timestamp')
+    df = df.astype(
+        {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64',
+         'volume': 'float64'})
+    return df[['open', 'high', 'low', 'close', 'volume']]
+
+
+class DailyBarStore:
+    """
+    Complete daily bars per pair kept in a pystore collection. An update only downloads the candles after the last
+    stored day and falls back to the stored history when a pair cannot be downloaded.
+    """
+
+    def __init__(self, collection, now=utc_now):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._collection = collection
+        self._now = now
+        self._bars = {}
+
+    def stored(self, pair):
+        if pair not in self._bars:
+            exists = pair in self._collection.list_items()
+            self._bars[pair] = self._collection.item(pair).to_pandas() if exists else None
+        return self._bars[pair]
+
+    def update(self, client, pairs):
+        starts = {}
+        for pair in pairs:
+            stored = self.stored(pair)
+            if stored is not None:
+                starts[pair] = int(stored.index[-1].timestamp()) + DAY
+
+        responses = client.getBarsForPairs(pairs, DAY, starts, return_exceptions=True)
+
+        bars = {}
+        for pair in pairs:
+            stored = self.stored(pair)
+            response = responses[pair]
+            if isinstance(response, Exception):
+                self._logger.warning(f'Could not download bars of {pair}, using the stored history: {response!r}')
+                if stored is not None:
+                    bars[pair] = stored
+                continue
+
+            candles = response['data']['ohlc']
+            new = candles_to_dataframe(candles) if len(candles) > 0 else None
+            if new is not None and stored is not None:
+                new = new[new.index > stored.index[-1]]
+            if new is None or len(new) == 0:
+                if stored is not None:
+                    bars[pair] = stored
+                continue
+
+            # The candle of the current day is still changing, it is returned but not stored
+            complete = new[new.index + timedelta(days=1) <= self._now()]
+            if len(complete) > 0:
+                if stored is None:
+                    self._collection.write(pair, complete)
+                else:
+                    self._collection.append(pair, complete)
+                stored = complete if stored is None else pandas.concat([stored, complete])
+                self._bars[pair] = stored
+            pending = new[len(complete):]
+            bars[pair] = pending if stored is None else pandas.concat([stored, pending])
+        return bars
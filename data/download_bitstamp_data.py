@@ -1,114 +1,134 @@
-import json
-import logging
-import sys
-import time
+import argparse
+import os
+import threading
 import warnings
-from datetime import datetime, timedelta
+from datetime import datetime
 from datetime import timezone
 from pathlib import Path
 
-import pandas
 import pystore
-import requests
 
-from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION, BITSTAMP_TRADING_PAIRS, PYSTORE_COLLECTION_SANITIZED
+from data.bar_cache import BarCache
+from data.manifest import ManifestStore
+from data.ohlc_downloader import OhlcDownloader
+from data.partitioned_store import PartitionedStore
+from data.sanitize import OVERLAP, last_timestamp, read_since, sanitize, find_gaps
+from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION, BITSTAMP_TRADING_PAIRS, PYSTORE_COLLECTION_SANITIZED, \
+    PARTITIONED_STORE_PATH, MANIFEST_DIRECTORY
 from util.base_command import BaseCommand
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-STEP = 60
-LIMIT = 1000
-
 
 class DownloadBitstampData(BaseCommand):
 
     def run(self, *args, **options):
-        Path(BITSTAMP_PYSTORE_PATH).mkdir(parents=True, exist_ok=True)
-        # How to use PyStore:
-        # https://medium.com/@aroussi/fast-data-store-for-pandas-time-series-data-using-pystore-89d9caeef4e2
-        pystore.set_path(BITSTAMP_PYSTORE_PATH)
-        store = pystore.store(PYSTORE_STORE)
+        if options.get('partitioned', False):
+            root = PARTITIONED_STORE_PATH
+            store = PartitionedStore(root)
+        else:
+            root = BITSTAMP_PYSTORE_PATH
+            Path(BITSTAMP_PYSTORE_PATH).mkdir(parents=True, exist_ok=True)
+            # How to use PyStore:
+            # https://medium.com/@aroussi/fast-data-store-for-pandas-time-series-data-using-pystore-89d9caeef4e2
+            pystore.set_path(BITSTAMP_PYSTORE_PATH)
+            store = pystore.store(PYSTORE_STORE)
+        # Every write updates the manifests, the last timestamps of the pairs are read from there
+        store = ManifestStore(store, os.path.join(root, MANIFEST_DIRECTORY))
         collection = store.collection(PYSTORE_COLLECTION)
         collection_sanitized = store.collection(PYSTORE_COLLECTION_SANITIZED)
+        bar_cache = BarCache(store)
+
+        concurrent = options.get('concurrent', False)
+        end = int(datetime.today().timestamp())
+        starts = {}
+        for pair in BITSTAMP_TRADING_PAIRS:
+            last = last_timestamp(collection, pair)
+            if last is None:
+                starts[pair] = int(datetime(2015, 1, 1, tzinfo=timezone.utc).timestamp())
+            else:
+                starts[pair] = int(last.to_pydatetime().timestamp()) - 3600
+
+        ############################################################################################################
+        # Get all data available for all pairs
+        ############################################################################################################
+        self.logger.info(f'Getting data for {len(starts)} pairs')
+
+        written = set(collection.list_items())
+        lock = threading.Lock()
+
+        def write(pair, df):
+            # Pages of a pair arrive in order, the lock only keeps pystore writes of different pairs apart
+            with lock:
+                if pair in written:
+                    collection.append(pair, df)
+                else:
+                    collection.write(pair, df)
+                    written.add(pair)
+
+        if concurrent:
+            downloader = OhlcDownloader(max_workers=options.get('workers', 8), pages_in_flight=4)
+        else:
+            downloader = OhlcDownloader()
+        try:
+            failed = downloader.download_all(starts, end, write)
+        finally:
+            downloader.close()
 
         for pair in BITSTAMP_TRADING_PAIRS:
+            if pair in failed:
+                self.logger.error(f'Skipping {pair}, its download did not complete')
+                continue
+
             self.logger.info('')
             self.logger.info('###############################################################################')
             self.logger.info(f'Processing {pair}')
 
-            ############################################################################################################
-            # Get all data available for that pair
-            ############################################################################################################
-            self.logger.info(f'Getting data for {pair}')
-
-            exists = pair in collection.list_items()
-            if not exists:
-                start = int(datetime(2015, 1, 1, tzinfo=timezone.utc).timestamp())
-            else:
-                start = int(collection.item(pair).to_pandas().index[-1].to_pydatetime().timestamp()) - 3600
-
-            while start < datetime.today().timestamp() - 3600:
-                try:
-                    url = f'https://www.bitstamp.net/api/v2/ohlc/{pair}/?step={STEP}&start={start}&limit=1000'
-                    self.logger.info(f'{pair} - {datetime.fromtimestamp(start)} - {url}')
-                    response = requests.get(url)
-                    assert response.status_code == 200
-                    response_data = json.loads(response.text)['data']['ohlc']
-                    if len(response_data) == 0:
-                        time.sleep(0.1)
-                        start += 60 * 60 * 24 * 14
-                        continue
-                    df = pandas.DataFrame(response_data)
-                    df['timestamp'] = df['timestamp'].apply(lambda x: datetime.fromtimestamp(int(x)))
-                    df = df.set_index('timestamp')
-                    df = df.astype(
-                        {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64',
-                         'volume': 'float64'})
-                    ohlc = df['close'].resample('1min').ohlc()
-                    volume = df['volume'].resample('1min').sum()
-                    df = pandas.merge_ordered(ohlc, volume, on='timestamp').set_index('timestamp')
-                    if exists:
-                        collection.append(pair, df)
-                    else:
-                        collection.write(pair, df)
-                        exists = True
-                    start = int(df.index[-1].to_pydatetime().timestamp())
-                except Exception:
-                    self.logger.error("Unexpected error:", sys.exc_info()[0])
-                    time.sleep(10)
-
             ############################################################################################################
             # Sanitize and validate the data
             ############################################################################################################
 
             self.logger.info(f'Sanitizing data for {pair}')
-            df = collection.item(pair).to_pandas()
+            last_sanitized = last_timestamp(collection_sanitized, pair)
+            since = None if last_sanitized is None else last_sanitized - OVERLAP
+            df = sanitize(read_since(collection, pair, since), last_sanitized)
+            if len(df) == 0:
+                self.logger.info(f'No new data for {pair}')
+            else:
+                self.validate_and_write(collection_sanitized, pair, df, last_sanitized)
+                collection.manifest.sanitized(pair, df.index[-1])
 
-            df = df.reindex(pandas.date_range(df.index[0], df.index[-1], freq='1min'), fill_value=None)
-            df[['volume']] = df[['volume']].fillna(value=0)
+            self.logger.info(f'Updating bars for {pair}')
+            bar_cache.update(pair)
 
-            self.logger.info(f'Validating data for {pair}')
+    def validate_and_write(self, collection_sanitized, pair, df, last_sanitized):
+        self.logger.info(f'Validating {len(df)} new rows for {pair} since {last_sanitized}')
 
-            # Does it have any gaps?
-            deltas = df.index.to_series().diff()[1:]
-            gaps = deltas[deltas > timedelta(minutes=1)]
-            self.logger.info(gaps.tail())
-            if len(gaps) > 0:
-                self.self.logger.error(f'There are gaps in {pair}')
-                exit(9)
+        # Does it have any gaps?
+        gaps = find_gaps(df, last_sanitized)
+        self.logger.info(gaps.tail())
+        if len(gaps) > 0:
+            self.logger.error(f'There are gaps in {pair}')
+            exit(9)
 
-            # Does it have any NaN values in volume?
-            if df['volume'].isnull().sum().sum() > 0:
-                self.self.logger.error(f'There are NaN values in {pair}')
-                exit(9)
+        # Does it have any NaN values in volume?
+        if df['volume'].isnull().sum().sum() > 0:
+            self.logger.error(f'There are NaN values in {pair}')
+            exit(9)
 
-            exists = pair in collection_sanitized.list_items()
-            if exists:
-                collection_sanitized.append(pair, df)
-            else:
-                collection_sanitized.write(pair, df)
+        if last_sanitized is not None:
+            collection_sanitized.append(pair, df)
+        else:
+            collection_sanitized.write(pair, df)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrent', action='store_true', help='Download several pairs and pages in parallel')
+    parser.add_argument('--workers', type=int, default=8, help='Pairs downloaded in parallel in concurrent mode')
+    parser.add_argument('--partitioned', action='store_true', help='Use the partitioned store instead of pystore')
+    arguments = parser.parse_args()
+
     download_bitstamp_data = DownloadBitstampData()
-    download_bitstamp_data.run()
+    download_bitstamp_data.run(concurrent=arguments.concurrent, workers=arguments.workers,
+                               partitioned=arguments.partitioned)
@@ -0,0 +1,239 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas
+
+from data.sanitize import read_since
+
+FIELDS = ('first', 'last', 'rows', 'checksum', 'sanitized')
+
+
+def row_hashes(df):
+    """Sum of the hashes of the rows of df with their timestamps, wrapping around at 64 bits"""
+    hashes = pandas.util.hash_pandas_object(df.astype(np.float64), index=True).to_numpy()
+    return int(hashes.sum(dtype=np.uint64))
+
+
+def checksum(df):
+    """
+    Checksum of the content of a stored pair: the rows are unique and sorted by timestamp, so the sum of their hashes
+    identifies the frame and can be updated by the rows an append replaces and adds. Pairs storing the same rows
+    have the same one however they were written.
+    """
+    return f'{row_hashes(df):016x}'
+
+
+def timestamp(value):
+    return None if value is None else pandas.Timestamp(value)
+
+
+class Manifest:
+    """
+    First and last timestamp, rows, checksum and last sanitized timestamp of every pair of a collection in a
+    small json file, so the time range of the pairs is known without reading their data. Several processes can
+    share it: changes are made to the file as it is on disk while holding a lock file, and reads pick up the
+    changes of others.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._pairs = {}
+        # Identifies the version of the file that was read, os.replace gives every save a new inode
+        self._version = None
+        self._load()
+
+    def _load(self):
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            (self._pairs, self._version) = ({}, None)
+            return
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._version:
+            with open(self._path) as f:
+                self._pairs = json.load(f)
+            self._version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read(self):
+        with self._lock:
+            self._load()
+            return self._pairs
+
+    @contextmanager
+    def _update(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+            with open(self._path + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another process may have saved since the last read
+                self._load()
+                yield self._pairs
+                with open(self._path + '.tmp', 'w') as f:
+                    json.dump(self._pairs, f, indent=1, sort_keys=True)
+                os.replace(self._path + '.tmp', self._path)
+                stat = os.stat(self._path)
+                self._version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def __contains__(self, pair):
+        return pair in self._read()
+
+    def pairs(self):
+        return sorted(self._read().keys())
+
+    def entry(self, pair):
+        """The fields of a pair with its timestamps as pandas Timestamps, None if not known"""
+        entry = self._read().get(pair)
+        if entry is None:
+            return None
+        return {**entry, 'first': timestamp(entry['first']), 'last': timestamp(entry['last']),
+                'sanitized': timestamp(entry.get('sanitized'))}
+
+    def first(self, pair):
+        return self.entry(pair)['first'] if pair in self else None
+
+    def last(self, pair):
+        return self.entry(pair)['last'] if pair in self else None
+
+    def written(self, pair, df, rows, checksum, replace=False):
+        """
+        Records a write, or with replace a write replacing all rows, of the rows of df; rows and checksum are those
+        of the pair stored after it
+        """
+        if len(df) == 0 and not replace:
+            return
+        with self._update() as pairs:
+            previous = None if replace else pairs.get(pair)
+            if len(df) == 0:
+                pairs.pop(pair, None)
+            elif previous is None:
+                pairs[pair] = {'first': df.index.min().isoformat(), 'last': df.index.max().isoformat(),
+                               'rows': rows, 'checksum': checksum, 'sanitized': None}
+            else:
+                previous.update({
+                    'first': min(timestamp(previous['first']), df.index.min()).isoformat(),
+                    'last': max(timestamp(previous['last']), df.index.max()).isoformat(),
+                    'rows': rows,
+                    'checksum': checksum,
+                })
+
+    def sanitized(self, pair, last_sanitized):
+        with self._update() as pairs:
+            if pair in pairs:
+                pairs[pair]['sanitized'] = last_sanitized.isoformat()
+
+    def remove(self, pair):
+        with self._update() as pairs:
+            pairs.pop(pair, None)
+
+    def common_range(self, pairs=None):
+        """(latest first, earliest last) timestamp of the pairs, the range all of them have data for"""
+        entries = [self.entry(pair) for pair in (self.pairs() if pairs is None else pairs) if pair in self]
+        if len(entries) == 0:
+            return None, None
+        return max(entry['first'] for entry in entries), min(entry['last'] for entry in entries)
+
+    def freshness(self, now=None):
+        """A row per pair with its fields and how old its last row and last sanitized row are"""
+        now = pandas.Timestamp.now() if now is None else pandas.Timestamp(now)
+        table = pandas.DataFrame([{'pair': pair, **self.entry(pair)} for pair in self.pairs()],
+                                 columns=['pair', *FIELDS])
+        table['age'] = now - pandas.to_datetime(table['last'])
+        table['sanitized_age'] = now - pandas.to_datetime(table['sanitized'])
+        return table.set_index('pair')
+
+
+class ManifestCollection:
+    """A pystore or partitioned collection keeping the manifest of its pairs up to date on every write"""
+
+    def __init__(self, collection, manifest):
+        self.collection = collection
+        self.manifest = manifest
+
+    def list_items(self):
+        return self.collection.list_items()
+
+    def item(self, pair, *args, **kwargs):
+        return self.collection.item(pair, *args, **kwargs)
+
+    def _known(self, pair):
+        """Adds a pair written before the manifest existed by reading it once, False if the pair is not stored"""
+        if pair in self.manifest:
+            return True
+        if pair not in self.collection.list_items():
+            return False
+        df = self.collection.item(pair).to_pandas()
+        self.manifest.written(pair, df, len(df), checksum(df), replace=True)
+        return True
+
+    def write(self, pair, df, *args, **kwargs):
+        self.collection.write(pair, df, *args, **kwargs)
+        stored = df[~df.index.duplicated(keep='last')]
+        self.manifest.written(pair, df, len(stored), checksum(stored), replace=True)
+
+    def append(self, pair, df, *args, **kwargs):
+        known = len(df) > 0 and self._known(pair)
+        if known:
+            # Only the stored rows from the first one of df on can be replaced, the others are not read
+            before = read_since(self.collection, pair, df.index.min())
+        self.collection.append(pair, df, *args, **kwargs)
+        if len(df) == 0:
+            return
+        added = df[~df.index.duplicated(keep='last')]
+        if known:
+            # Rows of df replace stored rows with the same timestamp
+            after = pandas.concat([before[~before.index.isin(added.index)], added[before.columns]])
+            entry = self.manifest.entry(pair)
+            rows = entry['rows'] - len(before) + len(after)
+            value = row_hashes(after) - row_hashes(before) + int(entry['checksum'], 16)
+            self.manifest.written(pair, df, rows, f'{value % (1 << 64):016x}')
+        else:
+            self.manifest.written(pair, df, len(added), checksum(added))
+
+    def delete_item(self, pair):
+        self.collection.delete_item(pair)
+        self.manifest.remove(pair)
+
+    def last_timestamp(self, pair):
+        return self.manifest.last(pair) if self._known(pair) else None
+
+    def common_range(self, pairs):
+        """(latest first, earliest last) timestamp of the stored pairs, the range all of them have data for"""
+        return self.manifest.common_range([pair for pair in pairs if self._known(pair)])
+
+    def read_since(self, pair, since):
+        return read_since(self.collection, pair, since)
+
+
+class ManifestStore:
+    """A pystore or partitioned store whose collections keep their manifest in directory"""
+
+    def __init__(self, store, directory):
+        self._store = store
+        self._directory = directory
+        self._collections = {}
+
+    def collection(self, name):
+        if name not in self._collections:
+            manifest = Manifest(os.path.join(self._directory, f'{name}.json'))
+            self._collections[name] = ManifestCollection(self._store.collection(name), manifest)
+        return self._collections[name]
+
+
+if __name__ == "__main__":
+    from data.settings import BITSTAMP_PYSTORE_PATH, PARTITIONED_STORE_PATH, PYSTORE_COLLECTION, MANIFEST_DIRECTORY
+
+    parser = argparse.ArgumentParser(description='Shows how fresh the data of every pair is')
+    parser.add_argument('--collection', default=PYSTORE_COLLECTION)
+    parser.add_argument('--partitioned', action='store_true', help='The manifest of the partitioned store')
+    arguments = parser.parse_args()
+
+    root = PARTITIONED_STORE_PATH if arguments.partitioned else BITSTAMP_PYSTORE_PATH
+    manifest = Manifest(os.path.join(root, MANIFEST_DIRECTORY, f'{arguments.collection}.json'))
+    with pandas.option_context('display.max_rows', None, 'display.width', 200):
+        print(manifest.freshness().sort_values('age'))
+    print(f'All pairs have data from {manifest.common_range()[0]} to {manifest.common_range()[1]}')
@@ -0,0 +1,122 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas
+import requests
+from requests.adapters import HTTPAdapter
+
+from data.settings import BITSTAMP_API_URL, BITSTAMP_REQUESTS_PER_SECOND
+from util.rate_limiter import RateLimiter
+
+STEP = 60
+LIMIT = 1000
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def to_dataframe(response_data):
+    df = pandas.DataFrame(response_data)
+    df['timestamp'] = df['timestamp'].apply(lambda x: datetime.fromtimestamp(int(x)))
+    df = df.set_index('timestamp')
+    df = df.astype(
+        {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64',
+         'volume': 'float64'})
+    ohlc = df['close'].resample('1min').ohlc()
+    volume = df['volume'].resample('1min').sum()
+    return pandas.merge_ordered(ohlc, volume, on='timestamp').set_index('timestamp')
+
+
+def pages(start, end):
+    while start < end:
+        yield start, min(start + (LIMIT - 1) * STEP, end)
+        start += LIMIT * STEP
+
+
+class OhlcDownloader:
+    """
+    Downloads 1 minute OHLC pages over pooled keep alive connections. Pages of one pair are fetched concurrently
+    but always handed to the writer in order; several pairs can be downloaded at the same time.
+    """
+
+    def __init__(self, max_workers=1, pages_in_flight=1, rate_limiter=None, retries=5, backoff=1.0, timeout=30,
+                 session=None, sleep=time.sleep):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._max_workers = max_workers
+        self._pages_in_flight = pages_in_flight
+        self._rate_limiter = rate_limiter or RateLimiter(BITSTAMP_REQUESTS_PER_SECOND)
+        self._retries = retries
+        self._backoff = backoff
+        self._timeout = timeout
+        self._sleep = sleep
+        self._session = session or requests.Session()
+        pool_size = max_workers * pages_in_flight
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self._pages = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='ohlc-page')
+
+    def close(self):
+        self._pages.shutdown()
+        self._session.close()
+
+    def get_page(self, pair, start, end):
+        url = f'{BITSTAMP_API_URL}api/v2/ohlc/{pair}/'
+        params = {'step': STEP, 'start': start, 'end': end, 'limit': LIMIT}
+        for attempt in range(self._retries + 1):
+            self._rate_limiter.acquire()
+            delay = self._backoff * 2 ** attempt
+            try:
+                response = self._session.get(url, params=params, timeout=self._timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = repr(e)
+            else:
+                if response.status_code == 200:
+                    return response.json()['data']['ohlc']
+                if response.status_code not in RETRY_STATUS:
+                    raise Exception(f'Response not ok: {response.status_code} {response.text}')
+                error = f'{response.status_code} {response.text}'
+                retry_after = response.headers.get('Retry-After')
+                if retry_after is not None and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+
+            if attempt < self._retries:
+                delay = delay * (1 + random.random() / 2)
+                self._logger.warning(f'{pair} - {datetime.fromtimestamp(start)} - {error}, retrying in {delay:.1f}s')
+                self._sleep(delay)
+        raise Exception(f'Giving up on {pair} page {start} after {self._retries + 1} attempts: {error}')
+
+    def download(self, pair, start, end, write):
+        pending = deque()
+
+        def flush():
+            page_start, future = pending.popleft()
+            response_data = future.result()
+            self._logger.info(f'{pair} - {datetime.fromtimestamp(page_start)} - {len(response_data)} candles')
+            if len(response_data) > 0:
+                write(pair, to_dataframe(response_data))
+
+        for (page_start, page_end) in pages(start, end):
+            pending.append((page_start, self._pages.submit(self.get_page, pair, page_start, page_end)))
+            if len(pending) >= self._pages_in_flight:
+                flush()
+        while len(pending) > 0:
+            flush()
+
+    def download_all(self, starts, end, write):
+        """Downloads every pair from its start, returns the pairs which failed"""
+        failed = []
+        lock = threading.Lock()
+
+        def download(pair):
+            try:
+                self.download(pair, starts[pair], end, write)
+            except Exception:
+                self._logger.exception(f'Download of {pair} failed')
+                with lock:
+                    failed.append(pair)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='ohlc-pair') as pool:
+            list(pool.map(download, starts))
+        return failed
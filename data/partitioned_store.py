@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+# Bitstamp quotes no pair with more decimals
+MAX_DECIMALS = 8
+PARTITIONS = {
+    'M': 'datetime64[M]',
+    'Y': 'datetime64[Y]',
+}
+
+
+def to_seconds(timestamp):
+    # Naive timestamps are stored as they are, like pystore does
+    return pandas.Timestamp(timestamp).value // 10 ** 9
+
+
+def decimals(values):
+    """Smallest number of decimals the values are written with, None if more than MAX_DECIMALS"""
+    for count in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(values, count), values, equal_nan=True):
+            return count
+    return None
+
+
+def compact(values):
+    """float32 values and their decimals when rounding them back gives the values, otherwise the values unchanged"""
+    count = decimals(values)
+    if count is not None:
+        values32 = values.astype(np.float32)
+        if np.array_equal(np.round(values32.astype(np.float64), count), values, equal_nan=True):
+            return values32, count
+    return values, None
+
+
+def restore(values, count):
+    values = np.asarray(values, dtype=np.float64)
+    return values if count is None else np.round(values, count)
+
+
+class PartitionedItem:
+    """The part of pystore's item used by the data code"""
+
+    def __init__(self, collection, pair):
+        self._collection = collection
+        self._pair = pair
+
+    def to_pandas(self):
+        return self._collection.read(self._pair)
+
+    def tail(self, rows=5):
+        return self._collection.tail(self._pair, rows)
+
+
+class PartitionedCollection:
+    """
+    1 minute bars, or any other bars, of every pair in one file per month or year: a structured numpy array with
+    the integer epoch second of every row and float32 prices wherever their decimals survive the conversion. The
+    meta.json of a pair records the file, time range, rows and decimals of every partition, so a read only opens
+    the partitions it needs and memory maps them to copy just the requested rows and columns. A rewritten
+    partition goes to a new file which replacing meta.json switches to, so a crash never pairs data with the
+    decimals of other data.
+
+    write, append, list_items and item behave like those of a pystore collection.
+    """
+
+    def __init__(self, directory, partition='M'):
+        self._directory = directory
+        self._partition = partition
+        os.makedirs(directory, exist_ok=True)
+
+    def list_items(self):
+        return {name for name in os.listdir(self._directory) if
+                os.path.exists(os.path.join(self._directory, name, 'meta.json'))}
+
+    def item(self, pair):
+        return PartitionedItem(self, pair)
+
+    def _path(self, pair, *names):
+        return os.path.join(self._directory, pair, *names)
+
+    def meta(self, pair):
+        with open(self._path(pair, 'meta.json')) as f:
+            return json.load(f)
+
+    def _write_meta(self, pair, meta):
+        path = self._path(pair, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def _file(self, pair, info):
+        return self._path(pair, info['file'])
+
+    def _write_partition(self, pair, key, version, timestamps, df):
+        columns = list(df.columns)
+        arrays = {'timestamp': timestamps}
+        column_decimals = {}
+        for column in columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            if column in PRICE_COLUMNS:
+                (values, column_decimals[column]) = compact(values)
+            arrays[column] = values
+        records = np.zeros(len(timestamps), dtype=[(name, array.dtype) for (name, array) in arrays.items()])
+        for (name, array) in arrays.items():
+            records[name] = array
+        name = f'{key}.{version}.npy'
+        with open(self._path(pair, name), 'wb') as f:
+            np.save(f, records)
+        return {'file': name, 'first': int(timestamps[0]), 'last': int(timestamps[-1]), 'rows': len(timestamps),
+                'decimals': column_decimals}
+
+    def _store(self, pair, df, meta):
+        timestamps = df.index.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        keys = timestamps.astype('datetime64[s]').astype(PARTITIONS[meta['partition']]).astype(str)
+        (unique, starts) = np.unique(keys, return_index=True)
+        ends = np.append(starts[1:], len(keys))
+        version = meta.get('version', 0) + 1
+        replaced = []
+        for (key, begin, end) in zip(unique, starts, ends):
+            key = str(key)
+            if key in meta['partitions']:
+                replaced.append(self._file(pair, meta['partitions'][key]))
+            meta['partitions'][key] = self._write_partition(pair, key, version, timestamps[begin:end],
+                                                             df.iloc[begin:end])
+        meta['partitions'] = dict(sorted(meta['partitions'].items()))
+        meta['version'] = version
+        # Until here readers and a crash see the previous partitions
+        self._write_meta(pair, meta)
+        for path in replaced:
+            os.remove(path)
+
+    def write(self, pair, df):
+        shutil.rmtree(self._path(pair), ignore_errors=True)
+        os.makedirs(self._path(pair))
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        self._store(pair, df, {'partition': self._partition, 'index': df.index.name, 'columns': list(df.columns),
+                               'partitions': {}})
+
+    def append(self, pair, df):
+        """Rows of df replace stored rows with the same timestamp, like pystore's append"""
+        if len(df) == 0:
+            return
+        meta = self.meta(pair)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        # Only the stored partitions the new rows fall into are rewritten
+        first = to_seconds(df.index[0])
+        touched = [info for info in meta['partitions'].values() if info['last'] >= first]
+        if len(touched) > 0:
+            stored = self.read(pair, start=pandas.Timestamp(touched[0]['first'], unit='s'))
+            df = pandas.concat([stored[~stored.index.isin(df.index)], df[stored.columns]]).sort_index()
+        self._store(pair, df, meta)
+
+    def delete_item(self, pair):
+        shutil.rmtree(self._path(pair), ignore_errors=True)
+
+    def _read_partitions(self, pair, keys, meta, start, end, columns):
+        timestamps = []
+        values = {column: [] for column in columns}
+        for key in keys:
+            records = np.load(self._file(pair, meta['partitions'][key]), mmap_mode='r')
+            begin = np.searchsorted(records['timestamp'], start, side='left')
+            stop = np.searchsorted(records['timestamp'], end, side='left')
+            timestamps.append(np.asarray(records['timestamp'][begin:stop]))
+            for column in columns:
+                values[column].append(restore(records[column][begin:stop],
+                                              meta['partitions'][key]['decimals'].get(column)))
+        if len(keys) == 0:
+            return pandas.DataFrame({column: np.zeros(0) for column in columns},
+                                    index=pandas.DatetimeIndex([], name=meta['index']))
+        index = pandas.DatetimeIndex(np.concatenate(timestamps).astype('datetime64[s]').astype('datetime64[ns]'),
+                                     name=meta['index'])
+        return pandas.DataFrame({column: np.concatenate(values[column]) for column in columns}, index=index)
+
+    def read(self, pair, start=None, end=None, columns=None):
+        """Rows with start <= timestamp < end, only the partitions overlapping that range are opened"""
+        meta = self.meta(pair)
+        start = np.iinfo(np.int64).min if start is None else to_seconds(start)
+        end = np.iinfo(np.int64).max if end is None else to_seconds(end)
+        keys = [key for (key, info) in meta['partitions'].items() if info['last'] >= start and info['first'] < end]
+        return self._read_partitions(pair, keys, meta, start, end, columns or meta['columns'])
+
+    def tail(self, pair, rows=5):
+        meta = self.meta(pair)
+        keys = []
+        count = 0
+        for (key, info) in reversed(meta['partitions'].items()):
+            keys.insert(0, key)
+            count += info['rows']
+            if count >= rows:
+                break
+        df = self._read_partitions(pair, keys, meta, np.iinfo(np.int64).min, np.iinfo(np.int64).max, meta['columns'])
+        return df[-rows:]
+
+    def last_timestamp(self, pair):
+        """From meta.json, without reading any partition"""
+        if pair not in self.list_items():
+            return None
+        partitions = self.meta(pair)['partitions']
+        if len(partitions) == 0:
+            return None
+        return pandas.Timestamp(list(partitions.values())[-1]['last'], unit='s')
+
+    def rows(self, pair):
+        return sum(info['rows'] for info in self.meta(pair)['partitions'].values())
+
+    def read_since(self, pair, since):
+        return self.read(pair, start=since)
+
+
+class PartitionedStore:
+    """Stands in for a pystore store, e.g. for BarCache"""
+
+    def __init__(self, path, partition='M'):
+        self._path = path
+        self._partition = partition
+
+    def collection(self, name):
+        return PartitionedCollection(os.path.join(self._path, name), self._partition)
+
+
+if __name__ == "__main__":
+    import pystore
+
+    from data.settings import BITSTAMP_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION, \
+        PYSTORE_COLLECTION_SANITIZED, PARTITIONED_STORE_PATH
+
+    parser = argparse.ArgumentParser(description='Copies pystore collections to the partitioned store')
+    parser.add_argument('--collections', nargs='+', default=[PYSTORE_COLLECTION, PYSTORE_COLLECTION_SANITIZED])
+    parser.add_argument('--partition', choices=list(PARTITIONS), default='M')
+    arguments = parser.parse_args()
+
+    pystore.set_path(BITSTAMP_PYSTORE_PATH)
+    source = pystore.store(PYSTORE_STORE)
+    target = PartitionedStore(PARTITIONED_STORE_PATH, arguments.partition)
+    for name in arguments.collections:
+        collection = source.collection(name)
+        for pair in sorted(collection.list_items()):
+            target.collection(name).write(pair, collection.item(pair).to_pandas())
+            print(f'Copied {name}/{pair}')
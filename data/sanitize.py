@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+import pandas
+
+ONE_MINUTE = timedelta(minutes=1)
+# Raw rows read before the last sanitized timestamp, so the grid is rebuilt across the boundary
+OVERLAP = timedelta(hours=1)
+
+
+def last_timestamp(collection, pair):
+    # Partitioned and manifest collections know it without reading the pair
+    if hasattr(collection, 'last_timestamp'):
+        return collection.last_timestamp(pair)
+    if pair not in collection.list_items():
+        return None
+    return collection.item(pair).tail(1).index[-1]
+
+
+def read_since(collection, pair, since):
+    if hasattr(collection, 'read_since'):
+        return collection.read_since(pair, since)
+    if since is None:
+        return collection.item(pair).to_pandas()
+    # The filter is pushed down to the parquet row groups, the mask removes what is left of older rows
+    column = collection.item(pair).data.index.name or '__index_level_0__'
+    df = collection.item(pair, filters=[(column, '>=', since)]).to_pandas()
+    return df[df.index >= since]
+
+
+def sanitize(df, last_sanitized=None):
+    """
+    Aligns raw 1 minute bars to a continuous 1 minute grid. With last_sanitized only the rows after it are
+    returned and the grid continues right after it.
+    """
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    if last_sanitized is not None:
+        df = df[df.index > last_sanitized]
+    if len(df) == 0:
+        return df
+
+    first = df.index[0] if last_sanitized is None else last_sanitized + ONE_MINUTE
+    df = df.reindex(pandas.date_range(first, df.index[-1], freq='1min'), fill_value=None)
+    df[['volume']] = df[['volume']].fillna(value=0)
+    return df
+
+
+def find_gaps(df, last_sanitized=None):
+    index = df.index.to_series()
+    if last_sanitized is not None:
+        index = pandas.concat([pandas.Series([last_sanitized], index=[last_sanitized]), index])
+    deltas = index.diff()[1:]
+    return deltas[deltas > ONE_MINUTE]
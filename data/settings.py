@@ -69,3 +69,28 @@ BITSTAMP_TRADING_PAIRS = (
     'yfiusd',
     'zrxusd'
 )
+
+BITSTAMP_API_URL = 'https://www.bitstamp.net/'
+BITSTAMP_WEBSOCKET_URL = 'wss://ws.bitstamp.net'
+# The public API allows 8000 requests per 10 minutes, stay a bit below that
+BITSTAMP_REQUESTS_PER_SECOND = 12
+
+# Bars aggregated from the sanitized 1 minute data, one collection per timeframe
+PYSTORE_COLLECTION_BARS = {
+    '1h': 'ohlc_1h',
+    '1D': 'ohlc_1d',
+    'W-SUN': 'ohlc_w_sun',
+}
+
+# Local bars of the bot, only candles newer than the stored ones are downloaded
+BOT_PYSTORE_PATH = 'data/data/bot'
+PYSTORE_COLLECTION_BOT_DAILY = 'bot_daily'
+
+# Segments of the live trades and order books recorded by TickRecorder
+TICK_DATA_PATH = 'data/data/ticks'
+
+# Collections partitioned by month with compact dtypes, see data/partitioned_store.py
+PARTITIONED_STORE_PATH = 'data/data/partitioned'
+
+# Manifests of the collections of a store, kept in this directory of its path, see data/manifest.py
+MANIFEST_DIRECTORY = 'manifests'
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from data.bar_cache import resample_bars, complete_bars, bars_after, SPANS
+
+
+def minutes(start, end):
+    index = pandas.date_range(start, end, freq='1min')
+    random = np.random.default_rng(1)
+    return pandas.DataFrame({'close': random.uniform(1, 2, len(index)), 'volume': random.uniform(0, 1, len(index))},
+                            index=index)
+
+
+class BarCacheTest(TestCase):
+
+    def testIncrementalEqualsFullResample(self):
+        data = minutes('2020-01-01', '2020-03-01 13:37')
+
+        for tf in SPANS:
+            stored = None
+            for end in ('2020-01-03 07:12', '2020-01-20 00:00', '2020-02-09 23:59', '2020-02-10 00:00',
+                        '2020-03-01 13:37'):
+                last_stored = None if stored is None or len(stored) == 0 else stored.index[-1]
+                since = data.index[0] if last_stored is None else last_stored - SPANS[tf]
+                new_minutes = data[(data.index >= since) & (data.index <= end)]
+                bars = complete_bars(new_minutes, tf, last_stored)
+                stored = bars if stored is None else pandas.concat([stored, bars])
+
+            last_stored = stored.index[-1]
+            pending = bars_after(data[data.index >= last_stored - SPANS[tf]], tf, last_stored)
+            pandas.testing.assert_frame_equal(resample_bars(data, tf), pandas.concat([stored, pending]),
+                                              check_freq=False)
+
+    def testLastBarIsNotComplete(self):
+        data = minutes('2020-01-01', '2020-01-01 02:30')
+
+        bars = complete_bars(data, '1h')
+
+        self.assertEqual(2, len(bars))
+        self.assertEqual(pandas.Timestamp('2020-01-01 01:00'), bars.index[-1])
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+import pandas
+
+from data.daily_bar_store import DailyBarStore, DAY
+
+
+class FakeItem:
+
+    def __init__(self, df):
+        self.df = df
+
+    def to_pandas(self):
+        return self.df
+
+
+class FakeCollection:
+
+    def __init__(self):
+        self.items = {}
+        self.writes = 0
+
+    def list_items(self):
+        return set(self.items.keys())
+
+    def item(self, item):
+        return FakeItem(self.items[item])
+
+    def write(self, item, data):
+        self.writes += 1
+        self.items[item] = data
+
+    def append(self, item, data):
+        self.writes += 1
+        self.items[item] = pandas.concat([self.items[item], data])
+
+
+def candles(first_day, days):
+    start = int(datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp()) + first_day * DAY
+    return [{'timestamp': str(start + i * DAY), 'open': '1', 'high': '2', 'low': '0.5', 'close': str(first_day + i),
+             'volume': '10'} for i in range(days)]
+
+
+class FakeClient:
+
+    def __init__(self, available_days):
+        self.available_days = available_days
+        self.requests = []
+        self.fail = False
+
+    def getBarsForPairs(self, pairs, timeframe, starts=None, return_exceptions=False):
+        self.requests.append(dict(starts))
+        responses = {}
+        for pair in pairs:
+            if self.fail:
+                responses[pair] = Exception('REST outage')
+                continue
+            first_day = 0
+            if pair in starts:
+                first_day = (starts[pair] - int(datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp())) // DAY
+            responses[pair] = {'data': {'ohlc': candles(first_day, self.available_days - first_day)}}
+        return responses
+
+
+class DailyBarStoreTest(TestCase):
+
+    def testIncrementalUpdate(self):
+        collection = FakeCollection()
+        now = [datetime(2022, 1, 10, 12)]
+        store = DailyBarStore(collection, now=lambda: now[0])
+        client = FakeClient(10)
+
+        bars = store.update(client, ['btcusd'])['btcusd']
+
+        self.assertEqual(10, len(bars))
+        self.assertEqual(9, len(collection.items['btcusd']))
+        self.assertEqual({}, client.requests[0])
+
+        now[0] = datetime(2022, 1, 14, 12)
+        client.available_days = 14
+        bars = store.update(client, ['btcusd'])['btcusd']
+
+        self.assertEqual(14, len(bars))
+        self.assertEqual(13, len(collection.items['btcusd']))
+        self.assertEqual(int(datetime(2022, 1, 10, tzinfo=timezone.utc).timestamp()), client.requests[1]['btcusd'])
+        self.assertEqual(list(range(14)), list(bars['close']))
+        self.assertTrue((bars.index.to_series().diff()[1:] == timedelta(days=1)).all())
+
+    def testRestOutage(self):
+        collection = FakeCollection()
+        store = DailyBarStore(collection, now=lambda: datetime(2022, 1, 10, 12))
+        client = FakeClient(10)
+        store.update(client, ['btcusd'])
+
+        client.fail = True
+        bars = store.update(client, ['btcusd', 'ethusd'])
+
+        self.assertEqual(['btcusd'], list(bars.keys()))
+        self.assertEqual(9, len(bars['btcusd']))
@@ -0,0 +1,150 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from data.manifest import Manifest, ManifestStore, ManifestCollection, checksum
+from data.partitioned_store import PartitionedStore, PartitionedCollection
+from data.sanitize import last_timestamp, read_since
+
+
+def minutes(start, end):
+    index = pandas.date_range(start, end, freq='1min', name='timestamp')
+    close = np.round(np.random.default_rng(1).uniform(100, 200, len(index)), 2)
+    return pandas.DataFrame({'close': close, 'volume': np.ones(len(index))}, index=index)
+
+
+class CountingCollection(PartitionedCollection):
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.reads = 0
+
+    def read(self, pair, start=None, end=None, columns=None):
+        self.reads += 1
+        return super().read(pair, start, end, columns)
+
+
+class PlainCollection:
+    """A collection without the rows of the partitioned store, like a pystore one"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        if name in ('rows', 'last_timestamp'):
+            raise AttributeError(name)
+        return getattr(self._collection, name)
+
+
+class ManifestTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ManifestStore(PartitionedStore(self.directory.name), os.path.join(self.directory.name,
+                                                                                       'manifests'))
+        self.collection = self.store.collection('ohlc')
+        self.data = minutes('2020-01-01', '2020-01-03')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testUpdatedOnEveryWrite(self):
+        self.collection.write('btcusd', self.data[:1000])
+        checksum = self.collection.manifest.entry('btcusd')['checksum']
+        # Overlapping like the downloads
+        self.collection.append('btcusd', self.data[900:])
+
+        entry = Manifest(os.path.join(self.directory.name, 'manifests', 'ohlc.json')).entry('btcusd')
+        self.assertEqual(self.data.index[0], entry['first'])
+        self.assertEqual(self.data.index[-1], entry['last'])
+        self.assertEqual(len(self.data), entry['rows'])
+        self.assertNotEqual(checksum, entry['checksum'])
+        self.assertEqual(self.data.index[-1], last_timestamp(self.collection, 'btcusd'))
+
+    def testRowsOfBackfill(self):
+        plain = ManifestCollection(PlainCollection(PartitionedCollection(os.path.join(self.directory.name, 'plain'))),
+                                   Manifest(os.path.join(self.directory.name, 'plain.json')))
+        for collection in (self.collection, plain):
+            collection.write('btcusd', self.data[1000:])
+            collection.append('btcusd', self.data[:500])
+            self.assertEqual(len(self.data) - 500, collection.manifest.entry('btcusd')['rows'])
+            # Partly stored already
+            collection.append('btcusd', self.data[400:1100])
+            self.assertEqual(len(self.data), collection.manifest.entry('btcusd')['rows'])
+            self.assertEqual(self.data.index[0], collection.manifest.first('btcusd'))
+
+    def testConcurrentWriters(self):
+        path = os.path.join(self.directory.name, 'shared.json')
+        (first, second) = (Manifest(path), Manifest(path))
+        first.written('btcusd', self.data, len(self.data), checksum(self.data))
+        second.written('ethusd', self.data[:10], 10, checksum(self.data[:10]))
+        first.sanitized('btcusd', self.data.index[-1])
+
+        self.assertEqual(['btcusd', 'ethusd'], Manifest(path).pairs())
+        # Reads pick up what the other one saved
+        self.assertEqual(self.data.index[-1], second.entry('btcusd')['sanitized'])
+        second.remove('btcusd')
+        self.assertNotIn('btcusd', first)
+
+    def testContentChecksum(self):
+        plain = ManifestCollection(PlainCollection(PartitionedCollection(os.path.join(self.directory.name, 'plain'))),
+                                   Manifest(os.path.join(self.directory.name, 'plain.json')))
+        self.collection.write('btcusd', self.data)
+        # The same rows written another way
+        for collection in (self.collection, plain):
+            collection.write('ethusd', self.data[1000:2000])
+            collection.append('ethusd', self.data[:1100])
+            collection.append('ethusd', self.data[1900:])
+            self.assertEqual(self.collection.manifest.entry('btcusd')['checksum'],
+                             collection.manifest.entry('ethusd')['checksum'])
+            self.assertEqual(checksum(collection.collection.read('ethusd')),
+                             collection.manifest.entry('ethusd')['checksum'])
+
+        changed = self.data[5:6] + 1
+        self.collection.append('ethusd', changed)
+        self.assertEqual(checksum(self.collection.collection.read('ethusd')),
+                         self.collection.manifest.entry('ethusd')['checksum'])
+        self.assertNotEqual(self.collection.manifest.entry('btcusd')['checksum'],
+                            self.collection.manifest.entry('ethusd')['checksum'])
+
+    def testLastTimestampWithoutReading(self):
+        collection = CountingCollection(os.path.join(self.directory.name, 'counted'))
+        collection.write('btcusd', self.data)
+        counted = ManifestCollection(collection, Manifest(os.path.join(self.directory.name, 'counted.json')))
+
+        # Written before the manifest existed, read once
+        self.assertEqual(self.data.index[-1], last_timestamp(counted, 'btcusd'))
+        self.assertEqual(1, collection.reads)
+        self.assertEqual(self.data.index[-1], last_timestamp(counted, 'btcusd'))
+        self.assertIsNone(last_timestamp(counted, 'ethusd'))
+        self.assertEqual(1, collection.reads)
+
+    def testFreshnessAndCommonRange(self):
+        self.collection.write('btcusd', self.data)
+        self.collection.write('ethusd', self.data[60:-60])
+        self.collection.manifest.sanitized('btcusd', self.data.index[-10])
+
+        freshness = self.collection.manifest.freshness(now=self.data.index[-1] + pandas.Timedelta(hours=1))
+
+        self.assertEqual(pandas.Timedelta(hours=1), freshness.loc['btcusd', 'age'])
+        self.assertEqual(pandas.Timedelta(hours=2), freshness.loc['ethusd', 'age'])
+        self.assertEqual(pandas.Timedelta(minutes=69), freshness.loc['btcusd', 'sanitized_age'])
+        self.assertTrue(pandas.isnull(freshness.loc['ethusd', 'sanitized_age']))
+        self.assertEqual((self.data.index[60], self.data.index[-61]), self.collection.manifest.common_range())
+        self.assertEqual((self.data.index[0], self.data.index[-1]), self.collection.common_range(['btcusd', 'xrpusd']))
+
+    def testDelete(self):
+        self.collection.write('btcusd', self.data)
+        self.collection.delete_item('btcusd')
+
+        self.assertNotIn('btcusd', self.collection.manifest)
+        self.assertIsNone(last_timestamp(self.collection, 'btcusd'))
+
+    def testReadThroughManifest(self):
+        self.collection.write('btcusd', self.data)
+        since = self.data.index[100]
+        pandas.testing.assert_frame_equal(self.data[100:], read_since(self.collection, 'btcusd', since),
+                                          check_freq=False)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import requests_mock
+
+from data.ohlc_downloader import OhlcDownloader, pages, LIMIT, STEP
+from util.rate_limiter import RateLimiter
+
+
+def candles(start, end):
+    return [{'timestamp': str(t), 'open': '1.0', 'high': '2.0', 'low': '0.5', 'close': '1.5', 'volume': '3.0'}
+            for t in range(start, end + 1, STEP)]
+
+
+def ohlc_callback(request, context):
+    start = int(request.qs['start'][0])
+    end = int(request.qs['end'][0])
+    return {'data': {'pair': 'BTC/USD', 'ohlc': candles(start, end)}}
+
+
+class OhlcDownloaderTest(TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.downloader = OhlcDownloader(max_workers=2, pages_in_flight=4, rate_limiter=RateLimiter(1000, burst=100),
+                                         sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.downloader.close()
+
+    def testPages(self):
+        self.assertEqual([(0, (LIMIT - 1) * STEP), (LIMIT * STEP, LIMIT * STEP + 10)],
+                         list(pages(0, LIMIT * STEP + 10)))
+
+    def testDownloadInOrder(self):
+        written = {}
+
+        def write(pair, df):
+            written.setdefault(pair, []).append(df)
+
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=ohlc_callback)
+            end = 1600000000 + 5 * LIMIT * STEP - STEP
+            failed = self.downloader.download_all({'btcusd': 1600000000, 'ethusd': 1600000000}, end, write)
+
+            self.assertEqual([], failed)
+            self.assertEqual(10, m.call_count)
+            for pair in ('btcusd', 'ethusd'):
+                self.assertEqual(5, len(written[pair]))
+                for (previous, current) in zip(written[pair], written[pair][1:]):
+                    self.assertLess(previous.index[-1], current.index[0])
+                self.assertEqual(LIMIT, len(written[pair][0]))
+
+    def testRetryWithBackoff(self):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, [
+                {'status_code': 429, 'text': 'slow down', 'headers': {'Retry-After': '5'}},
+                {'status_code': 502, 'text': 'bad gateway'},
+                {'json': {'data': {'ohlc': candles(0, 120)}}},
+            ])
+
+            response_data = self.downloader.get_page('btcusd', 0, 120)
+
+            self.assertEqual(3, len(response_data))
+            self.assertEqual(3, m.call_count)
+            self.assertEqual(2, len(self.sleeps))
+            self.assertGreaterEqual(self.sleeps[0], 5)
+
+    def testNoRetryOnClientError(self):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, status_code=404, text='not found')
+
+            with self.assertRaises(Exception):
+                self.downloader.get_page('btcusd', 0, 120)
+            self.assertEqual(1, m.call_count)
+
+    def testFailedPair(self):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, status_code=503, text='unavailable')
+
+            failed = self.downloader.download_all({'btcusd': 0}, 120, lambda pair, df: None)
+
+            self.assertEqual(['btcusd'], failed)
+            self.assertEqual(6, m.call_count)
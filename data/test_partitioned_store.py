@@ -0,0 +1,113 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import pandas
+
+from data.partitioned_store import PartitionedCollection, PartitionedStore, compact
+from data.sanitize import last_timestamp, read_since
+
+
+def minutes(start, end, price_decimals=2):
+    index = pandas.date_range(start, end, freq='1min', name='timestamp')
+    random = np.random.default_rng(1)
+    close = np.round(random.uniform(100, 200, len(index)), price_decimals)
+    return pandas.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                             'volume': random.uniform(0, 1, len(index))}, index=index)
+
+
+class PartitionedStoreTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.collection = PartitionedCollection(self.directory.name)
+        self.data = minutes('2020-01-30', '2020-04-02 13:37')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def partition(self, pair, key):
+        return os.path.join(self.directory.name, pair, self.collection.meta(pair)['partitions'][key]['file'])
+
+    def testRoundTrip(self):
+        self.collection.write('btcusd', self.data)
+
+        self.assertEqual({'btcusd'}, self.collection.list_items())
+        self.assertEqual(['2020-01', '2020-02', '2020-03', '2020-04'], sorted(self.collection.meta('btcusd')[
+                                                                                  'partitions']))
+        pandas.testing.assert_frame_equal(self.data, self.collection.item('btcusd').to_pandas(), check_freq=False)
+
+    def testCompactDtypes(self):
+        self.collection.write('btcusd', self.data)
+
+        records = np.load(self.partition('btcusd', '2020-02'))
+        self.assertEqual(np.int64, records.dtype['timestamp'])
+        self.assertEqual(np.float32, records.dtype['close'])
+        self.assertEqual(np.float64, records.dtype['volume'])
+        # Too many digits for float32
+        self.assertEqual(np.float64, compact(np.array([30000.123456]))[0].dtype)
+        self.assertEqual(np.float32, compact(np.array([30000.12, np.nan]))[0].dtype)
+
+    def testReadRange(self):
+        self.collection.write('btcusd', self.data)
+
+        start = pandas.Timestamp('2020-02-29 23:00')
+        end = pandas.Timestamp('2020-03-01 01:00')
+        df = self.collection.read('btcusd', start, end, columns=['close'])
+
+        expected = self.data[(self.data.index >= start) & (self.data.index < end)][['close']]
+        pandas.testing.assert_frame_equal(expected, df, check_freq=False)
+        self.assertEqual(0, len(self.collection.read('btcusd', '2021-01-01')))
+
+    def testOnlyOverlappingPartitionsAreOpened(self):
+        self.collection.write('btcusd', self.data)
+        os.remove(self.partition('btcusd', '2020-01'))
+
+        df = self.collection.read('btcusd', '2020-03-15')
+
+        self.assertEqual(self.data.index[-1], df.index[-1])
+
+    def testAppendReplacesOverlap(self):
+        old = self.data[self.data.index < '2020-03-10']
+        new = self.data[self.data.index >= '2020-03-09 23:00'].copy()
+        new['volume'] += 1
+        self.collection.write('btcusd', old)
+        january = self.partition('btcusd', '2020-01')
+        march = self.partition('btcusd', '2020-03')
+
+        self.collection.append('btcusd', new)
+
+        expected = pandas.concat([old[old.index < new.index[0]], new])
+        pandas.testing.assert_frame_equal(expected, self.collection.read('btcusd'), check_freq=False)
+        self.assertEqual(january, self.partition('btcusd', '2020-01'))
+        # The rewritten partition is a new file, the old one is gone once meta.json switched to it
+        self.assertNotEqual(march, self.partition('btcusd', '2020-03'))
+        self.assertFalse(os.path.exists(march))
+
+    def testCrashBeforeMeta(self):
+        self.collection.write('btcusd', self.data[self.data.index < '2020-03-10'])
+        # More decimals than the stored rows of the partition
+        new = minutes('2020-03-09 23:00', '2020-03-20', price_decimals=4)
+
+        with patch.object(PartitionedCollection, '_write_meta', side_effect=OSError('crash')):
+            with self.assertRaises(OSError):
+                self.collection.append('btcusd', new)
+
+        pandas.testing.assert_frame_equal(self.data[self.data.index < '2020-03-10'],
+                                          self.collection.read('btcusd'), check_freq=False)
+        self.collection.append('btcusd', new)
+        pandas.testing.assert_frame_equal(new, self.collection.read('btcusd', start='2020-03-09 23:00'),
+                                          check_freq=False)
+
+    def testPystoreFunctions(self):
+        store = PartitionedStore(self.directory.name, partition='Y')
+        collection = store.collection('ohlc')
+        collection.write('btcusd', self.data)
+
+        self.assertEqual(self.data.index[-1], last_timestamp(collection, 'btcusd'))
+        self.assertEqual(['2020'], list(collection.meta('btcusd')['partitions']))
+        pandas.testing.assert_frame_equal(self.data[self.data.index >= '2020-04-01'],
+                                          read_since(collection, 'btcusd', pandas.Timestamp('2020-04-01')),
+                                          check_freq=False)
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from data.sanitize import sanitize, find_gaps
+
+
+def raw_bars(start, periods):
+    index = pandas.date_range(start, periods=periods, freq='1min', name='timestamp')
+    return pandas.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': np.arange(periods, dtype='float64'),
+                             'volume': 1.0}, index=index)
+
+
+class SanitizeTest(TestCase):
+
+    def testFullHistory(self):
+        raw = raw_bars('2020-01-01', 10).drop(pandas.Timestamp('2020-01-01 00:04'))
+
+        df = sanitize(raw)
+
+        self.assertEqual(10, len(df))
+        self.assertTrue(np.isnan(df.loc['2020-01-01 00:04', 'close']))
+        self.assertEqual(0, df.loc['2020-01-01 00:04', 'volume'])
+        self.assertEqual(0, len(find_gaps(df)))
+
+    def testIncremental(self):
+        raw = raw_bars('2020-01-01', 120)
+        full = sanitize(raw)
+        last_sanitized = full.index[59]
+        # The downloader resumes an hour early and appends the overlap a second time
+        raw = pandas.concat([raw, raw.iloc[50:70]]).drop(pandas.Timestamp('2020-01-01 01:00'))
+
+        df = sanitize(raw[raw.index >= last_sanitized - pandas.Timedelta(hours=1)], last_sanitized)
+
+        self.assertEqual(60, len(df))
+        self.assertEqual(last_sanitized + pandas.Timedelta(minutes=1), df.index[0])
+        self.assertTrue(np.isnan(df.iloc[0]['close']))
+        pandas.testing.assert_frame_equal(full.iloc[61:], df.iloc[1:], check_freq=False)
+        self.assertEqual(0, len(find_gaps(df, last_sanitized)))
+
+    def testNothingNew(self):
+        raw = raw_bars('2020-01-01', 10)
+
+        self.assertEqual(0, len(sanitize(raw, raw.index[-1])))
+
+    def testGapToLastSanitized(self):
+        df = sanitize(raw_bars('2020-01-01 01:00', 10))
+
+        gaps = find_gaps(df, pandas.Timestamp('2020-01-01 00:30'))
+
+        self.assertEqual(1, len(gaps))
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+
+from util.bounded_executor import BoundedExecutor
+
+
+class AsyncBitstampClient:
+    """
+    Asyncio front of a BitstampClient: every method of the client is available as a coroutine running it on a
+    bounded thread pool, at most concurrency at the same time. Only the calls fanning out to many pairs are
+    implemented here, everything else is the BitstampClient's own implementation. Closing it leaves the
+    BitstampClient open.
+    """
+
+    def __init__(self, client, concurrency=8):
+        self._client = client
+        self._executor = BoundedExecutor(concurrency, 'asyncRest')
+
+    @property
+    def latency(self):
+        return self._client.latency
+
+    def close(self):
+        self._executor.close()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return await self._executor.call(functools.partial(method, *args, **kwargs))
+
+        return call
+
+    async def getTickers(self, pairs):
+        return dict(zip(pairs, await asyncio.gather(*(self.getTicker(pair) for pair in pairs))))
+
+    async def getHourlyTickers(self, pairs):
+        return dict(zip(pairs, await asyncio.gather(*(self.getHourlyTicker(pair) for pair in pairs))))
+
+    async def getBarsForPairs(self, pairs, timeframe, starts=None, return_exceptions=False):
+        starts = starts or {}
+        bars = await asyncio.gather(*(self.getBars(pair, timeframe, starts.get(pair)) for pair in pairs),
+                                    return_exceptions=return_exceptions)
+        return dict(zip(pairs, bars))
@@ -1,13 +1,22 @@
 import os
 import re
+import time
 from decimal import Decimal
 
 from exchange.bitstamp.rest.rest_client import RestClient
+from util.bounded_executor import BoundedExecutor
+from util.ttl_cache import TtlCache
 
 
 class BitstampClient:
-
-    def __init__(self, restClient=None):
+    """
+    Synchronous client. Calls fanning out to many pairs run the single pair calls concurrently on a thread pool,
+    at most concurrency requests at a time, also when called from a running event loop. AsyncBitstampClient has
+    the same methods as coroutines. close() when done.
+    """
+
+    def __init__(self, restClient=None, concurrency=8, tickerTtl=10, metadataTtl=3600, metadataPath=None,
+                 clock=time.time):
         if restClient is None:
             clientid = os.environ['BITSTAMP_CLIENT_ID']
             apikey = os.environ['BITSTAMP_API_KEY']
@@ -15,9 +24,28 @@ class BitstampClient:
             self._restClient = RestClient(clientid, apikey, bytes(secret, 'UTF-8'))
         else:
             self._restClient = restClient
+        self._executor = BoundedExecutor(concurrency, 'rest')
+        self._tickerSnapshot = TtlCache(tickerTtl, clock=clock)
+        # Pair metadata hardly ever changes, with a path it also survives restarts of the worker. During an outage
+        # the metadata loaded before is used.
+        self.metadataCache = TtlCache(metadataTtl, metadataPath or os.environ.get('BITSTAMP_METADATA_CACHE'), clock,
+                                      stale_on_error=True)
+
+    @property
+    def latency(self):
+        return self._restClient.latency
+
+    def close(self):
+        self._executor.close()
+        self._restClient.close()
 
-    def getTradingPairsInfo(self):
-        return self._restClient.unauthenticated_get_request('api/v2/trading-pairs-info/').json()
+    def getTradingPairsInfo(self, refresh=False):
+        """With refresh the metadata is loaded again, unless that fails"""
+        return self.metadataCache.get('trading-pairs-info', lambda: self._restClient.unauthenticated_get_request(
+            'api/v2/trading-pairs-info/').json(), refresh)
+
+    def invalidateMetadata(self):
+        self.metadataCache.invalidate()
 
     def getBalance(self):
         return self._restClient.request('api/v2/balance/', None).json()
@@ -25,9 +53,25 @@ class BitstampClient:
     def getTicker(self, pair):
         return self._restClient.unauthenticated_get_request(f'api/v2/ticker/{pair}/').json()
 
+    def getAllTickers(self):
+        return self._restClient.unauthenticated_get_request('api/v2/ticker/').json()
+
+    def getTickerSnapshot(self):
+        """Tickers of all pairs keyed by url symbol, fetched in one request and reused for tickerTtl seconds"""
+        def load():
+            return {ticker['pair'].replace('/', '').lower(): ticker for ticker in self.getAllTickers()}
+
+        return self._tickerSnapshot.get('tickers', load)
+
+    def getTickers(self, pairs):
+        return self._executor.map(self.getTicker, pairs)
+
     def getHourlyTicker(self, pair):
         return self._restClient.unauthenticated_get_request(f'api/v2/ticker_hour/{pair}/').json()
 
+    def getHourlyTickers(self, pairs):
+        return self._executor.map(self.getHourlyTicker, pairs)
+
     def getOpenOrders(self):
         return self._restClient.request('api/v2/open_orders/all/', None).json()
 
@@ -49,21 +93,30 @@ class BitstampClient:
     def sellMarket(self, pair, amount):
         return self._restClient.request(f'api/v2/sell/market/{pair}/', {'amount': amount}).json()
 
-    def getBars(self, pair, timeframe):
-        return self._restClient.unauthenticated_get_request(f'api/v2/ohlc/{pair}?step={timeframe}&limit=1000').json()
+    def getBars(self, pair, timeframe, start=None):
+        url = f'api/v2/ohlc/{pair}?step={timeframe}&limit=1000'
+        if start is not None:
+            url = f'{url}&start={start}'
+        return self._restClient.unauthenticated_get_request(url).json()
+
+    def getBarsForPairs(self, pairs, timeframe, starts=None, return_exceptions=False):
+        starts = starts or {}
+        return self._executor.map(lambda pair: self.getBars(pair, timeframe, starts.get(pair)), pairs,
+                                  return_exceptions)
 
     def getTransactions(self, since_id):
         return self._restClient.request(f'api/v2/user_transactions/', {'since_id': since_id, 'sort': 'asc'}).json()
 
     def getEquity(self):
         balance = self.getBalance()
+        tickers = self.getTickerSnapshot()
         equity = Decimal(0)
         for (key, value) in balance.items():
             if re.match('[A-Za-z]*_balance', key) and Decimal(value) > 0:
                 if key == 'usd_balance':
                     equity = equity + Decimal(value)
                 else:
-                    left = key.split('_')[0]
-                    ticker = self.getTicker(f'{left}usd')
+                    pair = f"{key.split('_')[0]}usd"
+                    ticker = tickers[pair] if pair in tickers else self.getTicker(pair)
                     equity = equity + Decimal(value) * Decimal(ticker['last'])
         return equity
@@ -6,49 +6,133 @@ import uuid
 from urllib.parse import urlencode
 
 import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+
+    def __init__(self, retries=3, backoff=0.5, statuses=RETRY_STATUS,
+                 exceptions=(requests.ConnectionError, requests.Timeout)):
+        self.retries = retries
+        self.backoff = backoff
+        self.statuses = statuses
+        self.exceptions = exceptions
+
+    def delay(self, attempt, response=None):
+        delay = self.backoff * 2 ** attempt
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        return delay
+
+
+# Signed requests may place orders, so they are only retried when the server surely did not execute them.
+# Every attempt is signed again with a fresh nonce and timestamp.
+SIGNED_RETRY_POLICY = RetryPolicy(statuses=(429,), exceptions=(requests.ConnectTimeout,))
+
+
+class LatencyStats:
+
+    def __init__(self):
+        self.last = None
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.last = seconds
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count > 0 else None
+
+    def __str__(self):
+        if self.count == 0:
+            return 'no requests'
+        return f'{self.count} requests, last {self.last * 1000:.1f}ms, ' \
+               f'avg {self.average * 1000:.1f}ms, max {self.max * 1000:.1f}ms'
 
 
 class RestClient:
 
-    def __init__(self, client_id, api_key, secret):
+    def __init__(self, client_id, api_key, secret, timeout=(3.05, 10), retry_policy=None,
+                 signed_retry_policy=SIGNED_RETRY_POLICY, session=None, pool_size=10, sleep=time.sleep):
         self._logger = logging.getLogger(self.__class__.__name__)
         self.__clientID = client_id
         self.__apiKey = api_key
         self.__secret = secret
+        self._timeout = timeout
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._signed_retry_policy = signed_retry_policy
+        self._sleep = sleep
+        self._session = session or requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.latency = LatencyStats()
+
+    def close(self):
+        self._session.close()
+
+    def _send(self, method, url, policy, build=lambda: {}):
+        attempt = 0
+        while True:
+            begin = time.perf_counter()
+            try:
+                response = self._session.request(method, url, timeout=self._timeout, **build())
+            except policy.exceptions as e:
+                if attempt >= policy.retries:
+                    raise
+                delay = policy.delay(attempt)
+                self._logger.warning(f'{method} {url} failed: {e!r}, retrying in {delay}s')
+            else:
+                self.latency.record(time.perf_counter() - begin)
+                if response.status_code not in policy.statuses or attempt >= policy.retries:
+                    return response
+                delay = policy.delay(attempt, response)
+                self._logger.warning(f'{method} {url} returned {response.status_code}, retrying in {delay}s')
+            self._sleep(delay)
+            attempt += 1
 
     def unauthenticated_get_request(self, url):
-        response = requests.get('https://www.bitstamp.net/' + url)
+        response = self._send('GET', 'https://www.bitstamp.net/' + url, self._retry_policy)
         return response
 
     def request(self, url, payload):
         url = 'www.bitstamp.net/' + url
-        timestamp = str(int(round(time.time() * 1000)))
-        nonce = str(uuid.uuid4())
         content_type = 'application/x-www-form-urlencoded' if payload is not None else ''
         payload_string = urlencode(payload) if payload is not None else ''
+        sent = {}
 
-        signature = self.create_signature(timestamp, nonce, content_type, url, payload_string)
+        def build():
+            # A nonce can only be used once, so every attempt gets a new one
+            timestamp = str(int(round(time.time() * 1000)))
+            nonce = str(uuid.uuid4())
+            signature = self.create_signature(timestamp, nonce, content_type, url, payload_string)
 
-        headers = {
-            'X-Auth': 'BITSTAMP ' + self.__apiKey,
-            'X-Auth-Signature': signature,
-            'X-Auth-Nonce': nonce,
-            'X-Auth-Timestamp': timestamp,
-            'X-Auth-Version': 'v2',
-        }
-        if content_type != '':
-            headers['Content-Type'] = content_type
+            headers = {
+                'X-Auth': 'BITSTAMP ' + self.__apiKey,
+                'X-Auth-Signature': signature,
+                'X-Auth-Nonce': nonce,
+                'X-Auth-Timestamp': timestamp,
+                'X-Auth-Version': 'v2',
+            }
+            if content_type != '':
+                headers['Content-Type'] = content_type
+            sent['nonce'] = nonce
+            sent['timestamp'] = timestamp
+            return {'headers': headers, 'data': payload_string}
 
-        response = requests.post(
-            'https://' + url,
-            headers=headers,
-            data=payload_string
-        )
+        response = self._send('POST', 'https://' + url, self._signed_retry_policy, build)
 
         self._logger.info('API request against Bitstamp')
         self._logger.info(f'URL: {url}')
         self._logger.info(f'Request: {payload_string}')
         self._logger.info(f'Response: {response.text}')
+        self._logger.info(f'Latency: {self.latency.last * 1000:.1f}ms')
 
         if not response.ok:
             raise Exception("Response not ok: " + response.text)
@@ -56,7 +140,8 @@ class RestClient:
         content = ''
         if response.content is not None:
             content = response.content
-        string_to_sign = (nonce + timestamp + response.headers.get('Content-Type')).encode('utf-8') + content
+        string_to_sign = (sent['nonce'] + sent['timestamp'] + response.headers.get('Content-Type')).encode(
+            'utf-8') + content
         signature_check = hmac.new(self.__secret, msg=string_to_sign, digestmod=hashlib.sha256).hexdigest()
         if not response.headers.get('X-Server-Auth-Signature') == signature_check:
             raise Exception('Signatures do not match')
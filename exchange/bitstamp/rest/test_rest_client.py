@@ -93,3 +93,51 @@ class RestClientTest(TestCase):
             self.assertFalse('X-Auth-Version' in  request.headers)
             self.assertFalse('Content-Type' in request.headers)
 
+    def test_unauthenticated_get_request_retry(self):
+        """It should retry transient errors of unauthenticated requests"""
+
+        with requests_mock.Mocker() as m:
+            sleeps = []
+            client = RestClient('a_clientid', 'a_key', b'a_secret', sleep=sleeps.append)
+            m.get('https://www.bitstamp.net/someurl', [
+                {'status_code': 503, 'text': 'unavailable'},
+                {'status_code': 429, 'text': 'slow down', 'headers': {'Retry-After': '2'}},
+                {'status_code': 200, 'text': 'hello world!'},
+            ])
+
+            response = client.unauthenticated_get_request('someurl')
+
+            self.assertEqual('hello world!', response.text)
+            self.assertEqual(3, m.call_count)
+            self.assertEqual([0.5, 2], sleeps)
+            self.assertEqual(3, client.latency.count)
+
+    def test_request_retry_with_new_nonce(self):
+        """It should sign a rate limited request again with a new nonce"""
+
+        with requests_mock.Mocker() as m:
+            sleeps = []
+            client = RestClient('a_clientid', 'a_key', b'a_secret', sleep=sleeps.append)
+            m.post('https://www.bitstamp.net/someurl', [
+                {'status_code': 429, 'text': 'slow down'},
+                {'status_code': 200, 'text': response_callback},
+            ])
+
+            response = client.request('someurl', {'some': 'data'})
+
+            self.assertEqual('field', json.loads(response.text)['some'])
+            self.assertEqual(2, m.call_count)
+            nonces = [request.headers['X-Auth-Nonce'] for request in m.request_history]
+            self.assertNotEqual(nonces[0], nonces[1])
+            self.assertEqual(1, len(sleeps))
+
+    def test_request_no_retry_on_server_error(self):
+        """It should not retry a signed request the server may have executed"""
+
+        with requests_mock.Mocker() as m:
+            client = RestClient('a_clientid', 'a_key', b'a_secret', sleep=lambda seconds: None)
+            m.post('https://www.bitstamp.net/someurl', status_code=500, text='error')
+
+            with self.assertRaises(Exception):
+                client.request('someurl', {'some': 'data'})
+            self.assertEqual(1, m.call_count)
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock
+
+from exchange.bitstamp.async_bitstamp_client import AsyncBitstampClient
+from exchange.bitstamp.bitstamp_client import BitstampClient
+
+
+class SlowRestClient:
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        pass
+
+    def unauthenticated_get_request(self, url):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        response = Mock()
+        response.json.side_effect = lambda: {'url': url}
+        return response
+
+
+class AsyncBitstampClientTest(TestCase):
+
+    def testFanOutIsConcurrentAndBounded(self):
+        rest_client = SlowRestClient(0.05)
+        client = AsyncBitstampClient(BitstampClient(rest_client), concurrency=4)
+        pairs = [f'pair{i}usd' for i in range(12)]
+
+        begin = time.perf_counter()
+        bars = asyncio.run(client.getBarsForPairs(pairs, 86400))
+        elapsed = time.perf_counter() - begin
+        client.close()
+
+        self.assertEqual(pairs, list(bars.keys()))
+        self.assertEqual('api/v2/ohlc/pair3usd?step=86400&limit=1000', bars['pair3usd']['url'])
+        self.assertEqual(4, rest_client.max_in_flight)
+        self.assertLess(elapsed, 12 * 0.05 / 2)
+
+    def testSameImplementationAsBitstampClient(self):
+        balance = Mock()
+        with open('exchange/bitstamp/balance.json') as json_file:
+            balance_json = json.load(json_file)
+            balance.json.side_effect = lambda: balance_json
+        tickers = Mock()
+        tickers.json.side_effect = lambda: [{'pair': 'ETH/USD', 'last': '3.0'}, {'pair': 'BTC/USD', 'last': '2.0'}]
+        rest_client = Mock()
+        rest_client.request.return_value = balance
+        rest_client.unauthenticated_get_request.return_value = tickers
+        client = AsyncBitstampClient(BitstampClient(rest_client))
+
+        equity = asyncio.run(client.getEquity())
+        client.close()
+
+        # The equity of BitstampClient, valued with one ticker snapshot
+        self.assertEqual(Decimal('5000.302'), equity)
+        rest_client.unauthenticated_get_request.assert_called_once_with('api/v2/ticker/')
+
+    def testSyncFanOutInsideEventLoop(self):
+        rest_client = SlowRestClient(0.01)
+        client = BitstampClient(rest_client, concurrency=2)
+
+        async def evaluate():
+            return client.getBarsForPairs(['btcusd', 'ethusd', 'ltcusd'], 86400, {'ethusd': 5})
+
+        bars = asyncio.run(evaluate())
+        client.close()
+
+        self.assertEqual('api/v2/ohlc/ethusd?step=86400&limit=1000&start=5', bars['ethusd']['url'])
+        self.assertEqual(2, rest_client.max_in_flight)
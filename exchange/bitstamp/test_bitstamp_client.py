@@ -30,10 +30,9 @@ class BitstampClientTest(TestCase):
 
         def get_ticker(url):
             response_mock = Mock()
-            if url == 'api/v2/ticker/ethusd/':
-                response_mock.json.side_effect = lambda: {'last': '3.0'}
-            elif url == 'api/v2/ticker/btcusd/':
-                response_mock.json.side_effect = lambda: {'last': '2.0'}
+            if url == 'api/v2/ticker/':
+                response_mock.json.side_effect = lambda: [{'pair': 'ETH/USD', 'last': '3.0'},
+                                                          {'pair': 'BTC/USD', 'last': '2.0'}]
             else:
                 raise Exception()
             return response_mock
@@ -54,3 +53,70 @@ class BitstampClientTest(TestCase):
 
         # THEN
         self.assertEqual(Decimal('5000.302'), equity)
+        self.assertEqual(1, rest_client_mock.unauthenticated_get_request.call_count)
+
+    def test_fan_out_exceptions(self):
+        response = Mock()
+        response.json.return_value = {'data': {'ohlc': []}}
+
+        def get(url):
+            if 'ethusd' in url:
+                raise ConnectionError('down')
+            return response
+
+        rest_client_mock = Mock()
+        rest_client_mock.unauthenticated_get_request.side_effect = get
+        bitstamp_client = BitstampClient(rest_client_mock)
+
+        bars = bitstamp_client.getBarsForPairs(['btcusd', 'ethusd'], 86400, return_exceptions=True)
+        with self.assertRaises(ConnectionError):
+            bitstamp_client.getBarsForPairs(['btcusd', 'ethusd'], 86400)
+        bitstamp_client.close()
+
+        self.assertEqual({'data': {'ohlc': []}}, bars['btcusd'])
+        self.assertIsInstance(bars['ethusd'], ConnectionError)
+        rest_client_mock.close.assert_called_once_with()
+
+    def test_ticker_snapshot_ttl(self):
+
+        # GIVEN
+        response_mock = Mock()
+        response_mock.json.side_effect = lambda: [{'pair': 'BTC/USD', 'last': '2.0'}]
+        rest_client_mock = Mock()
+        rest_client_mock.unauthenticated_get_request.return_value = response_mock
+        now = [100.0]
+        bitstamp_client = BitstampClient(rest_client_mock, tickerTtl=10, clock=lambda: now[0])
+
+        # WHEN
+        first = bitstamp_client.getTickerSnapshot()
+        now[0] = 109.0
+        second = bitstamp_client.getTickerSnapshot()
+        now[0] = 110.0
+        bitstamp_client.getTickerSnapshot()
+
+        # THEN
+        self.assertEqual('2.0', first['btcusd']['last'])
+        self.assertIs(first, second)
+        self.assertEqual(2, rest_client_mock.unauthenticated_get_request.call_count)
+        rest_client_mock.unauthenticated_get_request.assert_called_with('api/v2/ticker/')
+
+    def test_trading_pairs_info_cache(self):
+
+        # GIVEN
+        response_mock = Mock()
+        response_mock.json.side_effect = lambda: [{'url_symbol': 'btcusd', 'base_decimals': 8}]
+        rest_client_mock = Mock()
+        rest_client_mock.unauthenticated_get_request.return_value = response_mock
+        bitstamp_client = BitstampClient(rest_client_mock, metadataTtl=3600)
+
+        # WHEN
+        bitstamp_client.getTradingPairsInfo()
+        pairs = bitstamp_client.getTradingPairsInfo()
+        bitstamp_client.invalidateMetadata()
+        bitstamp_client.getTradingPairsInfo()
+
+        # THEN
+        self.assertEqual(8, pairs[0]['base_decimals'])
+        self.assertEqual(2, rest_client_mock.unauthenticated_get_request.call_count)
+        self.assertEqual(1, bitstamp_client.metadataCache.hits)
+        self.assertEqual(2, bitstamp_client.metadataCache.misses)
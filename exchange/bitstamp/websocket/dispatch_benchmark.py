@@ -0,0 +1,66 @@
+import argparse
+import json
+import random
+import time
+from queue import Queue
+
+from exchange.bitstamp.websocket.order_book import OrderBook, LazyOrderBook
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+
+def messages(instruments, count, levels):
+    result = []
+    for i in range(count):
+        instrument = random.choice(instruments)
+        if i % 2 == 0:
+            result.append(json.dumps({
+                'event': 'trade',
+                'channel': f'live_trades_{instrument}',
+                'data': {'id': i, 'amount': 0.07, 'amount_str': '0.07000000', 'buy_order_id': 1225817115553792,
+                         'microtimestamp': '1588106731385000', 'price': 7749.68, 'price_str': '7749.68',
+                         'sell_order_id': 1225817114599424, 'timestamp': '1588106731', 'type': 0},
+            }))
+        else:
+            result.append(json.dumps({
+                'event': 'data',
+                'channel': f'order_book_{instrument}',
+                'data': {
+                    'bids': [[f'{7734.37 - level / 100:.2f}', f'{random.random():.8f}'] for level in range(levels)],
+                    'asks': [[f'{7736.36 + level / 100:.2f}', f'{random.random():.8f}'] for level in range(levels)],
+                    'microtimestamp': '1588108309372574', 'timestamp': '1588108309'},
+            }))
+    return result
+
+
+def benchmark(frames, subscribers, loads, order_book_class):
+    instruments = sorted({json.loads(frame)['channel'].rsplit('_', 1)[1] for frame in frames})
+    client = WebsocketClient(instruments, loads=loads, order_book_class=order_book_class)
+    for _ in range(subscribers):
+        client.register(Queue())
+
+    begin = time.perf_counter()
+    for frame in frames:
+        client._on_message(frame)
+    return len(frames) / (time.perf_counter() - begin)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Messages per second through the WebsocketClient dispatch path')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--subscribers', type=int, default=3)
+    parser.add_argument('--levels', type=int, default=100)
+    arguments = parser.parse_args()
+
+    frames = messages(['btcusd', 'ethusd', 'ltcusd', 'xrpusd'], arguments.messages, arguments.levels)
+    decoders = {'json': json.loads}
+    try:
+        import orjson
+
+        decoders['orjson'] = orjson.loads
+    except ImportError:
+        pass
+
+    for (decoder, loads) in decoders.items():
+        for order_book_class in (OrderBook, LazyOrderBook):
+            rate = benchmark(frames, arguments.subscribers, loads, order_book_class)
+            print(f'{decoder:>6} {order_book_class.__name__:>13}: {rate:>10,.0f} messages/s')
@@ -0,0 +1,9 @@
+import json
+
+# orjson is an optional dependency, it decodes the websocket frames several times faster than the standard library
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
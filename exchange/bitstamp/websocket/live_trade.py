@@ -2,6 +2,8 @@ from decimal import Decimal
 
 
 class LiveTrade:
+    __slots__ = ('instrument', 'id', 'price', 'amount', 'sellOrderId', 'buyOderId', 'microtimestamp')
+
     def __init__(self, message, instrument):
         self.instrument = instrument
         self.id = message['id']
@@ -9,3 +11,4 @@ class LiveTrade:
         self.amount = Decimal(message['amount_str'])
         self.sellOrderId = message['sell_order_id']
         self.buyOderId = message['buy_order_id']
+        self.microtimestamp = message.get('microtimestamp')
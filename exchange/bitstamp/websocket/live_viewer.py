@@ -1,18 +1,26 @@
+import argparse
 import signal
 import sys
 from datetime import datetime
-from queue import Queue
 
-from exchange.bitstamp.websocket.order_book import OrderBook
+from exchange.bitstamp.websocket.order_book import OrderBook, LazyOrderBook
 from exchange.bitstamp.websocket.live_trade import LiveTrade
+from exchange.bitstamp.websocket.subscriber_queues import ConflatingQueue
 from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+from data.settings import BITSTAMP_WEBSOCKET_URL
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--instrument', default='btcusd')
+parser.add_argument('--url', default=BITSTAMP_WEBSOCKET_URL, help='e.g. the url of replay_server.py --serve')
+arguments = parser.parse_args()
 
 lastBid = None
 lastAsk = None
 lastPrice = None
 
-queue = Queue()
-client = WebsocketClient(['btcusd'])
+# Printing is slow, only the newest order book is of interest
+queue = ConflatingQueue()
+client = WebsocketClient([arguments.instrument], order_book_class=LazyOrderBook, url=arguments.url)
 client.register(queue)
 client.start()
 
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sortedcontainers import SortedDict
+
+from exchange.bitstamp.rest.rest_client import RestClient
+
+# Shared by the books without a RestClient of their own, created with the first snapshot
+_restClient = None
+
+
+def load_snapshot(instrument, rest_client=None):
+    """The order book of the instrument from REST, with the pooled session, retries and latency stats of RestClient"""
+    global _restClient
+    if rest_client is None:
+        if _restClient is None:
+            # Unauthenticated requests need no credentials
+            _restClient = RestClient(None, None, None)
+        rest_client = _restClient
+    response = rest_client.unauthenticated_get_request(f'api/v2/order_book/{instrument}/')
+    if not response.ok:
+        raise Exception("Response not ok: " + response.text)
+    return response.json()
+
+
+class BookSnapshot:
+    """The best levels of a LocalOrderBook at one microtimestamp, immutable so it can be shared with consumers"""
+    __slots__ = ('instrument', 'microtimestamp', 'bids', 'asks')
+
+    def __init__(self, instrument, microtimestamp, bids, asks):
+        self.instrument = instrument
+        self.microtimestamp = microtimestamp
+        self.bids = bids
+        self.asks = asks
+
+    def best_bid(self):
+        return self.bids[0] if len(self.bids) > 0 else None
+
+    def best_ask(self):
+        return self.asks[0] if len(self.asks) > 0 else None
+
+    def depth(self, levels=10):
+        return list(self.bids[:levels]), list(self.asks[:levels])
+
+
+class LocalOrderBook:
+    """
+    Full depth order book of one instrument, seeded from a REST snapshot and updated in place by the diff_order_book
+    messages. Price levels are kept sorted, so best bid/ask and depth queries cost O(log n). Reads from other
+    threads than the one applying the diffs are guarded by a lock, consumers get a BookSnapshot.
+    """
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bids = SortedDict()
+            self.asks = SortedDict()
+            self.snapshotMicrotimestamp = None
+            self.microtimestamp = None
+
+    @property
+    def synced(self):
+        return self.microtimestamp is not None
+
+    def apply_snapshot(self, data):
+        bids = SortedDict((Decimal(price), Decimal(amount)) for (price, amount) in data['bids'])
+        asks = SortedDict((Decimal(price), Decimal(amount)) for (price, amount) in data['asks'])
+        with self._lock:
+            self.bids = bids
+            self.asks = asks
+            self.snapshotMicrotimestamp = int(data['microtimestamp'])
+            self.microtimestamp = self.snapshotMicrotimestamp
+
+    def apply_diff(self, data):
+        """Applies a diff, returns False if the book is out of sync and has to be seeded again"""
+        microtimestamp = int(data['microtimestamp'])
+        with self._lock:
+            if microtimestamp <= self.snapshotMicrotimestamp:
+                # Already contained in the snapshot
+                return True
+            if microtimestamp < self.microtimestamp:
+                return False
+
+            self._update(self.bids, data['bids'])
+            self._update(self.asks, data['asks'])
+            self.microtimestamp = microtimestamp
+
+            best_bid = self.best_bid()
+            best_ask = self.best_ask()
+            return best_bid is None or best_ask is None or best_bid[0] < best_ask[0]
+
+    @staticmethod
+    def _update(levels, changes):
+        for (price, amount) in changes:
+            price = Decimal(price)
+            amount = Decimal(amount)
+            if amount == 0:
+                levels.pop(price, None)
+            else:
+                levels[price] = amount
+
+    def best_bid(self):
+        with self._lock:
+            return self.bids.peekitem(-1) if len(self.bids) > 0 else None
+
+    def best_ask(self):
+        with self._lock:
+            return self.asks.peekitem(0) if len(self.asks) > 0 else None
+
+    def depth(self, levels=10):
+        """The best levels of both sides as lists of (price, amount), best price first"""
+        with self._lock:
+            bids = [self.bids.peekitem(-1 - i) for i in range(min(levels, len(self.bids)))]
+            asks = [self.asks.peekitem(i) for i in range(min(levels, len(self.asks)))]
+            return bids, asks
+
+    def snapshot(self, levels=10):
+        with self._lock:
+            (bids, asks) = self.depth(levels)
+            return BookSnapshot(self.instrument, self.microtimestamp, tuple(bids), tuple(asks))
+
+
+class OrderBookEngine:
+    """
+    Keeps a LocalOrderBook per instrument. A book is seeded on its first diff and again whenever a diff reveals a
+    gap. Snapshots are loaded on the executor, not on the thread delivering the diffs: meanwhile the diffs of the
+    instrument are buffered and those newer than the snapshot are applied once it arrived. A failed load is retried
+    with the next diff after retry_interval seconds.
+    """
+
+    def __init__(self, instruments, snapshot_loader=load_snapshot, executor=None, retry_interval=1.0,
+                 buffer_size=10000, clock=time.monotonic):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._snapshotLoader = snapshot_loader
+        self._executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix='snapshot')
+        self._retryInterval = retry_interval
+        self._bufferSize = buffer_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.books = {}
+        self.resyncs = {}
+        # Diffs of the instruments waiting for a snapshot
+        self._buffers = {}
+        self._loading = set()
+        self._retryAt = {}
+        # Incremented by reset, snapshots requested before are not applied
+        self._generations = {}
+        for instrument in instruments:
+            self.add(instrument)
+
+    def add(self, instrument):
+        with self._lock:
+            if instrument not in self.books:
+                self.books[instrument] = LocalOrderBook(instrument)
+                self.resyncs[instrument] = 0
+                self._generations[instrument] = 0
+
+    def reset(self, instrument=None):
+        """Forgets the book of the instrument, or of all of them, it is seeded again with the next diff"""
+        with self._lock:
+            for name in ([instrument] if instrument is not None else list(self.books)):
+                self.books[name].reset()
+                self._buffers.pop(name, None)
+                self._generations[name] += 1
+
+    def _buffer(self, instrument, data):
+        if instrument not in self._buffers:
+            self._buffers[instrument] = deque(maxlen=self._bufferSize)
+        self._buffers[instrument].append(data)
+        if instrument in self._loading or self._clock() < self._retryAt.get(instrument, 0):
+            return None
+        self._loading.add(instrument)
+        return self._generations[instrument]
+
+    def _load(self, instrument, generation):
+        try:
+            snapshot = self._snapshotLoader(instrument)
+        except Exception:
+            self._logger.exception(f'Could not load the order book snapshot of {instrument}')
+            snapshot = None
+
+        with self._lock:
+            self._loading.discard(instrument)
+            if snapshot is None:
+                self._retryAt[instrument] = self._clock() + self._retryInterval
+                return
+            if generation == self._generations[instrument] and instrument in self._buffers:
+                book = self.books[instrument]
+                book.apply_snapshot(snapshot)
+                self.resyncs[instrument] += 1
+                buffered = self._buffers.pop(instrument)
+                while len(buffered) > 0:
+                    if not book.apply_diff(buffered.popleft()):
+                        book.reset()
+                        self._buffers[instrument] = buffered
+                        break
+            # Diffs still buffered after a reset while loading or a gap need a newer snapshot
+            if instrument not in self._buffers:
+                return
+            self._loading.add(instrument)
+            generation = self._generations[instrument]
+        self._executor.submit(self._load, instrument, generation)
+
+    def on_diff(self, instrument, data):
+        """Returns the book when it is in sync after the diff, None while it waits for a snapshot"""
+        with self._lock:
+            book = self.books[instrument]
+            if instrument not in self._buffers and book.synced:
+                if book.apply_diff(data):
+                    return book
+                # A gap, the book is seeded again and the diff applied afterwards if it is newer
+                book.reset()
+            generation = self._buffer(instrument, data)
+        if generation is not None:
+            self._executor.submit(self._load, instrument, generation)
+        with self._lock:
+            return book if instrument not in self._buffers and book.synced else None
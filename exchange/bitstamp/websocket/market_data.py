@@ -0,0 +1,112 @@
+from decimal import Decimal
+
+import numpy as np
+
+TRADE_DTYPE = np.dtype([
+    ('instrument', np.uint16),
+    ('id', np.int64),
+    ('microtimestamp', np.int64),
+    ('price', np.int64),
+    ('amount', np.int64),
+    ('type', np.uint8),
+])
+
+
+def to_fixed(value, decimals):
+    """Exact conversion of a decimal string to an integer scaled by 10 ** decimals"""
+    whole, _, fraction = value.partition('.')
+    fraction = fraction.rstrip('0')
+    if len(fraction) > decimals:
+        raise ValueError(f'{value} has more than {decimals} decimals')
+    return int(whole + fraction.ljust(decimals, '0'))
+
+
+def decimal_to_fixed(value, decimals):
+    scaled = value.scaleb(decimals)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f'{value} has more than {decimals} decimals')
+    return int(scaled)
+
+
+def to_decimal(value, decimals):
+    return Decimal(int(value)).scaleb(-decimals)
+
+
+class FixedTrade:
+    __slots__ = ('instrument', 'id', 'microtimestamp', 'price', 'amount', 'type')
+
+    def __init__(self, instrument, id, microtimestamp, price, amount, type):
+        self.instrument = instrument
+        self.id = id
+        self.microtimestamp = microtimestamp
+        self.price = price
+        self.amount = amount
+        self.type = type
+
+
+class FixedPointModel:
+    """
+    Compact market data: instruments are small integer ids and prices/amounts integers scaled by the pair's
+    counter_decimals/base_decimals from getTradingPairsInfo.
+    """
+
+    def __init__(self, pairs_info):
+        self.instruments = [pair['url_symbol'] for pair in pairs_info]
+        self._ids = {instrument: i for (i, instrument) in enumerate(self.instruments)}
+        self._priceDecimals = [pair['counter_decimals'] for pair in pairs_info]
+        self._amountDecimals = [pair['base_decimals'] for pair in pairs_info]
+
+    def pairs_info(self):
+        return [{'url_symbol': instrument, 'counter_decimals': price_decimals, 'base_decimals': amount_decimals} for
+                (instrument, price_decimals, amount_decimals) in
+                zip(self.instruments, self._priceDecimals, self._amountDecimals)]
+
+    def instrument_id(self, instrument):
+        return self._ids[instrument]
+
+    def trade(self, message, instrument):
+        """Builds a FixedTrade from a live_trades message, usable as the trade factory of WebsocketClient"""
+        instrument_id = self._ids[instrument]
+        return FixedTrade(instrument_id, message['id'], int(message['microtimestamp']),
+                          to_fixed(message['price_str'], self._priceDecimals[instrument_id]),
+                          to_fixed(message['amount_str'], self._amountDecimals[instrument_id]), message['type'])
+
+    def price(self, instrument_id, value):
+        return to_decimal(value, self._priceDecimals[instrument_id])
+
+    def amount(self, instrument_id, value):
+        return to_decimal(value, self._amountDecimals[instrument_id])
+
+    def fixed_price(self, instrument_id, value):
+        return decimal_to_fixed(value, self._priceDecimals[instrument_id])
+
+    def fixed_amount(self, instrument_id, value):
+        return decimal_to_fixed(value, self._amountDecimals[instrument_id])
+
+    def price_scale(self, instrument_id):
+        return 10 ** self._priceDecimals[instrument_id]
+
+    def amount_scale(self, instrument_id):
+        return 10 ** self._amountDecimals[instrument_id]
+
+
+class TradeBatch:
+    """Growable structured array of trades, about 35 bytes per trade"""
+
+    def __init__(self, capacity=1024):
+        self._array = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, trade):
+        if self._size == len(self._array):
+            self._array = np.resize(self._array, 2 * len(self._array))
+        self._array[self._size] = (trade.instrument, trade.id, trade.microtimestamp, trade.price, trade.amount,
+                                   trade.type)
+        self._size += 1
+
+    @property
+    def array(self):
+        return self._array[:self._size]
@@ -1,14 +1,87 @@
+from collections.abc import Sequence
 from decimal import Decimal
 
+import numpy as np
+
 
 class OrderBook:
 
-    def __init__(self, message):
+    def __init__(self, message, instrument=None):
+        self.instrument = instrument
+        self.microtimestamp = message.get('microtimestamp')
         self.bids = list(map(Order, message['bids']))
         self.asks = list(map(Order, message['asks']))
 
 
 class Order:
+    __slots__ = ('price', 'amount')
+
     def __init__(self, order):
         self.price = Decimal(order[0])
         self.amount = Decimal(order[1])
+
+
+class LazyLevels(Sequence):
+    """Levels of one side, an Order with exact Decimals is only built for the level accessed"""
+
+    __slots__ = ('_levels',)
+
+    def __init__(self, levels):
+        self._levels = levels
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Order(level) for level in self._levels[index]]
+        return Order(self._levels[index])
+
+    def __len__(self):
+        return len(self._levels)
+
+
+class LazyOrderBook(OrderBook):
+    """
+    Keeps the levels of the message as received and parses them on first access: bids and asks build Orders per
+    accessed level, the price and amount arrays parse a whole side into float64 at once.
+    """
+
+    def __init__(self, message, instrument=None):
+        self.instrument = instrument
+        self.microtimestamp = message.get('microtimestamp')
+        self._bids = message['bids']
+        self._asks = message['asks']
+        self._bidArray = None
+        self._askArray = None
+
+    @property
+    def bids(self):
+        return LazyLevels(self._bids)
+
+    @property
+    def asks(self):
+        return LazyLevels(self._asks)
+
+    def _bid_array(self):
+        if self._bidArray is None:
+            self._bidArray = np.array(self._bids, dtype=np.float64).reshape(-1, 2)
+        return self._bidArray
+
+    def _ask_array(self):
+        if self._askArray is None:
+            self._askArray = np.array(self._asks, dtype=np.float64).reshape(-1, 2)
+        return self._askArray
+
+    @property
+    def bid_prices(self):
+        return self._bid_array()[:, 0]
+
+    @property
+    def bid_amounts(self):
+        return self._bid_array()[:, 1]
+
+    @property
+    def ask_prices(self):
+        return self._ask_array()[:, 0]
+
+    @property
+    def ask_amounts(self):
+        return self._ask_array()[:, 1]
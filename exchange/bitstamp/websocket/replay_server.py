@@ -0,0 +1,315 @@
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import random
+import socketserver
+import struct
+import threading
+import time
+from queue import Queue
+
+import numpy as np
+
+from exchange.bitstamp.websocket.tick_recorder import TickReader
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+TEXT = 0x1
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+
+
+def encode_frame(opcode, payload):
+    """A single unmasked frame, as sent by a server"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def read_frame(rfile):
+    """Reads a frame sent by a client, returns (opcode, payload) or None once the connection is closed"""
+    header = rfile.read(2)
+    if len(header) < 2:
+        return None
+    opcode = header[0] & 0x0F
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', rfile.read(8))[0]
+    mask = rfile.read(4) if header[1] & 0x80 else None
+    payload = rfile.read(length)
+    if mask is not None:
+        payload = bytes(b ^ mask[i % 4] for (i, b) in enumerate(payload))
+    return opcode, payload
+
+
+def recorded_messages(reader, start=None, end=None, instruments=None):
+    """Trades and books of a recording as (microtimestamp, channel, message) in the order of their timestamps"""
+    trades = reader.trades(start, end, instruments)
+    books = reader.books(start, end, instruments)
+    timestamps = np.concatenate([trades['microtimestamp'], books['microtimestamp']])
+    model = reader.model
+
+    for position in np.argsort(timestamps, kind='stable'):
+        if position < len(trades):
+            record = trades[position]
+            instrument_id = int(record['instrument'])
+            instrument = model.instruments[instrument_id]
+            price = model.price(instrument_id, record['price'])
+            amount = model.amount(instrument_id, record['amount'])
+            channel = f'live_trades_{instrument}'
+            data = {
+                'id': int(record['id']),
+                'amount': float(amount), 'amount_str': str(amount),
+                'price': float(price), 'price_str': str(price),
+                'buy_order_id': 0, 'sell_order_id': 0,
+                'microtimestamp': str(record['microtimestamp']),
+                'timestamp': str(record['microtimestamp'] // 1000000),
+                'type': int(record['type']),
+            }
+            message = {'event': 'trade', 'channel': channel, 'data': data}
+        else:
+            record = books[position - len(trades)]
+            instrument_id = int(record['instrument'])
+            instrument = model.instruments[instrument_id]
+
+            def levels(prices, amounts):
+                return [[str(model.price(instrument_id, p)), str(model.amount(instrument_id, a))] for (p, a) in
+                        zip(prices, amounts) if a != 0]
+
+            channel = f'order_book_{instrument}'
+            data = {
+                'timestamp': str(record['microtimestamp'] // 1000000),
+                'microtimestamp': str(record['microtimestamp']),
+                'bids': levels(record['bid_price'], record['bid_amount']),
+                'asks': levels(record['ask_price'], record['ask_amount']),
+            }
+            message = {'event': 'data', 'channel': channel, 'data': data}
+        yield int(timestamps[position]), channel, json.dumps(message)
+
+
+def synthetic_messages(instruments, count, rate=1000, levels=100, seed=None):
+    """Alternating trades and order books of random walking prices, rate messages per second of market time"""
+    generator = random.Random(seed)
+    prices = {instrument: 100.0 for instrument in instruments}
+    start = int(time.time() * 1e6)
+    for i in range(count):
+        instrument = generator.choice(instruments)
+        microtimestamp = start + int(i * 1e6 / rate)
+        price = prices[instrument] = max(0.01, prices[instrument] * (1 + generator.gauss(0, 0.0005)))
+        if i % 2 == 0:
+            channel = f'live_trades_{instrument}'
+            amount = generator.random()
+            message = {'event': 'trade', 'channel': channel, 'data': {
+                'id': i, 'amount': round(amount, 8), 'amount_str': f'{amount:.8f}',
+                'price': round(price, 2), 'price_str': f'{price:.2f}', 'buy_order_id': 0, 'sell_order_id': 0,
+                'microtimestamp': str(microtimestamp), 'timestamp': str(microtimestamp // 1000000),
+                'type': generator.randint(0, 1)}}
+        else:
+            channel = f'order_book_{instrument}'
+            message = {'event': 'data', 'channel': channel, 'data': {
+                'timestamp': str(microtimestamp // 1000000), 'microtimestamp': str(microtimestamp),
+                'bids': [[f'{price - 0.01 * (level + 1):.2f}', f'{generator.random():.8f}'] for level in
+                         range(levels)],
+                'asks': [[f'{price + 0.01 * (level + 1):.2f}', f'{generator.random():.8f}'] for level in
+                         range(levels)]}}
+        yield microtimestamp, channel, json.dumps(message)
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    # Set on the subclass created by ReplayServer
+    replay = None
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self._lock = threading.Lock()
+        self._channels = set()
+        self._lastSubscription = None
+        self._closed = False
+
+    def _send(self, opcode, payload):
+        with self._lock:
+            self.wfile.write(encode_frame(opcode, payload))
+
+    def _handshake(self):
+        request = self.rfile.readline()
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if line == '':
+                break
+            (name, _, value) = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if not request.startswith(b'GET') or 'sec-websocket-key' not in headers:
+            self.wfile.write(b'HTTP/1.1 400 Bad Request\r\n\r\n')
+            return False
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + GUID).encode()).digest()).decode()
+        self.wfile.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                          'Upgrade: websocket\r\n'
+                          'Connection: Upgrade\r\n'
+                          f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        return True
+
+    def _on_request(self, payload):
+        request = json.loads(payload)
+        channel = request['data']['channel']
+        if request['event'] == 'bts:subscribe':
+            self._channels.add(channel)
+            self._lastSubscription = time.monotonic()
+            reply = 'bts:subscription_succeeded'
+        elif request['event'] == 'bts:unsubscribe':
+            self._channels.discard(channel)
+            reply = 'bts:unsubscription_succeeded'
+        else:
+            return
+        self._send(TEXT, json.dumps({'event': reply, 'channel': channel, 'data': {}}).encode())
+
+    def _read(self):
+        while True:
+            frame = read_frame(self.rfile)
+            if frame is None:
+                break
+            (opcode, payload) = frame
+            if opcode == TEXT:
+                self._on_request(payload)
+            elif opcode == PING:
+                self._send(PONG, payload)
+            elif opcode == CLOSE:
+                self._send(CLOSE, payload[:2])
+                break
+        self._closed = True
+
+    def _replay(self):
+        # Subscriptions arrive in a burst after the connection opened, replay starts once it is over
+        while not self._closed and (self._lastSubscription is None or
+                                    time.monotonic() - self._lastSubscription < self.replay.settle):
+            time.sleep(0.01)
+
+        speed = self.replay.speed
+        begin = None
+        sent = 0
+        for (microtimestamp, channel, message) in self.replay.messages():
+            if self._closed:
+                break
+            if speed:
+                if begin is None:
+                    begin = (microtimestamp, time.perf_counter())
+                delay = begin[1] + (microtimestamp - begin[0]) / 1e6 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if channel in self._channels:
+                self._send(TEXT, message.encode())
+                sent += 1
+        self.replay.add_sent(sent)
+        if not self._closed:
+            self.replay.finished.put(sent)
+
+    def handle(self):
+        if not self._handshake():
+            return
+        reader = threading.Thread(name='replayReader', target=self._read, daemon=True)
+        reader.start()
+        try:
+            self._replay()
+        except OSError:
+            pass
+        # The connection stays open after the replay until the client closes it
+        reader.join()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ReplayServer:
+    """
+    Local stand-in for wss://ws.bitstamp.net speaking its subscribe protocol. Every connection gets the messages
+    from the messages callable, paced by their microtimestamps: speed 1 is real time, 10 ten times faster and None
+    as fast as possible. The number of messages sent to a connection is put on finished once its replay is over,
+    sent counts those of all connections.
+    """
+
+    def __init__(self, messages, host='127.0.0.1', port=0, speed=None, settle=0.2):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.messages = messages
+        self.speed = speed
+        self.settle = settle
+        self.sent = 0
+        self._sentLock = threading.Lock()
+        self.finished = Queue()
+        handler = type('ReplayConnection', (_Connection,), {'replay': self})
+        self._server = _Server((host, port), handler)
+        self._thread = None
+
+    def add_sent(self, count):
+        with self._sentLock:
+            self.sent += count
+
+    @property
+    def url(self):
+        (host, port) = self._server.server_address[:2]
+        return f'ws://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(name='replayServer', target=self._server.serve_forever)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    from exchange.bitstamp.websocket.order_book import LazyOrderBook
+    from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+    parser = argparse.ArgumentParser(description='Replays recorded or synthetic ticks through a local websocket')
+    parser.add_argument('--directory', help='Recording of TickRecorder, synthetic messages if not given')
+    parser.add_argument('--instruments', nargs='+', default=None, help='By default all recorded instruments')
+    parser.add_argument('--messages', type=int, default=100000, help='Number of synthetic messages')
+    parser.add_argument('--rate', type=float, default=1000, help='Synthetic messages per second of market time')
+    parser.add_argument('--speed', type=float, default=None, help='Replay speed, as fast as possible if not given')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--serve', action='store_true', help='Only serve, e.g. for live_viewer.py --url')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if arguments.directory is not None:
+        reader = TickReader(arguments.directory)
+        instruments = arguments.instruments if arguments.instruments else reader.model.instruments
+        source = lambda: recorded_messages(reader, instruments=instruments)
+    else:
+        instruments = arguments.instruments or ['btcusd', 'ethusd', 'ltcusd', 'xrpusd']
+        frames = list(synthetic_messages(instruments, arguments.messages, arguments.rate))
+        source = lambda: iter(frames)
+
+    server = ReplayServer(source, port=arguments.port, speed=arguments.speed)
+    server.start()
+    print(f'Serving on {server.url}')
+    if arguments.serve:
+        server._thread.join()
+
+    client = WebsocketClient(list(instruments), url=server.url, order_book_class=LazyOrderBook)
+    queue = Queue()
+    client.register(queue)
+    begin = time.perf_counter()
+    client.start()
+    sent = server.finished.get()
+    while client.stats.messages < sent:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - begin - server.settle
+    client.stop()
+    server.stop()
+    print(f'{client.stats.messages} messages in {elapsed:.2f}s, {client.stats.messages / elapsed:,.0f} messages/s, '
+          f'{queue.qsize()} queued')
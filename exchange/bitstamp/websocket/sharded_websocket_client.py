@@ -0,0 +1,78 @@
+import logging
+
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+
+def assign_shards(instruments, shards):
+    """
+    Spreads the instruments round robin, every instrument lives on exactly one shard. There is always at least one
+    shard, for the instruments subscribed later.
+    """
+    return [instruments[i::shards] for i in range(max(1, min(shards, len(instruments))))]
+
+
+class ShardedWebsocketClient:
+    """
+    Spreads the instruments across several connections, each with its own WebsocketClient and reader thread, so a
+    slow or dropped connection only stalls its own instruments. A registered queue is registered with every shard
+    and receives the merged stream; the messages of an instrument stay in order since they all arrive through the
+    same connection.
+    """
+
+    def __init__(self, instruments, shards=4, client_class=WebsocketClient, **options):
+        assert isinstance(instruments, list)
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.shards = [client_class(assigned, name=f'wsThread-{i}', **options) for (i, assigned) in
+                       enumerate(assign_shards(instruments, shards))]
+        self._shardOf = {}
+        for shard in self.shards:
+            for instrument in shard.instruments():
+                self._shardOf[instrument] = shard
+
+    def shard(self, instrument):
+        return self._shardOf[instrument]
+
+    def register(self, queue, instruments=None, events=None):
+        for shard in self.shards:
+            shard.register(queue, instruments, events)
+
+    def unregister(self, queue):
+        for shard in self.shards:
+            shard.unregister(queue)
+
+    def subscribe(self, instrument):
+        """Adds the instrument to the shard with the fewest instruments"""
+        if instrument in self._shardOf:
+            return
+        shard = min(self.shards, key=lambda s: len(s.instruments()))
+        self._shardOf[instrument] = shard
+        shard.subscribe(instrument)
+
+    def unsubscribe(self, instrument):
+        shard = self._shardOf.pop(instrument, None)
+        if shard is not None:
+            shard.unsubscribe(instrument)
+
+    def order_book(self, instrument):
+        return self._shardOf[instrument].order_book(instrument)
+
+    def stats(self):
+        return [{'shard': i, 'instruments': len(shard.instruments()), **shard.stats.as_dict()} for (i, shard) in
+                enumerate(self.shards)]
+
+    def subscriber_stats(self):
+        # The queues are registered with every shard, the same queue objects, so their sizes and drop counts
+        # already cover the messages of all shards. Summing over the shards would count every queue once per shard.
+        return self.shards[0].subscriber_stats()
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+
+    def join(self, timeout=3):
+        for shard in self.shards:
+            shard.join(timeout)
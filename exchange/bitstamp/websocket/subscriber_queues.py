@@ -0,0 +1,66 @@
+from collections import deque
+from queue import Queue
+
+from exchange.bitstamp.websocket.local_order_book import LocalOrderBook, BookSnapshot
+from exchange.bitstamp.websocket.order_book import OrderBook
+
+# Delivery policies of WebsocketClient subscribers:
+#  - Queue() delivers everything and grows without bound
+#  - Queue(maxsize) blocks the websocket thread while the subscriber is full
+#  - DropOldestQueue(maxsize) drops the oldest message to make room
+#  - ConflatingQueue() only keeps the newest order book per instrument, trades are always delivered
+
+
+class DropOldestQueue(Queue):
+
+    def __init__(self, maxsize):
+        assert maxsize > 0
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class _BookSlot:
+    __slots__ = ('instrument',)
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+
+
+class ConflatingQueue(Queue):
+    """A book waits at the position of the first book of its instrument not yet taken, replaced by newer ones"""
+
+    def __init__(self):
+        super().__init__()
+        self.conflated = 0
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self._books = {}
+
+    def _put(self, item):
+        if not isinstance(item, (OrderBook, LocalOrderBook, BookSnapshot)):
+            self.queue.append(item)
+        elif item.instrument in self._books:
+            self._books[item.instrument] = item
+            self.conflated += 1
+            # The put did not add an entry, so there is no task to be done for it
+            self.unfinished_tasks -= 1
+        else:
+            self._books[item.instrument] = item
+            self.queue.append(_BookSlot(item.instrument))
+
+    def _get(self):
+        item = self.queue.popleft()
+        if isinstance(item, _BookSlot):
+            return self._books.pop(item.instrument)
+        return item
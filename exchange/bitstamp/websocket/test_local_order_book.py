@@ -0,0 +1,170 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock
+
+from exchange.bitstamp.websocket.local_order_book import LocalOrderBook, OrderBookEngine, BookSnapshot, load_snapshot
+
+
+class InlineExecutor:
+    """Loads snapshots on the calling thread, so tests see the result right away"""
+
+    def submit(self, function, *args):
+        function(*args)
+
+
+def snapshot(microtimestamp):
+    return {
+        'microtimestamp': str(microtimestamp),
+        'bids': [['7734.37', '0.5'], ['7729.96', '1.0'], ['7729.85', '2.0']],
+        'asks': [['7736.36', '0.3'], ['7736.37', '0.1'], ['7736.51', '4.0']],
+    }
+
+
+def diff(microtimestamp, bids=(), asks=()):
+    return {'microtimestamp': str(microtimestamp), 'bids': list(bids), 'asks': list(asks)}
+
+
+class LocalOrderBookTest(TestCase):
+
+    def testApplyDiffs(self):
+        book = LocalOrderBook('btcusd')
+        book.apply_snapshot(snapshot(100))
+
+        self.assertTrue(book.apply_diff(diff(101, bids=[['7734.37', '0'], ['7735.00', '0.2']])))
+        self.assertTrue(book.apply_diff(diff(102, asks=[['7736.36', '0.0'], ['7736.37', '0.7']])))
+
+        self.assertEqual((Decimal('7735.00'), Decimal('0.2')), book.best_bid())
+        self.assertEqual((Decimal('7736.37'), Decimal('0.7')), book.best_ask())
+        bids, asks = book.depth(2)
+        self.assertEqual([Decimal('7735.00'), Decimal('7729.96')], [price for (price, amount) in bids])
+        self.assertEqual([Decimal('7736.37'), Decimal('7736.51')], [price for (price, amount) in asks])
+
+    def testDiffsBeforeSnapshotAreSkipped(self):
+        book = LocalOrderBook('btcusd')
+        book.apply_snapshot(snapshot(100))
+
+        self.assertTrue(book.apply_diff(diff(99, bids=[['7734.37', '0']])))
+
+        self.assertEqual(Decimal('7734.37'), book.best_bid()[0])
+
+    def testGaps(self):
+        book = LocalOrderBook('btcusd')
+        book.apply_snapshot(snapshot(100))
+        book.apply_diff(diff(105))
+
+        self.assertFalse(book.apply_diff(diff(103)))
+        self.assertFalse(book.apply_diff(diff(106, bids=[['7740.00', '1.0']])))
+
+    def testSnapshotDoesNotChange(self):
+        book = LocalOrderBook('btcusd')
+        book.apply_snapshot(snapshot(100))
+
+        top = book.snapshot(2)
+        book.apply_diff(diff(101, bids=[['7734.37', '0'], ['7735.00', '0.2']]))
+
+        self.assertIsInstance(top, BookSnapshot)
+        self.assertEqual(100, top.microtimestamp)
+        self.assertEqual((Decimal('7734.37'), Decimal('0.5')), top.best_bid())
+        self.assertEqual(([(Decimal('7734.37'), Decimal('0.5')), (Decimal('7729.96'), Decimal('1.0'))],
+                          [(Decimal('7736.36'), Decimal('0.3')), (Decimal('7736.37'), Decimal('0.1'))]),
+                         top.depth(2))
+        self.assertEqual(Decimal('7735.00'), book.snapshot().best_bid()[0])
+
+
+class OrderBookEngineTest(TestCase):
+
+    def testResync(self):
+        loaded = []
+
+        def loader(instrument):
+            loaded.append(instrument)
+            return snapshot(100 * len(loaded))
+
+        engine = OrderBookEngine(['btcusd'], loader, InlineExecutor())
+
+        book = engine.on_diff('btcusd', diff(150, bids=[['7735.00', '0.2']]))
+        self.assertEqual(['btcusd'], loaded)
+        self.assertEqual(Decimal('7735.00'), book.best_bid()[0])
+
+        # Out of order diff, the book is seeded again from a newer snapshot
+        book = engine.on_diff('btcusd', diff(120))
+        self.assertEqual(2, len(loaded))
+        self.assertEqual(Decimal('7734.37'), book.best_bid()[0])
+        self.assertEqual(2, engine.resyncs['btcusd'])
+
+    def testDiffsBufferedWhileLoading(self):
+        requested = threading.Event()
+        release = threading.Event()
+
+        def loader(instrument):
+            requested.set()
+            release.wait(5)
+            return snapshot(100)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        engine = OrderBookEngine(['btcusd', 'ethusd'], loader, executor)
+
+        # The loader blocks, on_diff does not
+        self.assertIsNone(engine.on_diff('btcusd', diff(90, bids=[['7740.00', '1.0']])))
+        requested.wait(5)
+        self.assertIsNone(engine.on_diff('btcusd', diff(110, bids=[['7735.00', '0.2']])))
+        self.assertIsNone(engine.on_diff('btcusd', diff(120, asks=[['7736.36', '0']])))
+        release.set()
+        executor.shutdown()
+
+        # Diffs older than the snapshot are skipped, the newer ones applied in order
+        book = engine.books['btcusd']
+        self.assertEqual(120, book.microtimestamp)
+        self.assertEqual(Decimal('7735.00'), book.best_bid()[0])
+        self.assertEqual(Decimal('7736.37'), book.best_ask()[0])
+        self.assertIs(book, engine.on_diff('btcusd', diff(130)))
+        self.assertEqual(1, engine.resyncs['btcusd'])
+
+    def testFailedLoadIsRetriedLater(self):
+        now = [0.0]
+        failures = [1]
+
+        def loader(instrument):
+            if failures[0] > 0:
+                failures[0] -= 1
+                raise Exception('Response not ok')
+            return snapshot(100)
+
+        engine = OrderBookEngine(['btcusd'], loader, InlineExecutor(), retry_interval=1.0, clock=lambda: now[0])
+
+        with self.assertLogs('OrderBookEngine', 'ERROR'):
+            self.assertIsNone(engine.on_diff('btcusd', diff(101)))
+        self.assertIsNone(engine.on_diff('btcusd', diff(102)))
+        now[0] = 1.0
+        book = engine.on_diff('btcusd', diff(103, bids=[['7735.00', '0.2']]))
+
+        self.assertEqual(103, book.microtimestamp)
+        self.assertEqual(Decimal('7735.00'), book.best_bid()[0])
+
+    def testResetWhileLoading(self):
+        engine = OrderBookEngine(['btcusd'], lambda instrument: snapshot(100), InlineExecutor())
+        engine.on_diff('btcusd', diff(101, bids=[['7735.00', '0.2']]))
+
+        engine.reset('btcusd')
+
+        self.assertFalse(engine.books['btcusd'].synced)
+        book = engine.on_diff('btcusd', diff(102))
+        self.assertEqual(Decimal('7734.37'), book.best_bid()[0])
+        self.assertEqual(2, engine.resyncs['btcusd'])
+
+
+class LoadSnapshotTest(TestCase):
+
+    def testThroughRestClient(self):
+        rest_client = Mock()
+        rest_client.unauthenticated_get_request.return_value.ok = True
+        rest_client.unauthenticated_get_request.return_value.json.return_value = snapshot(100)
+
+        self.assertEqual(snapshot(100), load_snapshot('btcusd', rest_client))
+        rest_client.unauthenticated_get_request.assert_called_once_with('api/v2/order_book/btcusd/')
+
+        rest_client.unauthenticated_get_request.return_value.ok = False
+        with self.assertRaises(Exception):
+            load_snapshot('btcusd', rest_client)
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from exchange.bitstamp.websocket.market_data import FixedPointModel, TradeBatch, to_fixed, to_decimal
+
+
+class MarketDataTest(TestCase):
+
+    def setUp(self):
+        self.model = FixedPointModel([
+            {'url_symbol': 'btcusd', 'counter_decimals': 2, 'base_decimals': 8},
+            {'url_symbol': 'shibusd', 'counter_decimals': 8, 'base_decimals': 0},
+        ])
+
+    def testToFixed(self):
+        self.assertEqual(774968, to_fixed('7749.68', 2))
+        self.assertEqual(774900, to_fixed('7749', 2))
+        self.assertEqual(7000000, to_fixed('0.07000000', 8))
+        self.assertEqual(1234, to_fixed('0.00001234', 8))
+        with self.assertRaises(ValueError):
+            to_fixed('7749.685', 2)
+        self.assertEqual(Decimal('7749.68'), to_decimal(774968, 2))
+
+    def testTrade(self):
+        trade = self.model.trade({'id': 111557722, 'price_str': '7749.68', 'amount_str': '0.07000000',
+                                  'microtimestamp': '1588106731385000', 'type': 0}, 'btcusd')
+
+        self.assertEqual(0, trade.instrument)
+        self.assertEqual(774968, trade.price)
+        self.assertEqual(7000000, trade.amount)
+        self.assertEqual(Decimal('7749.68'), self.model.price(trade.instrument, trade.price))
+        self.assertEqual(Decimal('0.07'), self.model.amount(trade.instrument, trade.amount))
+        self.assertFalse(hasattr(trade, '__dict__'))
+
+    def testBatch(self):
+        batch = TradeBatch(capacity=2)
+        for i in range(5):
+            batch.append(self.model.trade({'id': i, 'price_str': '0.00001234', 'amount_str': str(1000 + i),
+                                           'microtimestamp': str(i), 'type': 1}, 'shibusd'))
+
+        self.assertEqual(5, len(batch))
+        self.assertEqual([1000, 1001, 1002, 1003, 1004], list(batch.array['amount']))
+        self.assertTrue((batch.array['instrument'] == 1).all())
+        self.assertEqual(Decimal('0.00001234'), self.model.price(1, batch.array['price'][0]))
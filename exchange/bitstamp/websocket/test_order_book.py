@@ -1,7 +1,9 @@
 from decimal import Decimal
 from unittest import TestCase
 
-from exchange.bitstamp.websocket.order_book import OrderBook
+import numpy as np
+
+from exchange.bitstamp.websocket.order_book import OrderBook, LazyOrderBook
 
 
 class OrderBookTest(TestCase):
@@ -25,6 +27,26 @@ class OrderBookTest(TestCase):
             self.assertGreaterEqual(ask.price, lastAsk)
             lastAsk = ask.price
 
+    def testLazy(self):
+        orderBook = LazyOrderBook(self.getMessage())
+        self.assertIsInstance(orderBook, OrderBook)
+        self.assertEqual(4, len(orderBook.asks))
+        self.assertEqual(3, len(orderBook.bids))
+        self.assertEqual(Decimal('7736.36'), orderBook.asks[0].price)
+        self.assertEqual(Decimal('0.27470635'), orderBook.asks[0].amount)
+        self.assertEqual(Decimal('7734.37'), orderBook.bids[0].price)
+        self.assertEqual(Decimal('0.03500000'), orderBook.bids[-1].amount)
+        self.assertEqual([Decimal('7729.96'), Decimal('7729.85')], [bid.price for bid in orderBook.bids[1:]])
+
+        np.testing.assert_array_equal([7734.37, 7729.96, 7729.85], orderBook.bid_prices)
+        np.testing.assert_array_equal([0.27470635, 0.17128284, 2.205728, 0.03], orderBook.ask_amounts)
+        self.assertTrue((np.diff(orderBook.ask_prices) > 0).all())
+
+    def testLazyEmptySide(self):
+        orderBook = LazyOrderBook({'bids': [], 'asks': []})
+        self.assertEqual(0, len(orderBook.bids))
+        self.assertEqual(0, len(orderBook.ask_prices))
+
     def getMessage(self):
         return {
             'asks': [
@@ -0,0 +1,97 @@
+import io
+import json
+import tempfile
+import time
+from queue import Queue
+from unittest import TestCase
+
+from exchange.bitstamp.websocket.live_trade import LiveTrade
+from exchange.bitstamp.websocket.market_data import FixedPointModel
+from exchange.bitstamp.websocket.order_book import OrderBook
+from exchange.bitstamp.websocket.replay_server import ReplayServer, encode_frame, read_frame, recorded_messages, \
+    synthetic_messages, TEXT
+from exchange.bitstamp.websocket.tick_recorder import TickRecorder, TickReader
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+
+class ReplayServerTest(TestCase):
+
+    def testFrames(self):
+        for payload in (b'x', b'y' * 200, b'z' * 70000):
+            self.assertEqual((TEXT, payload), read_frame(io.BytesIO(encode_frame(TEXT, payload))))
+        masked = bytes([0x81, 0x82, 1, 2, 3, 4, ord('o') ^ 1, ord('k') ^ 2])
+        self.assertEqual((TEXT, b'ok'), read_frame(io.BytesIO(masked)))
+        self.assertIsNone(read_frame(io.BytesIO(b'')))
+
+    def testRecordedMessages(self):
+        model = FixedPointModel([{'url_symbol': 'btcusd', 'counter_decimals': 2, 'base_decimals': 8}])
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = TickRecorder(directory, model, depth=2)
+            recorder.record(model.trade({'id': 7, 'price_str': '7749.68', 'amount_str': '0.07',
+                                         'microtimestamp': '20', 'type': 1}, 'btcusd'))
+            recorder.record(OrderBook({'bids': [['7734.37', '0.5']], 'asks': [['7736.36', '0.3']],
+                                       'microtimestamp': '10'}, 'btcusd'))
+            recorder.close()
+
+            messages = list(recorded_messages(TickReader(directory)))
+
+        self.assertEqual([(10, 'order_book_btcusd'), (20, 'live_trades_btcusd')], [m[:2] for m in messages])
+        book = json.loads(messages[0][2])
+        self.assertEqual('data', book['event'])
+        self.assertEqual([['7734.37', '0.50000000']], book['data']['bids'])
+        trade = json.loads(messages[1][2])['data']
+        self.assertEqual(('7749.68', '0.07000000', 7, 1), (trade['price_str'], trade['amount_str'], trade['id'],
+                                                          trade['type']))
+
+    def replay(self, frames, instruments, speed=None):
+        server = ReplayServer(lambda: iter(frames), speed=speed, settle=0.05)
+        server.start()
+        client = WebsocketClient(instruments, url=server.url)
+        queue = Queue()
+        client.register(queue)
+        client.start()
+        try:
+            sent = server.finished.get(timeout=10)
+            received = [queue.get(timeout=5) for _ in range(sent)]
+        finally:
+            client.stop()
+            server.stop()
+        return received
+
+    def testReplay(self):
+        frames = list(synthetic_messages(['btcusd', 'ethusd', 'ltcusd'], 200, levels=5, seed=1))
+        received = self.replay(frames, ['btcusd', 'ethusd'])
+
+        expected = [json.loads(frame) for (_, channel, frame) in frames if not channel.endswith('ltcusd')]
+        self.assertEqual(len(expected), len(received))
+        self.assertEqual([m['channel'].rsplit('_', 1)[1] for m in expected], [m.instrument for m in received])
+        self.assertIsInstance(received[0], LiveTrade)
+        self.assertIsInstance(received[1], OrderBook)
+        self.assertEqual([m['data']['id'] for m in expected if m['event'] == 'trade'],
+                         [m.id for m in received if isinstance(m, LiveTrade)])
+
+    def testSentPerConnection(self):
+        frames = list(synthetic_messages(['btcusd', 'ethusd'], 100, levels=1, seed=2))
+        server = ReplayServer(lambda: iter(frames), settle=0.05)
+        server.start()
+        clients = [WebsocketClient([instrument], url=server.url) for instrument in ('btcusd', 'ethusd')]
+        try:
+            for client in clients:
+                client.start()
+            sent = sorted(server.finished.get(timeout=10) for _ in clients)
+        finally:
+            for client in clients:
+                client.stop()
+            server.stop()
+
+        expected = sorted(sum(1 for (_, channel, _) in frames if channel.endswith(instrument))
+                          for instrument in ('btcusd', 'ethusd'))
+        self.assertEqual(expected, sent)
+        self.assertEqual(len(frames), server.sent)
+
+    def testPaced(self):
+        frames = list(synthetic_messages(['btcusd'], 21, rate=100, levels=1))
+        begin = time.perf_counter()
+        self.assertEqual(21, len(self.replay(frames, ['btcusd'], speed=2)))
+        # 200ms of market time at twice the speed
+        self.assertGreaterEqual(time.perf_counter() - begin, 0.1)
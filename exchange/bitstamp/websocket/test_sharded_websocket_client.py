@@ -0,0 +1,62 @@
+from queue import Queue
+from unittest import TestCase
+
+from exchange.bitstamp.websocket.sharded_websocket_client import ShardedWebsocketClient, assign_shards
+from exchange.bitstamp.websocket.test_websocket_client import trade_message
+
+
+class ShardedWebsocketClientTest(TestCase):
+
+    def setUp(self):
+        self.client = ShardedWebsocketClient(['btcusd', 'ethusd', 'xrpusd', 'ltcusd', 'bchusd'], shards=2,
+                                             snapshot_loader=lambda instrument: None)
+
+    def testAssignShards(self):
+        self.assertEqual([['a', 'c'], ['b']], assign_shards(['a', 'b', 'c'], 2))
+        self.assertEqual([['a']], assign_shards(['a'], 4))
+        self.assertEqual([[]], assign_shards([], 4))
+
+    def testSubscribeWithoutInstruments(self):
+        client = ShardedWebsocketClient([], snapshot_loader=lambda instrument: None)
+        queue = Queue()
+        client.register(queue)
+
+        client.subscribe('btcusd')
+        client.shard('btcusd')._on_message(trade_message('btcusd'))
+
+        self.assertEqual(['btcusd'], client.shards[0].instruments())
+        self.assertEqual([{'queued': 1, 'dropped': 0, 'conflated': 0}], client.subscriber_stats())
+
+    def testEveryInstrumentOnOneShard(self):
+        self.assertEqual(2, len(self.client.shards))
+        instruments = [i for shard in self.client.shards for i in shard.instruments()]
+        self.assertEqual(['btcusd', 'xrpusd', 'bchusd', 'ethusd', 'ltcusd'], instruments)
+        self.assertIs(self.client.shards[1], self.client.shard('ethusd'))
+
+    def testMergedStream(self):
+        queue = Queue()
+        self.client.register(queue, events=['trades'])
+        self.client.shard('btcusd')._on_message(trade_message('btcusd'))
+        self.client.shard('ethusd')._on_message(trade_message('ethusd'))
+        self.client.shard('btcusd')._on_message(trade_message('btcusd'))
+
+        self.assertEqual(['btcusd', 'ethusd', 'btcusd'], [queue.get_nowait().instrument for _ in range(3)])
+
+        self.client.unregister(queue)
+        self.client.shard('btcusd')._on_message(trade_message('btcusd'))
+        self.assertTrue(queue.empty())
+
+    def testSubscribeOnSmallestShard(self):
+        self.client.subscribe('eurusd')
+        self.assertIs(self.client.shards[1], self.client.shard('eurusd'))
+        self.assertIn('eurusd', self.client.shards[1].instruments())
+
+        self.client.unsubscribe('eurusd')
+        self.assertNotIn('eurusd', self.client.shards[1].instruments())
+
+    def testStats(self):
+        self.client.shard('btcusd')._on_message(trade_message('btcusd'))
+        stats = self.client.stats()
+        self.assertEqual([0, 1], [s['shard'] for s in stats])
+        self.assertEqual([3, 2], [s['instruments'] for s in stats])
+        self.assertEqual([1, 0], [s['messages'] for s in stats])
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from exchange.bitstamp.websocket.live_trade import LiveTrade
+from exchange.bitstamp.websocket.order_book import OrderBook
+from exchange.bitstamp.websocket.subscriber_queues import DropOldestQueue, ConflatingQueue
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+
+def trade(id, instrument='btcusd'):
+    return LiveTrade({'id': id, 'price_str': '1', 'amount_str': '1', 'sell_order_id': 1, 'buy_order_id': 2},
+                     instrument)
+
+
+def book(bid, instrument='btcusd'):
+    return OrderBook({'bids': [[bid, '1']], 'asks': []}, instrument)
+
+
+class DropOldestQueueTest(TestCase):
+
+    def testDropOldest(self):
+        queue = DropOldestQueue(3)
+        for i in range(5):
+            queue.put(i)
+
+        self.assertEqual(2, queue.dropped)
+        self.assertEqual([2, 3, 4], [queue.get_nowait() for _ in range(3)])
+        self.assertTrue(queue.empty())
+
+
+class ConflatingQueueTest(TestCase):
+
+    def testConflateBooksKeepTrades(self):
+        queue = ConflatingQueue()
+        queue.put(book('1', 'btcusd'))
+        queue.put(trade(1))
+        queue.put(book('2', 'ethusd'))
+        queue.put(book('3', 'btcusd'))
+        queue.put(trade(2))
+        queue.put(book('4', 'btcusd'))
+
+        self.assertEqual(4, queue.qsize())
+        self.assertEqual(2, queue.conflated)
+        messages = [queue.get_nowait() for _ in range(4)]
+        self.assertEqual('4', str(messages[0].bids[0].price))
+        self.assertEqual(1, messages[1].id)
+        self.assertEqual('ethusd', messages[2].instrument)
+        self.assertEqual(2, messages[3].id)
+        self.assertTrue(queue.empty())
+
+        queue.put(book('5', 'btcusd'))
+        self.assertEqual('5', str(queue.get_nowait().bids[0].price))
+
+    def testSubscriberStats(self):
+        client = WebsocketClient(['btcusd'])
+        queue = ConflatingQueue()
+        client.register(queue)
+        client.register(DropOldestQueue(1))
+
+        queue.put(book('1'))
+        queue.put(book('2'))
+
+        self.assertEqual([{'queued': 1, 'dropped': 0, 'conflated': 1}, {'queued': 0, 'dropped': 0, 'conflated': 0}],
+                         client.subscriber_stats())
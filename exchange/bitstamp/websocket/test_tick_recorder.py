@@ -0,0 +1,137 @@
+import os
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+
+import numpy as np
+
+from exchange.bitstamp.websocket.local_order_book import LocalOrderBook, BookSnapshot
+from exchange.bitstamp.websocket.market_data import FixedPointModel, TRADE_DTYPE
+from exchange.bitstamp.websocket.order_book import LazyOrderBook
+from exchange.bitstamp.websocket.tick_recorder import TickRecorder, TickReader, SegmentWriter, INDEX_DTYPE, \
+    build_index, segment_numbers, segment_path
+
+PAIRS_INFO = [
+    {'url_symbol': 'btcusd', 'counter_decimals': 2, 'base_decimals': 8},
+    {'url_symbol': 'ethusd', 'counter_decimals': 2, 'base_decimals': 8},
+]
+
+
+def trade(model, instrument, microtimestamp):
+    return model.trade({'id': microtimestamp, 'price_str': '7749.68', 'amount_str': '0.07000000',
+                        'microtimestamp': str(microtimestamp), 'type': 1}, instrument)
+
+
+class TickRecorderTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.model = FixedPointModel(PAIRS_INFO)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRollingSegments(self):
+        recorder = TickRecorder(self.path, self.model, segment_records=3, buffer_records=2)
+        for i in range(7):
+            recorder.record(trade(self.model, ('btcusd', 'ethusd')[i % 2], 100 + i))
+        recorder.flush()
+
+        self.assertEqual([1, 2, 3], segment_numbers(self.path, 'trades'))
+        self.assertTrue(os.path.exists(os.path.join(self.path, 'trades-000002.idx')))
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'trades-000003.idx')))
+
+        reader = TickReader(self.path)
+        trades = reader.trades()
+        np.testing.assert_array_equal(np.arange(100, 107), trades['microtimestamp'])
+        self.assertEqual(774968, trades['price'][0])
+        self.assertEqual([101, 103, 105], list(reader.trades(instruments=['ethusd'])['microtimestamp']))
+        self.assertEqual([102, 103, 104], list(reader.trades(102, 105)['microtimestamp']))
+        self.assertIsInstance(reader.segment('trades', 1), np.memmap)
+
+        recorder.close()
+        self.assertTrue(os.path.exists(os.path.join(self.path, 'trades-000003.idx')))
+        # A new recorder never appends to sealed segments
+        self.assertEqual(4, TickRecorder(self.path, self.model)._trades._number)
+
+    def testCompress(self):
+        recorder = TickRecorder(self.path, self.model, segment_records=2, buffer_records=1, compress=True)
+        for i in range(5):
+            recorder.record(trade(self.model, 'btcusd', i))
+        recorder.close()
+
+        self.assertEqual(['trades-000001.bin.gz', 'trades-000002.bin.gz', 'trades-000003.bin.gz'],
+                         sorted(name for name in os.listdir(self.path) if name.endswith('.gz')))
+        self.assertEqual(list(range(5)), list(TickReader(self.path).trades()['microtimestamp']))
+
+    def testReadCompressedBlocks(self):
+        TickRecorder(self.path, self.model)
+        writer = SegmentWriter(self.path, 'trades', TRADE_DTYPE, segment_records=8, buffer_records=2, compress=True,
+                               index_block=3)
+        for microtimestamp in range(10):
+            writer.append((0, microtimestamp, microtimestamp, 1, 1, 0))
+        writer.close()
+
+        reader = TickReader(self.path)
+        self.assertEqual([[3, 4, 5]], [list(chunk['microtimestamp']) for chunk in reader.blocks('trades', 1, 4, 5)])
+        self.assertEqual([[6, 7]], [list(chunk['microtimestamp']) for chunk in reader.blocks('trades', 1, 7, 20)])
+        self.assertEqual([4, 5, 6, 7, 8], list(reader.trades(4, 9)['microtimestamp']))
+        self.assertEqual(list(range(10)), list(reader.trades()['microtimestamp']))
+
+    def testBooks(self):
+        recorder = TickRecorder(self.path, self.model, depth=2)
+        recorder.record(LazyOrderBook({'bids': [['7734.37', '0.5'], ['7734.00', '1.25'], ['7733.00', '1']],
+                                       'asks': [['7736.36', '0.3']], 'microtimestamp': '1588108309372574'},
+                                      'ethusd'))
+        book = LocalOrderBook('btcusd')
+        book.apply_snapshot({'bids': [['100.00', '1']], 'asks': [['101.00', '0.00000001']], 'microtimestamp': '5'})
+        recorder.record(book)
+        recorder.close()
+
+        books = TickReader(self.path).books()
+        self.assertEqual([1, 0], list(books['instrument']))
+        self.assertEqual([773437, 773400], list(books['bid_price'][0]))
+        self.assertEqual([50000000, 125000000], list(books['bid_amount'][0]))
+        self.assertEqual([773636, 0], list(books['ask_price'][0]))
+        self.assertEqual([1, 0], list(books['ask_amount'][1]))
+        self.assertEqual(Decimal('7736.36'), TickReader(self.path).model.price(1, books['ask_price'][0][0]))
+
+    def testThread(self):
+        recorder = TickRecorder(self.path, self.model)
+        recorder.start()
+        recorder.queue.put(trade(self.model, 'btcusd', 1))
+        recorder.queue.put(object())
+        # Unknown instrument, recording goes on
+        recorder.queue.put(BookSnapshot('ltcusd', 2, ((Decimal('1'), Decimal('1')),), ()))
+        recorder.queue.put(trade(self.model, 'btcusd', 3))
+        with self.assertLogs('TickRecorder', 'ERROR'):
+            recorder.stop()
+
+        self.assertEqual({'trades': 2, 'books': 0}, recorder.records)
+        self.assertEqual(2, recorder.skipped)
+        self.assertEqual([1, 3], list(TickReader(self.path).trades()['microtimestamp']))
+
+    def testIndexWhileWriting(self):
+        writer = SegmentWriter(self.path, 'trades', TRADE_DTYPE, segment_records=8, buffer_records=2, index_block=3)
+        for microtimestamp in [5, 1, 2, 9, 7, 4, 8, 6, 3, 10]:
+            writer.append((0, microtimestamp, microtimestamp, 1, 1, 0))
+        writer.close()
+
+        for number in (1, 2):
+            records = np.fromfile(segment_path(self.path, 'trades', number), dtype=TRADE_DTYPE)
+            index = np.fromfile(os.path.join(self.path, f'trades-{number:06d}.idx'), dtype=INDEX_DTYPE)
+            np.testing.assert_array_equal(build_index(records, block=3), index)
+
+    def testOtherPairs(self):
+        TickRecorder(self.path, self.model)
+        with self.assertRaises(Exception):
+            TickRecorder(self.path, FixedPointModel(PAIRS_INFO[:1]))
+
+    def testBuildIndex(self):
+        records = np.zeros(5, dtype=[('microtimestamp', np.int64)])
+        records['microtimestamp'] = [3, 1, 2, 9, 7]
+        index = build_index(records, block=2)
+        self.assertEqual([0, 2, 4], list(index['offset']))
+        self.assertEqual([1, 2, 7], list(index['first']))
+        self.assertEqual([3, 9, 7], list(index['last']))
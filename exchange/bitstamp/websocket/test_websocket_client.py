@@ -0,0 +1,157 @@
+import json
+from queue import Queue
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from exchange.bitstamp.websocket.live_trade import LiveTrade
+from exchange.bitstamp.websocket.local_order_book import BookSnapshot
+from exchange.bitstamp.websocket.test_local_order_book import InlineExecutor
+from exchange.bitstamp.websocket.order_book import OrderBook
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+
+def trade_message(instrument):
+    return json.dumps({
+        'event': 'trade',
+        'channel': f'live_trades_{instrument}',
+        'data': {'id': 1, 'price_str': '7749.68', 'amount_str': '0.07', 'sell_order_id': 2, 'buy_order_id': 3},
+    })
+
+
+def book_message(channel, microtimestamp='1588108309372574'):
+    return json.dumps({
+        'event': 'data',
+        'channel': channel,
+        'data': {'bids': [['7734.37', '0.5']], 'asks': [['7736.36', '0.3']], 'microtimestamp': microtimestamp},
+    })
+
+
+class WebsocketClientTest(TestCase):
+
+    def setUp(self):
+        self.client = WebsocketClient(['btcusd', 'ethusd'], snapshot_loader=lambda instrument: {
+            'bids': [['7700.00', '1.0']], 'asks': [['7800.00', '1.0']], 'microtimestamp': '1'},
+                                      snapshot_executor=InlineExecutor())
+        self.queues = [Queue(), Queue()]
+        for queue in self.queues:
+            self.client.register(queue)
+
+    def testTradeSharedBySubscribers(self):
+        self.client._on_message(trade_message('ethusd'))
+
+        trades = [queue.get_nowait() for queue in self.queues]
+        self.assertIsInstance(trades[0], LiveTrade)
+        self.assertIs(trades[0], trades[1])
+        self.assertEqual('ethusd', trades[0].instrument)
+
+    def testOrderBook(self):
+        self.client._on_message(book_message('order_book_btcusd'))
+
+        books = [queue.get_nowait() for queue in self.queues]
+        self.assertIsInstance(books[0], OrderBook)
+        self.assertIs(books[0], books[1])
+
+    def testDiffOrderBook(self):
+        self.client._on_message(book_message('diff_order_book_btcusd'))
+
+        book = self.queues[0].get_nowait()
+        self.assertIsInstance(book, BookSnapshot)
+        self.assertIs(book, self.queues[1].get_nowait())
+        self.assertEqual('7734.37', str(book.best_bid()[0]))
+        self.assertEqual(book.depth(), self.client.order_book('btcusd').depth())
+
+        # Later diffs change the book, not what was published
+        self.client._on_message(book_message('diff_order_book_btcusd', '1588108309372575').replace('0.5', '0'))
+        self.assertEqual('0.5', str(book.best_bid()[1]))
+        self.assertEqual('7700.00', str(self.client.order_book('btcusd').best_bid()[0]))
+
+    def testSubscriptionSucceeded(self):
+        self.client._on_message(json.dumps({'event': 'bts:subscription_succeeded', 'channel': 'live_trades_btcusd',
+                                            'data': {}}))
+
+        self.assertTrue(self.queues[0].empty())
+
+    def testTopicFilter(self):
+        trades = Queue()
+        books = Queue()
+        self.client.register(trades, instruments=['btcusd'], events=['trades'])
+        self.client.register(books, events=['book'])
+
+        self.client._on_message(trade_message('btcusd'))
+        self.client._on_message(trade_message('ethusd'))
+        self.client._on_message(book_message('order_book_ethusd'))
+
+        self.assertEqual(1, trades.qsize())
+        self.assertEqual('btcusd', trades.get_nowait().instrument)
+        self.assertEqual(1, books.qsize())
+        self.assertIsInstance(books.get_nowait(), OrderBook)
+        self.assertEqual(3, self.queues[0].qsize())
+
+        self.client.unregister(trades)
+        self.client._on_message(trade_message('btcusd'))
+        self.assertTrue(trades.empty())
+
+    def testNoSubscriberNoObject(self):
+        client = WebsocketClient(['btcusd'], trade_factory=Mock())
+        client.register(Queue(), events=['book'])
+
+        client._on_message(trade_message('btcusd'))
+
+        client._tradeFactory.assert_not_called()
+
+    def testSubscribeAtRuntime(self):
+        websocket_app = Mock()
+        websocket_app.sock.connected = True
+        self.client._websocket = websocket_app
+        ltc = Queue()
+        self.client.register(ltc, instruments=['ltcusd'])
+
+        self.client.subscribe('ltcusd')
+        self.client._on_message(trade_message('ltcusd'))
+        self.client.unsubscribe('btcusd')
+        self.client._on_message(trade_message('btcusd'))
+
+        sent = [json.loads(call.args[0]) for call in websocket_app.send.call_args_list]
+        self.assertEqual([('bts:subscribe', 'live_trades_ltcusd'), ('bts:subscribe', 'order_book_ltcusd'),
+                          ('bts:unsubscribe', 'live_trades_btcusd'), ('bts:unsubscribe', 'order_book_btcusd')],
+                         [(message['event'], message['data']['channel']) for message in sent])
+        self.assertEqual('ltcusd', ltc.get_nowait().instrument)
+        self.assertEqual(1, self.queues[0].qsize())
+
+        # The book of an instrument subscribed again is seeded again
+        self.client._on_message(book_message('diff_order_book_ethusd'))
+        self.assertEqual(1, self.client._orderBookEngine.resyncs['ethusd'])
+        self.client.unsubscribe('ethusd')
+        self.assertFalse(self.client.order_book('ethusd').synced)
+        self.client.subscribe('ethusd')
+        self.client._on_message(book_message('diff_order_book_ethusd', '1588108309372580'))
+        self.assertEqual(2, self.client._orderBookEngine.resyncs['ethusd'])
+        self.assertEqual(1588108309372580, self.client.order_book('ethusd').microtimestamp)
+
+    def testStats(self):
+        client = WebsocketClient(['btcusd'], clock=lambda: 1588108310.0)
+        client.stats.start()
+        client._on_message(book_message('order_book_btcusd', '1588108309500000'))
+        client._on_message(trade_message('btcusd'))
+
+        stats = client.stats.as_dict()
+        self.assertEqual(2, stats['messages'])
+        self.assertAlmostEqual(0.5, stats['lag'])
+        self.assertAlmostEqual(0.5, stats['max_lag'])
+
+    def testReconnectBackoff(self):
+        client = WebsocketClient(['btcusd'], reconnect_delay=0.001, max_reconnect_delay=0.004)
+        delays = []
+
+        def run_forever(**kwargs):
+            delays.append(client._delay)
+            if len(delays) == 5:
+                client._stopped = True
+
+        with patch('exchange.bitstamp.websocket.websocket_client.websocket.WebSocketApp') as app:
+            app.return_value.run_forever.side_effect = run_forever
+            client.start()
+            client._websocketThread.join(1)
+
+        self.assertEqual([0.001, 0.002, 0.004, 0.004, 0.004], delays)
+        self.assertEqual(4, client.stats.reconnects)
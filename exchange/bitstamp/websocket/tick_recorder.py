@@ -0,0 +1,387 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+
+import numpy as np
+
+from data.settings import TICK_DATA_PATH
+from exchange.bitstamp.websocket.local_order_book import LocalOrderBook, BookSnapshot
+from exchange.bitstamp.websocket.market_data import TRADE_DTYPE, FixedPointModel, FixedTrade
+from exchange.bitstamp.websocket.order_book import OrderBook
+
+BOOK_DEPTH = 10
+SEGMENT_RECORDS = 1 << 20
+INDEX_BLOCK = 4096
+INDEX_DTYPE = np.dtype([('offset', np.int64), ('first', np.int64), ('last', np.int64)])
+KINDS = ('trades', 'books')
+
+
+def book_dtype(depth=BOOK_DEPTH):
+    """The best levels of both sides in fixed point, missing levels have price and amount 0"""
+    return np.dtype([
+        ('instrument', np.uint16),
+        ('microtimestamp', np.int64),
+        ('bid_price', np.int64, (depth,)),
+        ('bid_amount', np.int64, (depth,)),
+        ('ask_price', np.int64, (depth,)),
+        ('ask_amount', np.int64, (depth,)),
+    ])
+
+
+def build_index(records, block=INDEX_BLOCK):
+    """Smallest and largest microtimestamp of every block of records"""
+    offsets = np.arange(0, len(records), block)
+    index = np.zeros(len(offsets), dtype=INDEX_DTYPE)
+    if len(records) > 0:
+        timestamps = np.asarray(records['microtimestamp'])
+        index['offset'] = offsets
+        index['first'] = np.minimum.reduceat(timestamps, offsets)
+        index['last'] = np.maximum.reduceat(timestamps, offsets)
+    return index
+
+
+def segment_numbers(directory, kind):
+    pattern = re.compile(rf'{kind}-(\d+)\.bin(\.gz)?$')
+    numbers = set()
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match is not None:
+            numbers.add(int(match.group(1)))
+    return sorted(numbers)
+
+
+def segment_path(directory, kind, number):
+    return os.path.join(directory, f'{kind}-{number:06d}.bin')
+
+
+class SegmentWriter:
+    """
+    Appends fixed size records of one kind to numbered segment files. Records are buffered in an array and written
+    in one go; a full segment is sealed with its time index, optionally compressed, and never written again. The
+    index is kept up to date while writing and the compression runs on a thread of its own, so sealing a segment
+    does not hold up the recording.
+    """
+
+    def __init__(self, directory, kind, dtype, segment_records=SEGMENT_RECORDS, buffer_records=1024,
+                 compress=False, index_block=INDEX_BLOCK):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._directory = directory
+        self._kind = kind
+        self._dtype = dtype
+        self._segmentRecords = segment_records
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{kind}Compressor') if compress \
+            else None
+        self._indexBlock = index_block
+        # (first, last) microtimestamp of the blocks of the current segment
+        self._index = []
+        self._buffer = np.zeros(buffer_records, dtype=dtype)
+        self._buffered = 0
+        numbers = segment_numbers(directory, kind)
+        # A restarted recorder starts a new segment, existing ones stay untouched
+        self._number = numbers[-1] + 1 if len(numbers) > 0 else 1
+        self._file = None
+        self._written = 0
+        self.records = 0
+
+    def append(self, record):
+        self._buffer[self._buffered] = record
+        self._buffered += 1
+        self.records += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        records = self._buffer[:self._buffered]
+        while len(records) > 0:
+            if self._file is None:
+                self._file = open(segment_path(self._directory, self._kind, self._number), 'ab')
+            count = min(len(records), self._segmentRecords - self._written)
+            self._file.write(records[:count].tobytes())
+            self._update_index(records[:count]['microtimestamp'])
+            self._written += count
+            records = records[count:]
+            if self._written == self._segmentRecords:
+                self.roll()
+        if self._file is not None:
+            self._file.flush()
+        self._buffered = 0
+
+    def _update_index(self, timestamps):
+        # Written records continue the current segment at self._written
+        position = self._written
+        while len(timestamps) > 0:
+            block = position // self._indexBlock
+            count = min(len(timestamps), (block + 1) * self._indexBlock - position)
+            (first, last) = (int(timestamps[:count].min()), int(timestamps[:count].max()))
+            if block < len(self._index):
+                self._index[block] = (min(self._index[block][0], first), max(self._index[block][1], last))
+            else:
+                self._index.append((first, last))
+            timestamps = timestamps[count:]
+            position += count
+
+    def roll(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        path = segment_path(self._directory, self._kind, self._number)
+        index = np.zeros(len(self._index), dtype=INDEX_DTYPE)
+        index['offset'] = np.arange(len(self._index)) * self._indexBlock
+        if len(self._index) > 0:
+            (index['first'], index['last']) = zip(*self._index)
+        index.tofile(path[:-len('.bin')] + '.idx')
+        if self._compressor is not None:
+            self._compressor.submit(self._compress, path)
+        self._logger.info(f'Sealed {os.path.basename(path)} with {self._written} records')
+        self._number += 1
+        self._written = 0
+        self._index = []
+
+    def _compress(self, path):
+        try:
+            # Readers use the plain segment until the compressed one is complete
+            with open(path, 'rb') as source, gzip.open(path + '.gz.tmp', 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target)
+            os.replace(path + '.gz.tmp', path + '.gz')
+            os.remove(path)
+        except Exception:
+            self._logger.exception(f'Could not compress {os.path.basename(path)}')
+
+    def close(self):
+        self.flush()
+        self.roll()
+        if self._compressor is not None:
+            # Waits for the sealed segments to be compressed
+            self._compressor.shutdown()
+
+
+class TickRecorder:
+    """
+    Subscriber writing trades and order books to rolling segments of fixed size records in directory. Trades have to
+    be FixedTrades, so the WebsocketClient is created with trade_factory=model.trade; books are recorded up to depth
+    levels. Register recorder.queue with the client and start() the recorder.
+    """
+
+    def __init__(self, directory, model, depth=BOOK_DEPTH, segment_records=SEGMENT_RECORDS, buffer_records=1024,
+                 compress=False, queue=None, flush_interval=1.0):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        os.makedirs(directory, exist_ok=True)
+        meta = {'pairs_info': model.pairs_info(), 'depth': depth}
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                # Instrument ids and scales of the existing segments must stay valid
+                if json.load(f) != meta:
+                    raise Exception(f'{directory} was recorded with other pairs or depth')
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+
+        self._model = model
+        self._depth = depth
+        self._flushInterval = flush_interval
+        self.queue = queue if queue is not None else Queue()
+        self.skipped = 0
+        self._trades = SegmentWriter(directory, 'trades', TRADE_DTYPE, segment_records, buffer_records, compress)
+        self._books = SegmentWriter(directory, 'books', book_dtype(depth), segment_records, buffer_records, compress)
+        self._thread = None
+
+    def _levels(self, instrument_id, levels):
+        prices = [0] * self._depth
+        amounts = [0] * self._depth
+        for (i, (price, amount)) in enumerate(levels):
+            prices[i] = self._model.fixed_price(instrument_id, price)
+            amounts[i] = self._model.fixed_amount(instrument_id, amount)
+        return prices, amounts
+
+    def record(self, item):
+        if isinstance(item, FixedTrade):
+            self._trades.append((item.instrument, item.id, item.microtimestamp, item.price, item.amount, item.type))
+        elif isinstance(item, (OrderBook, LocalOrderBook, BookSnapshot)) and item.microtimestamp is not None:
+            if isinstance(item, (LocalOrderBook, BookSnapshot)):
+                (bids, asks) = item.depth(self._depth)
+            else:
+                bids = [(order.price, order.amount) for order in item.bids[:self._depth]]
+                asks = [(order.price, order.amount) for order in item.asks[:self._depth]]
+            instrument_id = self._model.instrument_id(item.instrument)
+            (bid_prices, bid_amounts) = self._levels(instrument_id, bids)
+            (ask_prices, ask_amounts) = self._levels(instrument_id, asks)
+            self._books.append((instrument_id, int(item.microtimestamp), bid_prices, bid_amounts, ask_prices,
+                                ask_amounts))
+        else:
+            if self.skipped == 0:
+                self._logger.warning(f'Not recording {type(item).__name__}, trades have to be FixedTrades')
+            self.skipped += 1
+
+    @property
+    def records(self):
+        return {'trades': self._trades.records, 'books': self._books.records}
+
+    def flush(self):
+        self._trades.flush()
+        self._books.flush()
+
+    def close(self):
+        self._trades.close()
+        self._books.close()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self._flushInterval)
+            except Empty:
+                # Quiet markets still reach the disk regularly
+                self.flush()
+                continue
+            if item is None:
+                break
+            try:
+                self.record(item)
+            except Exception:
+                # One bad item does not stop the recording
+                self._logger.exception(f'Could not record {type(item).__name__}')
+                self.skipped += 1
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(name='tickRecorder', target=self._run)
+        self._thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+
+
+class TickReader:
+    """
+    Reads recorded segments. Plain ones are memory mapped and compressed ones are decompressed as a stream, in both
+    cases only the blocks of the requested time are kept in memory.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        self.model = FixedPointModel(meta['pairs_info'])
+        self.depth = meta['depth']
+        self._dtypes = {'trades': TRADE_DTYPE, 'books': book_dtype(self.depth)}
+
+    def segments(self, kind):
+        return segment_numbers(self._directory, kind)
+
+    def _plain(self, kind, number):
+        path = segment_path(self._directory, kind, number)
+        dtype = self._dtypes[kind]
+        try:
+            size = os.path.getsize(path)
+            if size < dtype.itemsize:
+                return np.zeros(0, dtype=dtype)
+            # A segment still written may end with part of a record
+            return np.memmap(path, dtype=dtype, mode='r', shape=(size // dtype.itemsize,))
+        except FileNotFoundError:
+            # Compressed, possibly just now
+            return None
+
+    def segment(self, kind, number):
+        """All records of a segment, a compressed one is decompressed into memory as a whole"""
+        records = self._plain(kind, number)
+        if records is not None:
+            return records
+        with gzip.open(segment_path(self._directory, kind, number) + '.gz', 'rb') as f:
+            return np.frombuffer(f.read(), dtype=self._dtypes[kind])
+
+    def _index_path(self, kind, number):
+        return segment_path(self._directory, kind, number)[:-len('.bin')] + '.idx'
+
+    def index(self, kind, number, records):
+        path = self._index_path(kind, number)
+        if os.path.exists(path):
+            return np.fromfile(path, dtype=INDEX_DTYPE)
+        return build_index(records)
+
+    def blocks(self, kind, number, start, end):
+        """The index blocks of a segment which may hold records with start <= microtimestamp < end"""
+        records = self._plain(kind, number)
+        if records is None and not os.path.exists(self._index_path(kind, number)):
+            records = self.segment(kind, number)
+        if records is not None:
+            index = self.index(kind, number, records)
+            ends = np.append(index['offset'][1:], len(records))
+            for block in np.flatnonzero((index['last'] >= start) & (index['first'] < end)):
+                yield records[index['offset'][block]:ends[block]]
+            return
+
+        # Sealed segments always have their index, the blocks before a selected one are decompressed and skipped
+        dtype = self._dtypes[kind]
+        index = np.fromfile(self._index_path(kind, number), dtype=INDEX_DTYPE)
+        with gzip.open(segment_path(self._directory, kind, number) + '.gz', 'rb') as f:
+            for block in np.flatnonzero((index['last'] >= start) & (index['first'] < end)):
+                f.seek(int(index['offset'][block]) * dtype.itemsize)
+                if block + 1 < len(index):
+                    size = int(index['offset'][block + 1] - index['offset'][block]) * dtype.itemsize
+                else:
+                    size = -1
+                yield np.frombuffer(f.read(size), dtype=dtype)
+
+    def read(self, kind, start=None, end=None, instruments=None):
+        """Records with start <= microtimestamp < end in the order received, optionally of some instruments only"""
+        start = np.iinfo(np.int64).min if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+        instrument_ids = None if instruments is None else [self.model.instrument_id(i) for i in instruments]
+        chunks = []
+        for number in self.segments(kind):
+            for chunk in self.blocks(kind, number, start, end):
+                mask = (chunk['microtimestamp'] >= start) & (chunk['microtimestamp'] < end)
+                if instrument_ids is not None:
+                    mask &= np.isin(chunk['instrument'], instrument_ids)
+                chunks.append(np.asarray(chunk[mask]))
+        if len(chunks) == 0:
+            return np.zeros(0, dtype=self._dtypes[kind])
+        return np.concatenate(chunks)
+
+    def trades(self, start=None, end=None, instruments=None):
+        return self.read('trades', start, end, instruments)
+
+    def books(self, start=None, end=None, instruments=None):
+        return self.read('books', start, end, instruments)
+
+
+if __name__ == "__main__":
+    from exchange.bitstamp.bitstamp_client import BitstampClient
+    from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+    from data.settings import BITSTAMP_TRADING_PAIRS
+
+    parser = argparse.ArgumentParser(description='Records live trades and order books of Bitstamp')
+    parser.add_argument('--instruments', nargs='+', default=list(BITSTAMP_TRADING_PAIRS))
+    parser.add_argument('--directory', default=TICK_DATA_PATH)
+    parser.add_argument('--depth', type=int, default=BOOK_DEPTH)
+    parser.add_argument('--compress', action='store_true', help='gzip segments when they are sealed, reads decompress them block by block')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    pairs_info = [pair for pair in BitstampClient().getTradingPairsInfo() if pair['url_symbol'] in arguments.instruments]
+    model = FixedPointModel(pairs_info)
+    recorder = TickRecorder(arguments.directory, model, depth=arguments.depth, compress=arguments.compress)
+    client = WebsocketClient(model.instruments, trade_factory=model.trade)
+    client.register(recorder.queue)
+    recorder.start()
+    client.start()
+
+    def signal_handler(sig, frame):
+        client.stop()
+        recorder.stop()
+        print(f'Recorded {recorder.records}')
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.pause()
@@ -1,38 +1,238 @@
 import json
 import logging
 import threading
+import time
 from queue import Queue
 
 import websocket
 
+from data.settings import BITSTAMP_WEBSOCKET_URL
+from exchange.bitstamp.websocket import json_decoder
+from exchange.bitstamp.websocket.local_order_book import OrderBookEngine, load_snapshot
 from exchange.bitstamp.websocket.order_book import OrderBook
 from exchange.bitstamp.websocket.live_trade import LiveTrade
 
+# Event types a subscriber can register for and their channels
+EVENTS = {
+    'trades': 'live_trades',
+    'book': 'order_book',
+    'diffs': 'diff_order_book',
+}
+
+
+class ConnectionStats:
+    """Throughput of a connection and the lag between the exchange timestamp of a message and its arrival"""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self.started = None
+        self.messages = 0
+        self.reconnects = 0
+        self.lag = None
+        self.max_lag = 0.0
+
+    def start(self):
+        self.started = self._clock()
+
+    def record(self, data):
+        self.messages += 1
+        microtimestamp = data.get('microtimestamp')
+        if microtimestamp is not None:
+            self.lag = self._clock() - int(microtimestamp) / 1e6
+            self.max_lag = max(self.max_lag, self.lag)
+
+    @property
+    def rate(self):
+        if self.started is None:
+            return 0.0
+        elapsed = self._clock() - self.started
+        return self.messages / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'messages': self.messages,
+            'rate': self.rate,
+            'lag': self.lag,
+            'max_lag': self.max_lag,
+            'reconnects': self.reconnects,
+        }
+
 
 class WebsocketClient():
 
-    def __init__(self, instruments):
+    def __init__(self, instruments, channels=('live_trades', 'order_book'), snapshot_loader=load_snapshot,
+                 order_book_class=OrderBook, trade_factory=LiveTrade, loads=json_decoder.loads, name='wsThread',
+                 reconnect_delay=1.0, max_reconnect_delay=60.0, clock=time.time, url=BITSTAMP_WEBSOCKET_URL,
+                 snapshot_executor=None, book_levels=10):
         # websocket.enableTrace(True)
         assert isinstance(instruments, list)
         assert instruments != None
         self._logger = logging.getLogger(self.__class__.__name__)
-        self._instruments = instruments
+        self._instruments = list(instruments)
         self._websocket = None
         self._websocketThread = None
         self._stopped = True
         self._queues = []
+        self._filters = []
+        self._routing = {}
+        self._channels = channels
+        # LazyOrderBook only parses the levels a consumer looks at
+        self._orderBookClass = order_book_class
+        # FixedPointModel.trade builds compact fixed point trades instead of LiveTrades
+        self._tradeFactory = trade_factory
+        # With the diff_order_book channel a LocalOrderBook per instrument is kept up to date, subscribers receive
+        # BookSnapshots of its book_levels best levels
+        self._orderBookEngine = OrderBookEngine(instruments, snapshot_loader, snapshot_executor)
+        self._bookLevels = book_levels
+        self._loads = loads
+        self._name = name
+        # ReplayServer.url serves recorded or synthetic messages instead of the exchange
+        self._url = url
+        self._reconnectDelay = reconnect_delay
+        self._maxReconnectDelay = max_reconnect_delay
+        self._delay = reconnect_delay
+        self._wakeup = threading.Event()
+        self.stats = ConnectionStats(clock)
+        self._routes = {}
+        for instrument in instruments:
+            self._add_routes(instrument)
+
+    def _add_routes(self, instrument):
+        for channel in EVENTS.values():
+            self._routes[f'{channel}_{instrument}'] = (channel, instrument)
+
+    def _update_routing(self):
+        # Subscribers are matched to (channel, instrument) once here instead of on every message
+        routing = {}
+        for instrument in self._instruments:
+            for channel in EVENTS.values():
+                queues = [queue for (queue, (instruments, channels)) in zip(self._queues, self._filters) if
+                          (instruments is None or instrument in instruments) and (channels is None or channel in channels)]
+                if len(queues) > 0:
+                    routing[(channel, instrument)] = queues
+        self._routing = routing
+
+    def _route(self, channel):
+        route = self._routes.get(channel)
+        if route is None:
+            (name, instrument) = channel.rsplit('_', 1)
+            route = self._routes[channel] = (name, instrument)
+        return route
+
+    @staticmethod
+    def _publish(queues, message):
+        for queue in queues:
+            queue.put(message)
 
-    def register(self, queue):
+    def _on_message(self, msg):
+        # Each message is decoded once and every subscriber receives the same object, which is not even built
+        # when nobody subscribed to it
+        message = self._loads(msg)
+        event = message['event']
+        if event == 'trade':
+            self.stats.record(message['data'])
+            route = self._route(message['channel'])
+            queues = self._routing.get(route)
+            if queues is not None:
+                self._publish(queues, self._tradeFactory(message['data'], route[1]))
+        elif event == 'data':
+            self.stats.record(message['data'])
+            route = self._route(message['channel'])
+            queues = self._routing.get(route)
+            if route[0] == 'diff_order_book':
+                # The book is kept up to date even without subscribers, for order_book()
+                book = self._orderBookEngine.on_diff(route[1], message['data'])
+                if book is not None and queues is not None:
+                    # The book keeps changing on this thread, subscribers get an immutable copy of its top
+                    self._publish(queues, book.snapshot(self._bookLevels))
+            elif queues is not None:
+                self._publish(queues, self._orderBookClass(message['data'], route[1]))
+        elif event in ('bts:subscription_succeeded', 'bts:unsubscription_succeeded'):
+            pass
+        else:
+            self._logger.info(f'UNHANDLED: {msg}')
+
+    def order_book(self, instrument):
+        return self._orderBookEngine.books[instrument]
+
+    def register(self, queue, instruments=None, events=None):
+        """
+        The queue receives the events ('trades', 'book', 'diffs') of the instruments, by default all of them. The
+        queue class is the delivery policy, see subscriber_queues.
+        """
         assert isinstance(queue, Queue)
+        assert events is None or set(events) <= set(EVENTS.keys())
         self._queues.append(queue)
+        self._filters.append((None if instruments is None else set(instruments),
+                              None if events is None else {EVENTS[event] for event in events}))
+        self._update_routing()
+
+    def unregister(self, queue):
+        index = self._queues.index(queue)
+        del self._queues[index]
+        del self._filters[index]
+        self._update_routing()
+
+    def subscribe(self, instrument):
+        """Adds an instrument at runtime, without reconnecting"""
+        if instrument in self._instruments:
+            return
+        self._instruments.append(instrument)
+        self._add_routes(instrument)
+        self._orderBookEngine.add(instrument)
+        self._update_routing()
+        self._send_subscriptions('bts:subscribe', instrument)
+
+    def unsubscribe(self, instrument):
+        if instrument not in self._instruments:
+            return
+        self._instruments.remove(instrument)
+        self._update_routing()
+        self._send_subscriptions('bts:unsubscribe', instrument)
+        # Diffs are missed until it is subscribed again, the book is seeded again then
+        self._orderBookEngine.reset(instrument)
+
+    def _send_subscriptions(self, event, instrument):
+        websocket_app = self._websocket
+        if websocket_app is None or websocket_app.sock is None or not websocket_app.sock.connected:
+            # Subscriptions are sent for all instruments once connected
+            return
+        for channel in self._channels:
+            msg = json.dumps({
+                "event": event,
+                "data": {
+                    "channel": f'{channel}_{instrument}'
+                }
+            })
+            websocket_app.send(msg)
+
+    def subscriber_stats(self):
+        return [{
+            'queued': queue.qsize(),
+            'dropped': getattr(queue, 'dropped', 0),
+            'conflated': getattr(queue, 'conflated', 0),
+        } for queue in self._queues]
+
+    def instruments(self):
+        return list(self._instruments)
 
     def stop(self):
         if self._stopped:
             return
 
         self._stopped = True
-        self._websocket.close()
+        self._wakeup.set()
+        self._websocket.keep_running = False
+        sock = self._websocket.sock
+        if sock is not None and sock.connected:
+            # Closing the socket from this thread would leave the websocket thread waiting for data until the next
+            # ping, shutting it down wakes the thread which then closes it
+            sock.send_close()
+            sock.abort()
         self._websocketThread.join()
+        if sock is not None:
+            # The websocket thread skips closing a socket it no longer considers connected
+            sock.shutdown()
         self._websocket = None
         self._websocketThread = None
 
@@ -44,56 +244,44 @@ class WebsocketClient():
         if not self._stopped:
             return
 
-        def _on_ws_message(ws, msg):
-            message = json.loads(msg)
-            if (message['event'] == 'trade'):
-                for queue in self._queues:
-                    queue.put(LiveTrade(message['data'], message['channel'].split('_')[-1]))
-            elif (message['event'] == 'data'):
-                for queue in self._queues:
-                    queue.put(OrderBook(message['data']))
-            elif (message['event'] == 'bts:subscription_succeeded'):
-                pass
-            else:
-                self._logger.info('UNHANDLED: ' + msg)
-
         def _on_ws_error(ws, error):
-            self._logger.info('--- ws client error ---')
+            self._logger.info(f'--- {self._name} client error ---')
             self._logger.info(error)
 
         def _on_ws_close(ws, code, message):
-            self._logger.info(f'ws client close {code} {message}')
+            self._logger.info(f'{self._name} client close {code} {message}')
 
         def _on_ws_open(ws):
-            self._logger.info("ws client open")
-            for instrument in self._instruments:
-                msg = json.dumps({
-                    "event": "bts:subscribe",
-                    "data": {
-                        "channel": "live_trades_" + instrument
-                    }
-                })
-                self._websocket.send(msg)
-                msg = json.dumps({
-                    "event": "bts:subscribe",
-                    "data": {
-                        "channel": "order_book_" + instrument
-                    }
-                })
-                self._websocket.send(msg)
+            self._logger.info(f"{self._name} client open")
+            self._delay = self._reconnectDelay
+            # Diffs may have been missed while disconnected
+            self._orderBookEngine.reset()
+            for instrument in list(self._instruments):
+                self._send_subscriptions('bts:subscribe', instrument)
 
         def run():
-            self._stopped = False
-            self._websocket = websocket.WebSocketApp("wss://ws.bitstamp.net",
-                                                     on_message=_on_ws_message,
+            self._websocket = websocket.WebSocketApp(self._url,
+                                                     on_message=lambda ws, msg: self._on_message(msg),
                                                      on_error=_on_ws_error,
                                                      on_close=_on_ws_close)
             self._websocket.on_open = _on_ws_open
             while not self._stopped:
                 try:
-                    self._websocket.run_forever(ping_interval=10)
-                except:
-                    pass
+                    # Without wsaccel the frame validation is pure Python and costs more than the dispatch,
+                    # decoding the text already rejects invalid UTF-8
+                    self._websocket.run_forever(ping_interval=10, skip_utf8_validation=True)
+                except Exception:
+                    self._logger.exception(f'{self._name} connection failed')
+                if self._stopped:
+                    break
+                # Back off exponentially until a connection opens again
+                self._logger.info(f'{self._name} reconnecting in {self._delay:.1f}s')
+                self._wakeup.wait(self._delay)
+                self._delay = min(self._delay * 2, self._maxReconnectDelay)
+                self.stats.reconnects += 1
 
-        self._websocketThread = threading.Thread(name='wsThread', target=run)
+        self._stopped = False
+        self._wakeup.clear()
+        self.stats.start()
+        self._websocketThread = threading.Thread(name=self._name, target=run)
         self._websocketThread.start()
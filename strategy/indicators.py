@@ -0,0 +1,88 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas
+
+# The features of the dual momentum strategy, computed for all pairs at once on (time x pair) arrays. The bot and
+# the backtests both use compute_indicators, so live and backtested signals come from the same code.
+
+
+def pct_change(values, periods):
+    # Same semantics as pandas' pct_change with the default forward fill, applied to every column at once
+    filled = pandas.DataFrame(values).ffill().to_numpy()
+    shifted = np.full_like(filled, np.nan)
+    shifted[periods:] = filled[:-periods]
+    return filled / shifted - 1
+
+
+def rolling_mean(values, window):
+    return pandas.DataFrame(values).rolling(window).mean().to_numpy()
+
+
+def rolling_std(values, window):
+    return pandas.DataFrame(values).rolling(window).std().to_numpy()
+
+
+def data_version(*arrays):
+    """Fingerprint of the contents of the arrays"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype.str)).encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Memoizes every feature by data version and its own parameters, so e.g. a sweep over roc_period computes the
+    volume and std features only once. Cached arrays are read only as they are shared by all callers.
+    """
+
+    def __init__(self, maxsize=256):
+        self._maxsize = maxsize
+        self._features = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def feature(self, key, compute):
+        if key in self._features:
+            self._features.move_to_end(key)
+            self.hits += 1
+            return self._features[key]
+        self.misses += 1
+        value = compute()
+        value.flags.writeable = False
+        self._features[key] = value
+        if len(self._features) > self._maxsize:
+            self._features.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._features.clear()
+
+    def compute(self, close, volume, version=None, roc_period=4, volume_period=4, std_period=26):
+        version = version or data_version(close, volume)
+        volume_avg = self.feature((version, 'volume_avg', volume_period), lambda: rolling_mean(volume, volume_period))
+        std = self.feature((version, 'std', std_period), lambda: rolling_std(close, std_period))
+        std_avg = self.feature((version, 'std_avg', std_period), lambda: rolling_mean(close, std_period))
+        return {
+            'volume_avg': volume_avg,
+            'volume_roc': self.feature((version, 'volume_roc', volume_period), lambda: pct_change(volume_avg, 1)),
+            'roc': self.feature((version, 'roc', roc_period), lambda: pct_change(close, roc_period)),
+            'std': std,
+            'std_avg': std_avg,
+            'std_pct': self.feature((version, 'std_pct', std_period), lambda: std / std_avg),
+        }
+
+    def __str__(self):
+        return f'{len(self._features)} features, {self.hits} hits, {self.misses} misses'
+
+
+indicator_cache = IndicatorCache()
+
+
+def compute_indicators(close, volume, roc_period=4, volume_period=4, std_period=26, version=None):
+    """version identifies the data, e.g. Panel.version, by default it is derived from close and volume"""
+    return indicator_cache.compute(close, volume, version, roc_period, volume_period, std_period)
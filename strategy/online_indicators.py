@@ -0,0 +1,291 @@
+import argparse
+import logging
+import math
+import threading
+import time
+from collections import deque
+from queue import Queue
+
+import pandas
+
+from exchange.bitstamp.websocket.market_data import FixedTrade
+
+WEEK = 7 * 24 * 3600
+# 1970-01-01 was a Thursday, weeks start on Monday 00:00 UTC and end on Sunday like the W-SUN bars
+MONDAY = 4 * 24 * 3600
+
+
+def week_of(seconds):
+    return int((seconds - MONDAY) // WEEK)
+
+
+class RollingStats:
+    """Mean and sample variance of the last size values, Welford updates when a value enters or leaves"""
+
+    def __init__(self, size):
+        self.values = deque()
+        self.size = size
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        delta = value - self._mean
+        self._mean += delta / len(self.values)
+        self._m2 += delta * (value - self._mean)
+        if len(self.values) > self.size:
+            self._remove(self.values.popleft())
+
+    def _remove(self, value):
+        count = len(self.values)
+        if count == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / count
+        self._m2 -= delta * (value - self._mean)
+
+    def with_value(self, value):
+        """(count, mean, variance) of the values and one more, without adding it"""
+        count = len(self.values) + 1
+        delta = value - self._mean
+        mean = self._mean + delta / count
+        m2 = self._m2 + delta * (value - mean)
+        return count, mean, max(m2, 0.0) / (count - 1) if count > 1 else math.nan
+
+
+class PairIndicators:
+    """
+    Weekly OHLCV of the running week and the indicators of compute_indicators for it, with the running week as the
+    last bar. Every trade costs O(1): the completed weeks only change when a week is rolled.
+    """
+
+    def __init__(self, roc_period=4, volume_period=4, std_period=26):
+        self._rocPeriod = roc_period
+        self._volumePeriod = volume_period
+        self.closes = RollingStats(std_period - 1)
+        self._pastCloses = deque(maxlen=roc_period)
+        self._volumes = deque(maxlen=volume_period)
+        self.week = None
+        self.open = self.high = self.low = self.close = math.nan
+        self.volume = 0.0
+        self.volume_avg = self.volume_roc = self.roc = self.std_pct = math.nan
+
+    def _complete(self, close, volume):
+        self.closes.add(close)
+        self._pastCloses.append(close)
+        self._volumes.append(volume)
+
+    def seed(self, closes, volumes, last_week=None, running=()):
+        """
+        Completed weekly bars before the running week, oldest first. With the week_of the last bar the week after it
+        is running, so weeks without trades until the first live one are completed with its close. running are the
+        (week, open, high, low, close, volume) bars of the running week so far, e.g. its daily bars.
+        """
+        for (close, volume) in zip(closes, volumes):
+            if not math.isnan(close):
+                self._complete(close, volume)
+                self.close = close
+        if last_week is not None:
+            self.week = last_week + 1
+            self.open = self.high = self.low = math.nan
+            self.volume = 0.0
+        for bar in running:
+            self.add(*bar)
+
+    def _roll(self, week):
+        if self.week is not None:
+            self._complete(self.close, self.volume)
+            # Weeks without trades keep the last close and have no volume
+            for _ in range(min(week - self.week - 1, self.closes.size + self._rocPeriod)):
+                self._complete(self.close, 0.0)
+        self.week = week
+        # The close stays the last one until the first trade of the week
+        self.open = self.high = self.low = math.nan
+        self.volume = 0.0
+
+    def add(self, week, open, high, low, close, volume):
+        """Adds a bar of part of a week, a trade is one with the same open, high, low and close"""
+        # A late bar of a week already rolled counts for the running week
+        if self.week is None or week > self.week:
+            self._roll(week)
+        if math.isnan(self.open):
+            (self.open, self.high, self.low) = (open, high, low)
+        self.high = max(self.high, high)
+        self.low = min(self.low, low)
+        self.close = close
+        self.volume += volume
+        self._update_indicators()
+
+    def update(self, seconds, price, amount):
+        self.add(week_of(seconds), price, price, price, price, amount)
+
+    def _update_indicators(self):
+        volumes = self._volumes
+        if len(volumes) == self._volumePeriod:
+            previous = sum(volumes) / self._volumePeriod
+            self.volume_avg = (previous * self._volumePeriod - volumes[0] + self.volume) / self._volumePeriod
+            if previous != 0:
+                self.volume_roc = self.volume_avg / previous - 1
+            else:
+                # Like the division of numpy in compute_indicators
+                self.volume_roc = math.inf if self.volume_avg > 0 else math.nan
+        elif len(volumes) == self._volumePeriod - 1:
+            self.volume_avg = (sum(volumes) + self.volume) / self._volumePeriod
+        past = self._pastCloses
+        self.roc = self.close / past[0] - 1 if len(past) == self._rocPeriod else math.nan
+        if len(self.closes.values) == self.closes.size:
+            (_, mean, variance) = self.closes.with_value(self.close)
+            self.std_pct = math.sqrt(variance) / mean
+        else:
+            self.std_pct = math.nan
+
+
+class OnlineIndicators:
+    """
+    Indicators of every pair kept up to date by the trades of a WebsocketClient: register the queue for 'trades'
+    and start(). The coin of the week of the running week can be asked for at any time.
+    """
+
+    def __init__(self, roc_period=4, volume_period=4, std_period=26, std_tolerance=1.05, roc_floor=0.01,
+                 model=None, queue=None, clock=time.time):
+        self._parameters = (roc_period, volume_period, std_period)
+        self._stdTolerance = std_tolerance
+        self._rocFloor = roc_floor
+        # Needed to read FixedTrades
+        self._model = model
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.pairs = {}
+        self.queue = queue if queue is not None else Queue()
+        self._thread = None
+
+    def pair(self, pair):
+        if pair not in self.pairs:
+            self.pairs[pair] = PairIndicators(*self._parameters)
+        return self.pairs[pair]
+
+    def seed(self, pair, closes, volumes, last_week=None, running=()):
+        with self._lock:
+            self.pair(pair).seed(closes, volumes, last_week, running)
+
+    def on_trade(self, trade):
+        if isinstance(trade, FixedTrade):
+            pair = self._model.instruments[trade.instrument]
+            price = float(self._model.price(trade.instrument, trade.price))
+            amount = float(self._model.amount(trade.instrument, trade.amount))
+        else:
+            pair = trade.instrument
+            price = float(trade.price)
+            amount = float(trade.amount)
+        microtimestamp = trade.microtimestamp
+        seconds = int(microtimestamp) / 1e6 if microtimestamp is not None else self._clock()
+        with self._lock:
+            self.pair(pair).update(seconds, price, amount)
+
+    def coin_of_the_week(self):
+        """Ranks the pairs like evaluate_coin_of_the_week, with the running week as the last bar"""
+        with self._lock:
+            max_volume_pair = None
+            max_volume = 0
+            for (pair, indicators) in self.pairs.items():
+                volume = indicators.volume_avg * indicators.close
+                if volume > max_volume:
+                    max_volume = volume
+                    max_volume_pair = pair
+            if max_volume_pair is None:
+                return None
+
+            std_max_volume = self.pairs[max_volume_pair].std_pct
+            long = None
+            long_roc = -1
+            for (pair, indicators) in self.pairs.items():
+                roc = indicators.roc
+                if indicators.std_pct <= std_max_volume * self._stdTolerance and roc > self._rocFloor and \
+                        roc > long_roc and indicators.volume_roc > 0:
+                    long_roc = roc
+                    long = pair
+            return long
+
+    def _run(self):
+        while True:
+            trade = self.queue.get()
+            if trade is None:
+                break
+            self.on_trade(trade)
+
+    def start(self):
+        self._thread = threading.Thread(name='onlineIndicators', target=self._run)
+        self._thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+
+
+def seed_from_daily_bars(online_indicators, daily_bars, now=None):
+    """
+    Seeds every pair with the weekly bars completed before the running week of now and the daily bars of the running
+    week started before now, the trades after now add to them. The bars are labelled with the UTC start of their day.
+    """
+    now = time.time() if now is None else now
+    running_week = week_of(now)
+    for (pair, df) in daily_bars.items():
+        df = df[[day.timestamp() < now for day in df.index]]
+        close = df['close'].resample('W-SUN').last()
+        volume = df['volume'].resample('W-SUN').sum()
+        # A W-SUN bar is labelled with its Sunday, the week started 6 days before
+        weeks = [week_of((label - pandas.Timedelta(days=6)).timestamp()) for label in close.index]
+        completed = [week < running_week for week in weeks]
+        last_week = max((week for week in weeks if week < running_week), default=None)
+        running = [(week_of(day.timestamp()), row.open, row.high, row.low, row.close, row.volume) for (day, row) in
+                   zip(df.index, df.itertuples()) if week_of(day.timestamp()) == running_week]
+        online_indicators.seed(pair, close[completed].ffill().to_numpy(), volume[completed].to_numpy(), last_week,
+                               running)
+
+
+def follow_trades(websocket_client, daily_bars, now=None, **kwargs):
+    """Started OnlineIndicators seeded from the daily bars of the pairs and updated by the trades of the client"""
+    online_indicators = OnlineIndicators(**kwargs)
+    seed_from_daily_bars(online_indicators, daily_bars, now)
+    websocket_client.register(online_indicators.queue, events=['trades'])
+    online_indicators.start()
+    return online_indicators
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+
+    import pystore
+
+    from data.daily_bar_store import DailyBarStore
+    from data.settings import BOT_PYSTORE_PATH, PYSTORE_STORE, PYSTORE_COLLECTION_BOT_DAILY
+    from exchange.bitstamp.bitstamp_client import BitstampClient
+    from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+
+    parser = argparse.ArgumentParser(description='Shows the coin of the week of the running week from live trades')
+    parser.add_argument('--pairs', nargs='+', default=None, help='By default the usd pairs the bot trades')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds between evaluations')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    log = logging.getLogger('online_indicators')
+    client = BitstampClient()
+    pairs = arguments.pairs or [pair['url_symbol'] for pair in client.getTradingPairsInfo() if
+                                pair['trading'] == 'Enabled' and pair['instant_and_market_orders'] == 'Enabled' and
+                                pair['url_symbol'].endswith('usd')]
+    Path(BOT_PYSTORE_PATH).mkdir(parents=True, exist_ok=True)
+    pystore.set_path(BOT_PYSTORE_PATH)
+    bar_store = DailyBarStore(pystore.store(PYSTORE_STORE).collection(PYSTORE_COLLECTION_BOT_DAILY))
+
+    websocket_client = WebsocketClient(pairs, channels=('live_trades',))
+    online_indicators = follow_trades(websocket_client, bar_store.update(client, pairs))
+    websocket_client.start()
+    try:
+        while True:
+            time.sleep(arguments.interval)
+            log.info(f'{online_indicators.coin_of_the_week()} is coin of the week so far')
+    except KeyboardInterrupt:
+        websocket_client.stop()
+        online_indicators.stop()
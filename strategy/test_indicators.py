@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from strategy.indicators import IndicatorCache, data_version
+
+
+class IndicatorsTest(TestCase):
+
+    def setUp(self):
+        random = np.random.default_rng(1)
+        self.close = 100 * np.cumprod(1 + random.normal(0, 0.1, (60, 3)), axis=0)
+        self.volume = random.uniform(100, 1000, (60, 3))
+        # A pair listed later and a missing week
+        self.close[:20, 2] = np.nan
+        self.volume[:20, 2] = np.nan
+        self.close[40, 1] = np.nan
+        self.cache = IndicatorCache()
+
+    def testSameAsPandasPerPair(self):
+        indicators = self.cache.compute(self.close, self.volume)
+
+        for column in range(3):
+            df = pandas.DataFrame({'close': self.close[:, column], 'volume': self.volume[:, column]})
+            df['volume_avg'] = df.volume.rolling(4).mean()
+            df['roc'] = df.close.ffill().pct_change(periods=4)
+            df['volume_roc'] = df.volume_avg.ffill().pct_change(periods=1)
+            df['std'] = df.close.rolling(26).std()
+            df['std_avg'] = df.close.rolling(26).mean()
+            df['std_pct'] = df['std'] / df['std_avg']
+            for name in ('volume_avg', 'roc', 'volume_roc', 'std', 'std_avg', 'std_pct'):
+                np.testing.assert_allclose(df[name].to_numpy(), indicators[name][:, column], err_msg=name)
+
+    def testMemoized(self):
+        first = self.cache.compute(self.close, self.volume, roc_period=4)
+        self.assertEqual(6, self.cache.misses)
+
+        second = self.cache.compute(self.close, self.volume, roc_period=2)
+        self.assertIs(first['std_pct'], second['std_pct'])
+        self.assertIsNot(first['roc'], second['roc'])
+        self.assertEqual(7, self.cache.misses)
+        with self.assertRaises(ValueError):
+            first['roc'][0, 0] = 1
+
+        changed = self.close.copy()
+        changed[-1, 0] *= 2
+        self.assertFalse(np.array_equal(first['roc'], self.cache.compute(changed, self.volume)['roc'],
+                                        equal_nan=True))
+        self.assertEqual(2, self.cache.compute(self.close, self.volume, version='v1')['roc'].ndim)
+        self.assertEqual(19, self.cache.misses)
+
+    def testEviction(self):
+        cache = IndicatorCache(maxsize=6)
+        cache.compute(self.close, self.volume, version='a')
+        cache.compute(self.close, self.volume, version='b')
+        cache.compute(self.close, self.volume, version='a')
+        self.assertEqual(18, cache.misses)
+
+    def testDataVersion(self):
+        self.assertEqual(data_version(self.close), data_version(self.close.copy()))
+        self.assertNotEqual(data_version(self.close), data_version(self.close[:-1]))
+        self.assertNotEqual(data_version(self.close), data_version(self.close.astype(np.float32)))
@@ -0,0 +1,211 @@
+import json
+from types import SimpleNamespace
+from unittest import TestCase
+
+import numpy as np
+import pandas
+
+from exchange.bitstamp.websocket.market_data import FixedPointModel
+from exchange.bitstamp.websocket.websocket_client import WebsocketClient
+from strategy.indicators import IndicatorCache
+from strategy.online_indicators import OnlineIndicators, RollingStats, seed_from_daily_bars, week_of, follow_trades
+
+
+def trade(instrument, timestamp, price, amount):
+    return SimpleNamespace(instrument=instrument, price=price, amount=amount,
+                           microtimestamp=str(int(pandas.Timestamp(timestamp).timestamp() * 1e6)))
+
+
+class OnlineIndicatorsTest(TestCase):
+
+    def setUp(self):
+        random = np.random.default_rng(3)
+        self.pairs = ['btcusd', 'ethusd', 'xrpusd']
+        # Trades every 12 hours over 40 weeks starting on a Monday
+        self.times = pandas.date_range('2021-01-04', periods=40 * 14, freq='12h', tz='UTC')
+        self.prices = 100 * np.cumprod(1 + random.normal(0.002, 0.03, (len(self.times), 3)), axis=0)
+        self.amounts = random.uniform(1, 10, (len(self.times), 3))
+
+    def batch(self, rows):
+        """compute_indicators on the weekly bars of the first rows trades, the running week being the last bar"""
+        close = {}
+        volume = {}
+        for (column, pair) in enumerate(self.pairs):
+            series = pandas.DataFrame({'close': self.prices[:rows, column], 'volume': self.amounts[:rows, column]},
+                                      index=self.times[:rows])
+            close[pair] = series['close'].resample('W-SUN').last()
+            volume[pair] = series['volume'].resample('W-SUN').sum()
+        return IndicatorCache().compute(pandas.DataFrame(close).to_numpy(), pandas.DataFrame(volume).to_numpy())
+
+    def daily(self, days):
+        """Daily bars of btcusd with one trade a day"""
+        close = self.prices[:len(days), 0]
+        return pandas.DataFrame({'open': close, 'high': close, 'low': close, 'close': close,
+                                 'volume': self.amounts[:len(days), 0]}, index=days)
+
+    def feed(self, indicators, rows):
+        for row in range(rows):
+            for (column, pair) in enumerate(self.pairs):
+                indicators.on_trade(trade(pair, self.times[row], self.prices[row, column],
+                                          self.amounts[row, column]))
+
+    def testSameAsBatch(self):
+        # Mid week and at the end of a week
+        for rows in [30 * 14 + 5, 40 * 14]:
+            indicators = OnlineIndicators()
+            self.feed(indicators, rows)
+            batch = self.batch(rows)
+            for (column, pair) in enumerate(self.pairs):
+                online = indicators.pairs[pair]
+                for name in ['volume_avg', 'volume_roc', 'roc', 'std_pct']:
+                    self.assertAlmostEqual(batch[name][-1, column], getattr(online, name), places=9, msg=name)
+                self.assertEqual(self.prices[rows - 1, column], online.close)
+
+    def testCoinOfTheWeek(self):
+        indicators = OnlineIndicators()
+        self.feed(indicators, 40 * 14)
+        batch = self.batch(40 * 14)
+        data = {pair: {name: values[-1, column] for (name, values) in batch.items()} for (column, pair) in
+                enumerate(self.pairs)}
+        max_volume_pair = max(self.pairs, key=lambda pair: data[pair]['volume_avg'] * self.prices[-1][
+            self.pairs.index(pair)])
+        expected = None
+        long_roc = -1
+        for pair in self.pairs:
+            if data[pair]['std_pct'] <= data[max_volume_pair]['std_pct'] * 1.05 and data[pair]['roc'] > 0.01 and \
+                    data[pair]['roc'] > long_roc and data[pair]['volume_roc'] > 0:
+                long_roc = data[pair]['roc']
+                expected = pair
+        self.assertEqual(expected, indicators.coin_of_the_week())
+
+    def testNotEnoughHistory(self):
+        indicators = OnlineIndicators()
+        self.assertIsNone(indicators.coin_of_the_week())
+        self.feed(indicators, 14)
+        self.assertTrue(np.isnan(indicators.pairs['btcusd'].roc))
+        self.assertIsNone(indicators.coin_of_the_week())
+
+    def testWeeksWithoutTrades(self):
+        indicators = OnlineIndicators()
+        indicators.on_trade(trade('btcusd', '2021-01-04', 100, 1))
+        indicators.on_trade(trade('btcusd', '2021-02-01', 110, 2))
+        online = indicators.pairs['btcusd']
+        # The empty weeks keep the close of the first one
+        self.assertEqual(110 / 100 - 1, online.roc)
+        self.assertEqual(2 / 4, online.volume_avg)
+        self.assertEqual(0.5 / 0.25 - 1, online.volume_roc)
+
+    def testSeedFromDailyBars(self):
+        days = pandas.date_range('2021-01-04', periods=30 * 7, freq='D', tz='UTC')
+        daily = self.daily(days)
+        now = pandas.Timestamp('2021-07-28', tz='UTC')
+        seeded = OnlineIndicators()
+        seed_from_daily_bars(seeded, {'btcusd': daily}, now.timestamp())
+        # The days of the running week before now are seeded, the later ones come from trades
+        for (timestamp, row) in daily[daily.index >= now].iterrows():
+            seeded.on_trade(trade('btcusd', timestamp, row['close'], row['volume']))
+
+        traded = OnlineIndicators()
+        for (timestamp, row) in daily.iterrows():
+            traded.on_trade(trade('btcusd', timestamp, row['close'], row['volume']))
+        for name in ['volume_avg', 'volume_roc', 'roc', 'std_pct']:
+            self.assertAlmostEqual(getattr(traded.pairs['btcusd'], name), getattr(seeded.pairs['btcusd'], name))
+
+    def testSeedMidWeek(self):
+        rows = 30 * 14 + 7
+        for (column, pair) in enumerate(self.pairs):
+            trades = pandas.DataFrame({'price': self.prices[:rows, column], 'amount': self.amounts[:rows, column]},
+                                      index=self.times[:rows])
+            daily = trades['price'].resample('D').ohlc()
+            daily['volume'] = trades['amount'].resample('D').sum()
+            seeded = OnlineIndicators()
+            # Halfway through the day of the last trade
+            seed_from_daily_bars(seeded, {pair: daily}, self.times[rows - 1].timestamp() + 1)
+            online = seeded.pairs[pair]
+
+            batch = self.batch(rows)
+            for name in ['volume_avg', 'volume_roc', 'roc', 'std_pct']:
+                self.assertAlmostEqual(batch[name][-1, column], getattr(online, name), places=9, msg=name)
+            weekly = trades['price'].resample('W-SUN').ohlc().iloc[-1]
+            self.assertEqual((weekly['open'], weekly['high'], weekly['low'], weekly['close']),
+                             (online.open, online.high, online.low, online.close))
+            self.assertAlmostEqual(trades['amount'].resample('W-SUN').sum().iloc[-1], online.volume)
+
+            # The trades after now continue the running week
+            for row in range(rows, rows + 4):
+                seeded.on_trade(trade(pair, self.times[row], self.prices[row, column], self.amounts[row, column]))
+            batch = self.batch(rows + 4)
+            for name in ['volume_avg', 'volume_roc', 'roc', 'std_pct']:
+                self.assertAlmostEqual(batch[name][-1, column], getattr(online, name), places=9, msg=name)
+
+    def testSeedBeforeGap(self):
+        days = pandas.date_range('2021-01-04', periods=27 * 7, freq='D', tz='UTC')
+        daily = self.daily(days)
+        # The bars end two weeks before the first live trade
+        first = pandas.Timestamp('2021-07-28', tz='UTC')
+        seeded = OnlineIndicators()
+        seed_from_daily_bars(seeded, {'btcusd': daily}, first.timestamp())
+        seeded.on_trade(trade('btcusd', first, 150, 3))
+
+        traded = OnlineIndicators()
+        for (timestamp, row) in daily.iterrows():
+            traded.on_trade(trade('btcusd', timestamp, row['close'], row['volume']))
+        traded.on_trade(trade('btcusd', first, 150, 3))
+        for name in ['volume_avg', 'volume_roc', 'roc', 'std_pct']:
+            self.assertAlmostEqual(getattr(traded.pairs['btcusd'], name), getattr(seeded.pairs['btcusd'], name))
+
+    def testWeeklyOHLC(self):
+        indicators = OnlineIndicators()
+        indicators.on_trade(trade('btcusd', '2021-01-04', 100, 1))
+        indicators.on_trade(trade('btcusd', '2021-01-05', 120, 1))
+        indicators.on_trade(trade('btcusd', '2021-01-11', 110, 2))
+        indicators.on_trade(trade('btcusd', '2021-01-12', 105, 1))
+        indicators.on_trade(trade('btcusd', '2021-01-13', 108, 1))
+        online = indicators.pairs['btcusd']
+        # The close of the week before is not part of the running week
+        self.assertEqual((110, 110, 105, 108, 4), (online.open, online.high, online.low, online.close, online.volume))
+
+        online._roll(online.week + 1)
+        self.assertTrue(np.isnan(online.open) and np.isnan(online.high) and np.isnan(online.low))
+        self.assertEqual(108, online.close)
+
+    def testFollowTrades(self):
+        days = pandas.date_range('2021-01-04', periods=28 * 7, freq='D', tz='UTC')
+        daily = self.daily(days)
+        now = pandas.Timestamp('2021-07-20', tz='UTC')
+        client = WebsocketClient(['btcusd'])
+        indicators = follow_trades(client, {'btcusd': daily}, now.timestamp())
+        client._on_message(json.dumps({'event': 'trade', 'channel': 'live_trades_btcusd', 'data': {
+            'id': 1, 'price_str': '150.00', 'amount_str': '2.0', 'microtimestamp': str(int(now.timestamp() * 1e6)),
+            'type': 0, 'buy_order_id': 2, 'sell_order_id': 3}}))
+        indicators.stop()
+
+        online = indicators.pairs['btcusd']
+        self.assertEqual((150, 2), (online.close, online.volume))
+        self.assertEqual(25, len(online.closes.values))
+        self.assertFalse(np.isnan(online.roc))
+
+    def testFixedTrades(self):
+        model = FixedPointModel([{'url_symbol': 'btcusd', 'base_decimals': 8, 'counter_decimals': 2}])
+        indicators = OnlineIndicators(model=model)
+        message = {'id': 1, 'price_str': '30000.12', 'amount_str': '0.5', 'microtimestamp': '1609718400000000',
+                   'type': 0}
+        indicators.start()
+        indicators.queue.put(model.trade(message, 'btcusd'))
+        indicators.stop()
+        online = indicators.pairs['btcusd']
+        self.assertEqual(30000.12, online.close)
+        self.assertEqual(0.5, online.volume)
+        self.assertEqual(week_of(1609718400), online.week)
+
+    def testRollingStats(self):
+        values = np.random.default_rng(5).normal(100, 10, 50)
+        stats = RollingStats(10)
+        for (i, value) in enumerate(values):
+            stats.add(value)
+            window = values[max(0, i - 9):i + 1]
+            (count, mean, variance) = stats.with_value(1.5)
+            expected = np.append(window, 1.5)
+            self.assertEqual(len(expected), count)
+            self.assertAlmostEqual(expected.mean(), mean)
+            self.assertAlmostEqual(expected.var(ddof=1), variance)
@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls, e.g. REST requests sharing one keep-alive session, on a thread pool of concurrency threads.
+    map waits for the calls of many keys, call runs one of them from a coroutine.
+    """
+
+    def __init__(self, concurrency=8, name='executor'):
+        self._concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name)
+        self._semaphores = {}
+
+    def close(self):
+        self._executor.shutdown()
+
+    def map(self, function, keys, return_exceptions=False):
+        """function(key) of every key keyed by the key, with return_exceptions failures are returned, not raised"""
+        futures = {key: self._executor.submit(function, key) for key in keys}
+        results = {}
+        for (key, future) in futures.items():
+            exception = future.exception()
+            if exception is not None and not return_exceptions:
+                raise exception
+            results[key] = exception if exception is not None else future.result()
+        return results
+
+    def _semaphore(self):
+        # Semaphores are bound to the event loop they are first used in
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores = {loop: asyncio.Semaphore(self._concurrency)}
+        return self._semaphores[loop]
+
+    async def call(self, function, *args):
+        async with self._semaphore():
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
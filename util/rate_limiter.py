@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread safe token bucket: allows bursts of up to burst calls and rate calls per second on average.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        assert rate > 0
+        assert burst >= 1
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Takes the tokens and returns how many seconds the caller has to wait before using them"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= tokens
+            return -self._tokens / self._rate if self._tokens < 0 else 0
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
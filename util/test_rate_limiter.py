@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from util.rate_limiter import RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimiterTest(TestCase):
+
+    def testBurstThenRate(self):
+        clock = FakeClock()
+        limiter = RateLimiter(10, burst=3, clock=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            self.assertEqual(0, limiter.acquire())
+        self.assertAlmostEqual(0.1, limiter.acquire())
+        self.assertAlmostEqual(0.1, limiter.acquire())
+        self.assertAlmostEqual(0.2, clock.now)
+
+    def testRefill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, burst=2, clock=clock, sleep=clock.sleep)
+
+        limiter.acquire()
+        limiter.acquire()
+        clock.now += 10
+        self.assertEqual(0, limiter.acquire())
+        self.assertEqual(0, limiter.acquire())
+        self.assertAlmostEqual(0.5, limiter.acquire())
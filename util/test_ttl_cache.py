@@ -0,0 +1,65 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from util.ttl_cache import TtlCache
+
+
+class TtlCacheTest(TestCase):
+
+    def testExpiry(self):
+        now = [0.0]
+        loads = []
+        cache = TtlCache(10, clock=lambda: now[0])
+
+        def loader():
+            loads.append(now[0])
+            return len(loads)
+
+        self.assertEqual(1, cache.get('key', loader))
+        now[0] = 9.9
+        self.assertEqual(1, cache.get('key', loader))
+        now[0] = 10.0
+        self.assertEqual(2, cache.get('key', loader))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def testStaleOnError(self):
+        now = [0.0]
+        cache = TtlCache(10, clock=lambda: now[0], stale_on_error=True)
+        cache.get('key', lambda: 1)
+
+        def fail():
+            raise ConnectionError()
+
+        now[0] = 20.0
+        with self.assertLogs('TtlCache', 'WARNING'):
+            self.assertEqual(1, cache.get('key', fail))
+            self.assertEqual(1, cache.get('key', fail, refresh=True))
+        self.assertEqual(2, cache.get('key', lambda: 2, refresh=True))
+        with self.assertRaises(ConnectionError):
+            cache.get('other', fail)
+        with self.assertRaises(ConnectionError):
+            TtlCache(10).get('key', fail)
+
+    def testInvalidate(self):
+        cache = TtlCache(10)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+
+        cache.invalidate('a')
+
+        self.assertEqual(3, cache.get('a', lambda: 3))
+        self.assertEqual(2, cache.get('b', lambda: 4))
+        cache.invalidate()
+        self.assertEqual(5, cache.get('b', lambda: 5))
+
+    def testPersistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.json')
+            TtlCache(60, path).get('pairs', lambda: [{'url_symbol': 'btcusd'}])
+
+            cache = TtlCache(60, path)
+
+            self.assertEqual([{'url_symbol': 'btcusd'}], cache.get('pairs', lambda: None))
+            self.assertEqual(1, cache.hits)
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class TtlCache:
+    """
+    Values expire ttl seconds after they were loaded. With a path the entries are persisted as JSON, so a restarted
+    process can reuse them; the clock then has to be wall clock time. With stale_on_error an expired value is still
+    returned when loading it again fails.
+    """
+
+    def __init__(self, ttl, path=None, clock=time.time, stale_on_error=False):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._ttl = ttl
+        self._staleOnError = stale_on_error
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                self._entries = json.load(file)
+
+    def get(self, key, loader, refresh=False):
+        """The cached value of key, loaded when it expired or with refresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not refresh and entry is not None and self._clock() - entry['time'] < self._ttl:
+                self.hits += 1
+                return entry['value']
+            self.misses += 1
+
+        try:
+            value = loader()
+        except Exception as e:
+            if not self._staleOnError or entry is None:
+                raise
+            self._logger.warning(f'Could not load {key}, using the value loaded before: {e!r}')
+            return entry['value']
+        with self._lock:
+            self._entries[key] = {'time': self._clock(), 'value': value}
+            self._persist()
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries = {}
+            else:
+                self._entries.pop(key, None)
+            self._persist()
+
+    def _persist(self):
+        if self._path is None:
+            return
+        temporary = f'{self._path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self._entries, file)
+        os.replace(temporary, self._path)
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses'